@@ -0,0 +1,244 @@
+"""
+    Headless end-to-end benchmark of the detection pipeline.
+
+    Replays a recorded clip (or any other --source) through face_and_blink_detection,
+    pose_estimation_and_shake_nod_detection and EyeGestures_v2.step without opening any window,
+    and writes per-stage latency percentiles, sustained fps and peak RSS as JSON.
+
+    Example:
+        python benchmark.py --source video:clip.mp4 --output bench.json
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+from collections import Counter
+from types import SimpleNamespace
+
+import dlib
+import numpy as np
+
+import facegestures.pose as service
+from eyetracking.eyegestures import EyeGestures_v2
+from facegestures.gestures import FaceLocator, add_face_detection_arguments
+from face_eye_nocam import (SharedState, face_and_blink_detection, pose_estimation_and_shake_nod_detection, unified_detection,
+                            act_on_gestures)
+from pipeline import (StageExecutor, ActionDispatcher, FrameDescriptor, ConversionCache, GRAY, add_source_arguments,
+                      open_frame_source_from_args)
+
+
+# Stand-in for a Qt signal. Counts emits instead of touching the UI
+class _CountingSignal:
+    def __init__(self, name, counter):
+        self.name = name
+        self.counter = counter
+
+    def emit(self, *args):
+        self.counter[self.name] += 1
+
+
+# Stand-in for ui.overlay.Overlay so the detection stages can run without a display
+# The number of emitted signals is reported, which makes it easy to spot a change in gesture behaviour
+class HeadlessOverlay:
+    SIGNALS = ("notification_signal", "change_page_signal", "zoom_in_signal", "zoom_out_signal",
+               "toggle_pin_signal", "select_highlighted_signal", "invoke_signal")
+
+    def __init__(self):
+        self.emitted = Counter()
+        for name in self.SIGNALS:
+            setattr(self, name, _CountingSignal(name, self.emitted))
+        self.keyboard_widget = SimpleNamespace(is_keyboard_open=False)
+
+
+# Collects latency samples (in seconds) for each named stage
+class StageTimer:
+    def __init__(self):
+        self.samples = {}
+
+    def record(self, name, seconds):
+        self.samples.setdefault(name, []).append(seconds)
+
+    # Wrap a stage function so every call is timed
+    def wrap(self, name, fn):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.record(name, time.perf_counter() - start)
+        return timed
+
+    def summary(self, skip=0):
+        report = {}
+        for name, samples in self.samples.items():
+            ms = np.array(samples[skip:], dtype=np.float64) * 1000.0
+            if len(ms) == 0:
+                continue
+            report[name] = {
+                "count": int(len(ms)),
+                "mean_ms": round(float(ms.mean()), 3),
+                "p50_ms": round(float(np.percentile(ms, 50)), 3),
+                "p95_ms": round(float(np.percentile(ms, 95)), 3),
+                "p99_ms": round(float(np.percentile(ms, 99)), 3),
+                "max_ms": round(float(ms.max()), 3),
+            }
+        return report
+
+
+# Peak resident set size of this process in MB (None if it can't be determined on this platform)
+def peak_rss_mb():
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+        return round(peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024, 1)
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return round(getattr(info, "peak_wset", info.rss) / (1024 * 1024), 1)
+    except ImportError:
+        return None
+
+
+# Same work as face_eye_nocam.eye_tracking, minus moving the OS cursor
+def gaze_stage(view, eye_gestures, screen_width, screen_height):
+    return eye_gestures.step(view, calibration=False, width=screen_width, height=screen_height, context="main")
+
+
+def run_benchmark(args):
+    source = open_frame_source_from_args(args)
+
+    unified = args.landmarks == "unified"
+    detector = dlib.get_frontal_face_detector()
+    predictor = None if unified else dlib.shape_predictor(args.predictor)
+    locator = FaceLocator(detector, predictor, redetect_interval=args.redetect_interval,
+                          tracker=args.face_tracker, detection_scale=args.detection_scale)
+    fa = service.DepthFacialLandmarks(args.pose_model)
+    eye_gestures = EyeGestures_v2(45000)
+    eye_gestures.setClassicalImpact(2)
+    eye_gestures.setFixation(1.0)
+
+    shared_state = SharedState()
+    overlay = HeadlessOverlay()
+    actions = ActionDispatcher()
+    timer = StageTimer()
+
+    face_stage = timer.wrap("face", face_and_blink_detection)
+    pose_stage = timer.wrap("pose", pose_estimation_and_shake_nod_detection)
+    eyes_stage = timer.wrap("gaze", gaze_stage)
+    # One stage for blink / eyebrow / pose when all landmarks come from the pose model
+    landmark_stage = timer.wrap("landmarks", unified_detection)
+
+    # Threaded mode runs the stages on the same persistent workers as face_eye_nocam.main
+    executor = None
+    if args.mode == "threaded":
+        executor = StageExecutor()
+        if unified:
+            executor.add_stage("landmarks", landmark_stage)
+        else:
+            executor.add_stage("face", face_stage)
+            executor.add_stage("pose", pose_stage)
+        executor.add_stage("gaze", eyes_stage)
+
+    conversions = ConversionCache()
+    frames = 0
+    measured_start = None
+    while args.max_frames is None or frames < args.max_frames:
+        start = time.perf_counter()
+        ret, frame = source.read()
+        if not ret:
+            break
+        timer.record("read", time.perf_counter() - start)
+        # Gesture windows, cooldowns and calibration run on the source's time: the frame's position in a
+        # recorded clip (or synthetic frames) however fast it is replayed, the time it was read from a live source
+        if source.is_live:
+            shared_state.frame_time = time.monotonic()
+        else:
+            shared_state.frame_time = frames / source.fps
+
+        if frames == args.warmup:
+            measured_start = start
+
+        # Like face_eye_nocam.main, the stages share the color converted / mirrored versions of the frame
+        view = FrameDescriptor(frame, frames, cache=conversions)
+        gray = view.view(GRAY)
+        if executor is not None:
+            if unified:
+                futures = [executor.submit("landmarks", frame, gray, shared_state, locator, fa, overlay)]
+            else:
+                futures = [executor.submit("face", frame, gray, shared_state, locator, overlay),
+                           executor.submit("pose", frame, shared_state, fa, overlay)]
+            futures.append(executor.submit("gaze", view, eye_gestures, args.screen_width, args.screen_height))
+            executor.wait(futures)
+        elif unified:
+            landmark_stage(frame, gray, shared_state, locator, fa, overlay)
+            eyes_stage(view, eye_gestures, args.screen_width, args.screen_height)
+        else:
+            face_stage(frame, gray, shared_state, locator, overlay)
+            pose_stage(frame, shared_state, fa, overlay)
+            eyes_stage(view, eye_gestures, args.screen_width, args.screen_height)
+        act_on_gestures(shared_state, overlay, actions)
+
+        timer.record("frame", time.perf_counter() - start)
+        frames += 1
+
+    end = time.perf_counter()
+    if executor is not None:
+        executor.shutdown()
+    # Let the queued gesture actions run, so every event is counted
+    actions.shutdown()
+    source.release()
+
+    measured_frames = max(frames - args.warmup, 0)
+    wall_time = end - measured_start if measured_start is not None else 0.0
+    return {
+        "source": args.source,
+        "mode": args.mode,
+        "landmarks": args.landmarks,
+        "frames": frames,
+        "warmup_frames": min(args.warmup, frames),
+        "wall_time_s": round(wall_time, 3),
+        "fps": round(measured_frames / wall_time, 2) if wall_time > 0 else None,
+        "peak_rss_mb": peak_rss_mb(),
+        "stages": timer.summary(skip=args.warmup),
+        "events": dict(overlay.emitted),
+        "actions": dict(actions.stats),
+        "conversions": dict(conversions.stats),
+        "faces_found": len(shared_state.dlib_faces),
+        "face_detector_runs": locator.detection_count,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a clip through the full detection pipeline and report latency")
+    add_source_arguments(parser, default="synthetic:640x480@30:300")
+    add_face_detection_arguments(parser)
+    parser.add_argument("--mode", choices=("threaded", "sequential"), default="threaded",
+                        help="threaded: stages run on the StageExecutor like face_eye_nocam.main, "
+                             "sequential: one stage after the other (default: %(default)s)")
+    parser.add_argument("--max-frames", type=int, default=None, help="Stop after this many frames")
+    parser.add_argument("--warmup", type=int, default=10, help="Frames excluded from the statistics (default: %(default)s)")
+    parser.add_argument("--screen-width", type=int, default=1920)
+    parser.add_argument("--screen-height", type=int, default=1080)
+    parser.add_argument("--predictor", default="facegestures/models/shape_predictor_68_face_landmarks.dat")
+    parser.add_argument("--pose-model", default="facegestures/models/sparse_face.tflite")
+    parser.add_argument("--output", default=None, help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = run_benchmark(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+        print(f"Wrote benchmark report to {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
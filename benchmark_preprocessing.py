@@ -0,0 +1,84 @@
+"""
+    Micro-benchmark of the pose model's preprocessing (BaseTFLiteFaceAlignment._preprocessing).
+
+    Compares the previous implementation (new warped crop, channel reversed float32 copy, normalize,
+    transposed input handed to set_tensor) with the current one that fills the interpreter's input
+    tensor in place. Memory is measured with tracemalloc, which also sees numpy's array allocations.
+
+    Example:
+        python benchmark_preprocessing.py --calls 500
+"""
+import argparse
+import json
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+import facegestures.pose as service
+
+
+# The preprocessing as it was before it wrote into the interpreter's input tensor
+def legacy_preprocessing(fa, img, bbox, factor=2.7):
+    maximum_edge = max(bbox[2:4] - bbox[:2]) * factor
+    scale = fa._edge_size * 2.0 / maximum_edge
+    center = (bbox[2:4] + bbox[:2]) / 2.0
+    cx, cy = fa._trans_distance - scale * center
+
+    M = np.array([[scale, 0, cx], [0, scale, cy]])
+
+    cropped = cv2.warpAffine(img, M, fa._input_shape, borderValue=0.0)
+    rgb = cropped[:, :, ::-1].astype(np.float32)
+
+    cv2.normalize(rgb, rgb, alpha=-1, beta=1, norm_type=cv2.NORM_MINMAX)
+
+    inp = rgb.transpose(2, 0, 1)[None]
+    fa._interpreter.set_tensor(fa._interpreter.get_input_details()[0]["index"], inp)
+    return M
+
+
+# Peak memory allocated during one call (above what was already allocated), averaged over 'calls'
+# Only the peak tells the two apart: tracemalloc sees live blocks, and the temporaries are freed before the call returns
+def measure(fn, calls):
+    fn()  # first call allocates the reusable buffers
+    peaks = []
+    durations = []
+    tracemalloc.start()
+    try:
+        for _ in range(calls):
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            start = time.perf_counter()
+            fn()
+            durations.append(time.perf_counter() - start)
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+    return {
+        "peak_kb_per_call": round(float(np.mean(peaks)) / 1024, 2),
+        "mean_us_per_call": round(float(np.mean(durations)) * 1e6, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory allocated per call by the pose model preprocessing")
+    parser.add_argument("--pose-model", default="facegestures/models/sparse_face.tflite")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    args = parser.parse_args()
+
+    fa = service.DepthFacialLandmarks(args.pose_model)
+    image = np.random.default_rng(0).integers(0, 256, (args.height, args.width, 3), dtype=np.uint8)
+    box = np.array([args.width * 0.35, args.height * 0.3, args.width * 0.65, args.height * 0.7])
+
+    report = {
+        "before": measure(lambda: legacy_preprocessing(fa, image, box), args.calls),
+        "after": measure(lambda: fa._preprocessing(image, box), args.calls),
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+"""
+    Accuracy comparison of the two landmark paths.
+
+    Runs dlib's 68 point shape predictor and the TFLite sparse_face model (DepthFacialLandmarks) on the same
+    face boxes of a clip (or any other --source) and reports how far apart they are, and whether the blink and
+    eyebrow features computed from them (calculate_ear / calculate_eyebrow_distance) would trigger the same
+    gestures. Use it to check a clip before switching to '--landmarks unified'.
+
+    Example:
+        python compare_landmarks.py --source video:clip.mp4 --output landmarks.json
+"""
+import argparse
+import json
+import time
+
+import cv2
+import dlib
+import numpy as np
+from imutils import face_utils
+
+import facegestures.pose as service
+from facegestures.gestures import FaceLocator, calculate_ear, calculate_eyebrow_distance, dfl_landmarks
+from pipeline import add_source_arguments, open_frame_source_from_args
+
+
+# Landmark groups of the 68 point layout, both models use the same one
+REGIONS = {
+    "jaw": slice(0, 17),
+    "eyebrows": slice(17, 27),
+    "nose": slice(27, 36),
+    "eyes": slice(36, 48),
+    "mouth": slice(48, 68),
+}
+
+
+# Error between two sets of landmarks, normalized by the outer eye corner distance of the dlib landmarks
+def normalized_errors(reference, other):
+    interocular = np.linalg.norm(reference[36] - reference[45])
+    errors = np.linalg.norm(reference - other, axis=1) / max(interocular, 1e-6)
+    return {"all": float(errors.mean()), **{name: float(errors[idx].mean()) for name, idx in REGIONS.items()}}
+
+
+# How similar a feature is when computed from dlib vs. the TFLite landmarks
+def compare_feature(reference, other):
+    reference, other = np.asarray(reference), np.asarray(other)
+    if len(reference) < 2:
+        return None
+    correlation = np.corrcoef(reference, other)[0, 1] if reference.std() > 0 and other.std() > 0 else None
+    return {
+        "dlib_mean": round(float(reference.mean()), 4),
+        "tflite_mean": round(float(other.mean()), 4),
+        "mean_abs_diff": round(float(np.abs(reference - other).mean()), 4),
+        "correlation": None if correlation is None else round(float(correlation), 4),
+    }
+
+
+# Calibrates a threshold on the first frames like face_and_blink_detection does, then compares
+# on which of the remaining frames each landmark path would see the feature past its threshold
+def compare_triggers(reference, other, calibration_frames, scalar, above):
+    reference, other = np.asarray(reference), np.asarray(other)
+    if len(reference) <= calibration_frames:
+        return None
+
+    def triggered(values):
+        threshold = scalar * np.percentile(values[:calibration_frames], 5)
+        rest = values[calibration_frames:]
+        return rest > threshold if above else rest < threshold
+
+    ref_on, other_on = triggered(reference), triggered(other)
+    return {
+        "frames": int(len(ref_on)),
+        "dlib_frames_triggered": int(ref_on.sum()),
+        "tflite_frames_triggered": int(other_on.sum()),
+        "agreement": round(float((ref_on == other_on).mean()), 4),
+    }
+
+
+def run_comparison(args):
+    source = open_frame_source_from_args(args)
+    locator = FaceLocator(dlib.get_frontal_face_detector(), None, detection_scale=args.detection_scale)
+    predictor = dlib.shape_predictor(args.predictor)
+    fa = service.DepthFacialLandmarks(args.pose_model)
+
+    errors = []
+    ear = ([], [])
+    eyebrow = ([], [])
+    timings = {"dlib": [], "tflite": []}
+    frames = 0
+    skipped_faces = 0
+    while args.max_frames is None or frames < args.max_frames:
+        ret, frame = source.read()
+        if not ret:
+            break
+        frames += 1
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        faces = locator.detect(gray)
+
+        start = time.perf_counter()
+        tflite_detections, _ = dfl_landmarks(frame, faces, fa)
+        timings["tflite"].append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        dlib_landmarks = [face_utils.shape_to_np(predictor(gray, face)) for face, _ in tflite_detections]
+        timings["dlib"].append(time.perf_counter() - start)
+
+        # Faces the TFLite model skips (too small) can't be compared
+        skipped_faces += len(faces) - len(tflite_detections)
+        for reference, (_, other) in zip(dlib_landmarks, tflite_detections):
+            reference = reference.astype(np.float64)
+            errors.append(normalized_errors(reference, other))
+            ear[0].append(calculate_ear(reference))
+            ear[1].append(calculate_ear(other))
+            eyebrow[0].append(calculate_eyebrow_distance(reference))
+            eyebrow[1].append(calculate_eyebrow_distance(other))
+
+    source.release()
+
+    return {
+        "source": args.source,
+        "frames": frames,
+        "faces_compared": len(errors),
+        "faces_skipped": skipped_faces,
+        "nme": {name: round(float(np.mean([e[name] for e in errors])), 4) for name in errors[0]} if errors else None,
+        "ear": compare_feature(*ear),
+        "eyebrow_distance": compare_feature(*eyebrow),
+        "blink_frames": compare_triggers(*ear, args.calibration_frames, args.ear_scalar, above=False),
+        "eyebrow_raise_frames": compare_triggers(*eyebrow, args.calibration_frames, args.eyebrow_scalar, above=True),
+        "landmark_ms_per_frame": {name: round(float(np.mean(samples)) * 1000.0, 3) if samples else None
+                                  for name, samples in timings.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare dlib and TFLite landmarks and the blink / eyebrow features computed from them")
+    add_source_arguments(parser, default="synthetic:640x480@30:300")
+    parser.add_argument("--detection-scale", type=float, default=0.5,
+                        help="Run the face detector on a copy of the frame resized by this factor (default: %(default)s)")
+    parser.add_argument("--calibration-frames", type=int, default=90,
+                        help="Faces used to calibrate the blink / eyebrow thresholds (default: %(default)s)")
+    # Same defaults as SharedState in face_eye_nocam.py
+    parser.add_argument("--ear-scalar", type=float, default=0.70)
+    parser.add_argument("--eyebrow-scalar", type=float, default=1.35)
+    parser.add_argument("--max-frames", type=int, default=None, help="Stop after this many frames")
+    parser.add_argument("--predictor", default="facegestures/models/shape_predictor_68_face_landmarks.dat")
+    parser.add_argument("--pose-model", default="facegestures/models/sparse_face.tflite")
+    parser.add_argument("--output", default=None, help="Write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    report = run_comparison(args)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+        print(f"Wrote landmark comparison to {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == '__main__':
+    main()
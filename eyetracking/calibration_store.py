@@ -0,0 +1,167 @@
+import hashlib
+import json
+import os
+import re
+import time
+from collections import namedtuple
+
+import numpy as np
+
+
+# Where the calibrations are kept unless --calibration-dir says otherwise
+DEFAULT_ROOT = os.path.join(os.path.expanduser("~"), ".eyecommunicate", "calibrations")
+
+# Calibration points (fractions of the screen, like the eyeGestures CalibrationMatrix) of the short pass that
+# corrects a stored calibration for drift: the head / camera never sit exactly where they did last time
+DRIFT_CORRECTION_POINTS = np.array([[0.5, 0.5], [0.1, 0.1], [0.9, 0.1], [0.9, 0.9], [0.1, 0.9]])
+
+# A stored calibration: the EyeGestures_v2.saveModel bytes and what they were made for
+# revision counts the saves for this user / camera, screen is (width, height) in pixels
+CalibrationProfile = namedtuple("CalibrationProfile", "model revision created screen tracker")
+
+
+# Eye tracker calibrations on disk, one file per user and camera: <root>/<user>/<camera>.calib
+# Other per user / camera calibrations (e.g. the facial gesture baselines) are stored the same way under their
+# own 'kind': <root>/<user>/<camera>.<kind>.calib
+# The file is a JSON header line followed by the model:
+#   {"format": 1, "revision": 3, "created": ..., "screen": [1920, 1080], "tracker": "2.0.0",
+#    "size": 12345, "sha256": "..."}
+# A file written by another format or tracker version, for another screen size, or whose model doesn't match
+# its size / sha256 (e.g. cut short by a crash) is not used: the user just goes through the full calibration.
+# The eye tracker model is unpickled, so only point the store at directories you trust
+class CalibrationStore:
+    FORMAT = 1
+    SUFFIX = ".calib"
+    GAZE = "gaze"
+
+    def __init__(self, root=DEFAULT_ROOT):
+        self.root = root
+
+    # User and camera names become file names
+    @staticmethod
+    def _slug(name):
+        slug = re.sub(r"[^A-Za-z0-9_.-]+", "-", str(name)).strip("-.")
+        return slug or "default"
+
+    def path(self, user, camera, kind=GAZE):
+        name = self._slug(camera) if kind == self.GAZE else f"{self._slug(camera)}.{self._slug(kind)}"
+        return os.path.join(self.root, self._slug(user), name + self.SUFFIX)
+
+    def _read(self, path):
+        with open(path, "rb") as f:
+            header = json.loads(f.readline().decode("utf-8"))
+            model = f.read()
+        return header, model
+
+    # The stored calibration, or None if there is none that can be used (the reason is printed)
+    def load(self, user, camera, screen=None, tracker=None, kind=GAZE):
+        path = self.path(user, camera, kind)
+        if not os.path.exists(path):
+            return None
+        try:
+            header, model = self._read(path)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable calibration {path}: {e}")
+            return None
+        if not isinstance(header, dict):
+            print(f"Ignoring unreadable calibration {path}: the header isn't a JSON object")
+            return None
+
+        if header.get("format") != self.FORMAT:
+            print(f"Ignoring calibration {path}: format {header.get('format')}, expected {self.FORMAT}")
+            return None
+        if len(model) != header.get("size") or hashlib.sha256(model).hexdigest() != header.get("sha256"):
+            print(f"Ignoring corrupt calibration {path}: the model doesn't match its checksum")
+            return None
+        if tracker is not None and header.get("tracker") != tracker:
+            print(f"Ignoring calibration {path}: made by tracker {header.get('tracker')}, this is {tracker}")
+            return None
+        if screen is not None and tuple(header.get("screen") or ()) != tuple(screen):
+            print(f"Ignoring calibration {path}: made for a {header.get('screen')} screen, this one is {list(screen)}")
+            return None
+
+        screen = tuple(header["screen"]) if header.get("screen") else None
+        return CalibrationProfile(model, header.get("revision", 1), header.get("created"), screen, header.get("tracker"))
+
+    # Store a calibration, replacing the previous one. The file is written next to it and moved in place,
+    # so a crash never leaves a half written calibration behind
+    def save(self, user, camera, model, screen=None, tracker=None, kind=GAZE):
+        path = self.path(user, camera, kind)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        revision = 1
+        if os.path.exists(path):
+            try:
+                revision = self._read(path)[0].get("revision", 0) + 1
+            except (OSError, ValueError, AttributeError, TypeError):
+                pass
+
+        created = time.time()
+        header = {
+            "format": self.FORMAT,
+            "revision": revision,
+            "created": created,
+            "screen": list(screen) if screen is not None else None,
+            "tracker": tracker,
+            "size": len(model),
+            "sha256": hashlib.sha256(model).hexdigest(),
+        }
+        temporary = path + ".tmp"
+        with open(temporary, "wb") as f:
+            f.write(json.dumps(header).encode("utf-8") + b"\n")
+            f.write(model)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, path)
+        return CalibrationProfile(model, revision, created, tuple(screen) if screen is not None else None, tracker)
+
+    def delete(self, user, camera, kind=GAZE):
+        path = self.path(user, camera, kind)
+        if os.path.exists(path):
+            os.remove(path)
+
+
+# Load the stored calibration of this user / camera into the tracker (unless 'recalibrate'), and set up the
+# calibration pass that has to run: the short drift correction on top of a stored calibration (it fits an affine
+# correction of the stored calibration's predictions), the full calibration otherwise.
+# Returns (number of calibration points, loaded CalibrationProfile or None)
+def prepare_calibration(eye_gestures, store, user, camera, screen, tracker=None, recalibrate=False, full_points=25,
+                        context="main"):
+    profile = None if recalibrate else store.load(user, camera, screen=screen, tracker=tracker)
+    if profile is None:
+        return full_points, None
+    eye_gestures.loadModel(profile.model, context)
+    eye_gestures.startDriftCorrection(DRIFT_CORRECTION_POINTS, context)
+    return len(DRIFT_CORRECTION_POINTS), profile
+
+
+# Store the tracker's calibration once a calibration pass is done. Returns the stored CalibrationProfile,
+# or None if the tracker has nothing to store (it never saw a face)
+def save_calibration(eye_gestures, store, user, camera, screen, tracker=None, context="main"):
+    model = eye_gestures.saveModel(context)
+    if model is None:
+        return None
+    return store.save(user, camera, model, screen=screen, tracker=tracker)
+
+
+# The camera part of the store key: the --source it was opened with ("camera:1" -> "camera-1")
+def camera_key(args):
+    return args.calibration_camera or args.source
+
+
+# Adds the calibration store options to an entry point's parser
+def add_calibration_arguments(parser):
+    parser.add_argument("--user", default="default",
+                        help="Profile the eye tracker calibration and gesture baselines are stored under "
+                             "(default: %(default)s)")
+    parser.add_argument("--recalibrate", action="store_true",
+                        help="Ignore the stored calibrations and calibrate from scratch (replaces the stored ones)")
+    parser.add_argument("--calibration-dir", default=DEFAULT_ROOT,
+                        help="Where calibrations are stored (default: %(default)s)")
+    parser.add_argument("--calibration-camera", default=None,
+                        help="Camera name the calibration is stored under (default: the --source value)")
+    return parser
+
+
+def calibration_store_from_args(args):
+    return CalibrationStore(args.calibration_dir)
@@ -0,0 +1,170 @@
+import math
+import threading
+import time
+
+
+# One Euro filter (Casiez, Roussel & Vogel, 2012) for one coordinate
+# A low-pass filter whose cutoff frequency grows with the speed of the signal: while the gaze rests on a point
+# the jitter is smoothed away (cutoff near min_cutoff), and when it jumps to another point the cutoff goes up
+# (by beta per pixel / second) so the cursor follows without lag
+class OneEuroFilter:
+    def __init__(self, min_cutoff=1.0, beta=0.01, d_cutoff=1.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.reset()
+
+    def reset(self):
+        self.value = None
+        self.speed = 0.0
+        self.timestamp = None
+
+    @staticmethod
+    def _alpha(cutoff, dt):
+        tau = 1.0 / (2 * math.pi * cutoff)
+        return 1.0 / (1.0 + tau / dt)
+
+    def __call__(self, value, timestamp):
+        if self.value is None:
+            self.value = value
+            self.timestamp = timestamp
+            return value
+
+        dt = timestamp - self.timestamp
+        # Same (or older) timestamp: nothing to learn about the speed
+        if dt <= 0:
+            return self.value
+        self.timestamp = timestamp
+
+        # Filtered speed, then the cutoff that goes with it
+        speed = (value - self.value) / dt
+        self.speed += self._alpha(self.d_cutoff, dt) * (speed - self.speed)
+        cutoff = self.min_cutoff + self.beta * abs(self.speed)
+
+        self.value += self._alpha(cutoff, dt) * (value - self.value)
+        return self.value
+
+
+def pyautogui_move(x, y):
+    import pyautogui
+    # _pause=False: no pyautogui.PAUSE sleep after every move
+    pyautogui.moveTo(x, y, _pause=False)
+
+
+# Moves the OS cursor to the gaze point on its own thread
+# The tracking loop only calls update() with every raw gaze point: the point is smoothed (One Euro filter)
+# and stored, and the driver thread moves the cursor to the newest point
+#   - at most max_rate times per second (every move is a round-trip to the window system)
+#   - only when the point moved more than dead_zone pixels from where the cursor was last put,
+#     changes too small to see don't cost an OS call
+# 'move' does the actual move (pyautogui by default), it is only ever called from the driver thread
+class CursorDriver:
+    def __init__(self, screen_width, screen_height, max_rate=60, dead_zone=4, min_cutoff=1.0, beta=0.01,
+                 move=pyautogui_move):
+        if max_rate <= 0:
+            raise ValueError(f"max_rate must be positive, got {max_rate}")
+        self.screen_width = screen_width
+        self.screen_height = screen_height
+        self.max_rate = max_rate
+        self.dead_zone = dead_zone
+        self.move = move
+        self.filters = (OneEuroFilter(min_cutoff, beta), OneEuroFilter(min_cutoff, beta))
+
+        self.target = None
+        self.position = None
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+
+        # samples: gaze points received, moves: OS calls made, skipped: targets inside the dead zone
+        self.stats = {"samples": 0, "moves": 0, "skipped": 0}
+
+    def start(self):
+        if self.thread is None:
+            self.running = True
+            self.thread = threading.Thread(target=self._run, name="cursor-driver", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    # New raw gaze point (screen pixels). 'timestamp' is the capture time of its frame (seconds)
+    def update(self, x, y, timestamp=None):
+        if timestamp is None:
+            timestamp = time.monotonic()
+        x = self.filters[0](float(x), timestamp)
+        y = self.filters[1](float(y), timestamp)
+        # Keep the cursor on the screen
+        x = min(max(int(round(x)), 0), self.screen_width - 1)
+        y = min(max(int(round(y)), 0), self.screen_height - 1)
+        with self.condition:
+            self.stats["samples"] += 1
+            self.target = (x, y)
+            self.condition.notify()
+        return x, y
+
+    # Forget the smoothing state, e.g. after tracking was paused
+    def reset(self):
+        for axis in self.filters:
+            axis.reset()
+
+    def _in_dead_zone(self, target):
+        if self.position is None:
+            return False
+        return math.hypot(target[0] - self.position[0], target[1] - self.position[1]) <= self.dead_zone
+
+    def _run(self):
+        interval = 1.0 / self.max_rate
+        last_move = float("-inf")
+        while True:
+            with self.condition:
+                while self.running and self.target is None:
+                    self.condition.wait()
+                if not self.running:
+                    break
+                # Don't move more often than max_rate, points that arrive in the meantime replace the target
+                wait = last_move + interval - time.monotonic()
+                if wait > 0:
+                    self.condition.wait(wait)
+                    continue
+                target, self.target = self.target, None
+                if self._in_dead_zone(target):
+                    self.stats["skipped"] += 1
+                    continue
+
+            self.move(*target)
+            last_move = time.monotonic()
+            self.position = target
+            with self.condition:
+                self.stats["moves"] += 1
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.stop()
+
+
+# Adds the cursor smoothing / rate options to an entry point's parser
+def add_cursor_arguments(parser):
+    parser.add_argument("--cursor-rate", type=float, default=60,
+                        help="Maximum cursor moves per second (default: %(default)s)")
+    parser.add_argument("--cursor-dead-zone", type=float, default=4,
+                        help="Gaze changes up to this many pixels don't move the cursor (default: %(default)s)")
+    parser.add_argument("--cursor-min-cutoff", type=float, default=1.0,
+                        help="One Euro filter cutoff (Hz) while the gaze rests, lower is steadier (default: %(default)s)")
+    parser.add_argument("--cursor-beta", type=float, default=0.01,
+                        help="One Euro filter speed coefficient, higher follows fast gaze jumps with less lag "
+                             "(default: %(default)s)")
+    return parser
+
+
+def cursor_driver_from_args(args, screen_width, screen_height, **kwargs):
+    return CursorDriver(screen_width, screen_height, max_rate=args.cursor_rate, dead_zone=args.cursor_dead_zone,
+                        min_cutoff=args.cursor_min_cutoff, beta=args.cursor_beta, **kwargs)
@@ -10,48 +10,317 @@ import pickle
 import cv2
 
 import random
+import hashlib
+import os
+from collections import OrderedDict
 
 VERSION = "2.0.0"
 
+class PointAverager:
+    """Sum of the last 'size' gaze points, kept in a ring buffer.
+
+    Same result as shifting a (size, 2) array down by one row every frame and summing all the rows,
+    without the copy and without the sum: push() overwrites the oldest row and updates a running sum in place.
+    push(None) repeats the newest point, like the shift did when row 0 wasn't overwritten.
+    """
+
+    # The running sum is recomputed from the rows after this many pushes per row, so float error can't build up
+    RESUM_PERIOD = 64
+
+    def __init__(self, size):
+        self.size = size
+        self.points = np.zeros((size, 2))
+        self.sum = np.zeros(2)
+        self.head = 0  # row of the newest point
+        self.pushes = 0
+
+    def push(self, point=None):
+        newest = self.points[self.head]
+        self.head = (self.head + 1) % self.size
+        oldest = self.points[self.head]
+        np.subtract(self.sum, oldest, out=self.sum)
+        oldest[:] = newest if point is None else point
+        np.add(self.sum, oldest, out=self.sum)
+
+        self.pushes += 1
+        if self.pushes >= self.RESUM_PERIOD * self.size:
+            self.pushes = 0
+            np.sum(self.points, axis=0, out=self.sum)
+
+def reservoir_put(columns, row, seen, capacity, rng):
+    """Reservoir sampling (algorithm R): adds the seen-th row (counting from 1) to the parallel lists in 'columns'
+    so that they always hold a uniform sample of at most 'capacity' of the rows seen so far"""
+    if len(columns[0]) < capacity:
+        for column, value in zip(columns, row):
+            column.append(value)
+        return
+    slot = rng.randrange(seen)
+    if slot < capacity:
+        for column, value in zip(columns, row):
+            column[slot] = value
+
+
+class BoundedCalibrator(Calibrator_v2):
+    """Calibrator_v2 with bounded memory.
+
+    Calibrator_v2 keeps every sample it is given: the samples of the current calibration point until the point
+    moves, and all of them after that. Here both are reservoirs, of at most max_point_samples samples for the
+    current point and max_samples samples overall, each a uniform sample of what was added.
+    It also forgets its fitting threads once they are done (Calibrator_v2 keeps a list of every one it started)
+
+    A restored calibration is corrected for the new head / camera position with start_drift_correction():
+    the samples of the following calibration points don't go into the regression (where the stored samples
+    would outnumber them), they fit an affine correction of its predictions instead
+    """
+
+    def __init__(self, calibration_radius = 1000, max_samples = 5000, max_point_samples = 300, seed = None):
+        super().__init__(calibration_radius)
+        self.max_samples = max_samples
+        self.max_point_samples = max_point_samples
+        self.samples_seen = 0
+        self.point_samples_seen = 0
+        self.rng = random.Random(seed)
+        # (2, 3) affine map applied to the regression's predictions, None for none
+        self.correction = None
+        self.correcting = False
+        self.correction_samples = ([], [])
+        self.correction_samples_seen = 0
+
+    def start_drift_correction(self):
+        """Calibration samples from now on fit the correction (the previous one stays until they replace it)"""
+        with self.lock:
+            self.correcting = True
+            self.correction_samples = ([], [])
+            self.correction_samples_seen = 0
+
+    def predict(self, x):
+        point = super().predict(x)
+        correction = self.correction
+        if correction is None or not self.fitted:
+            return point
+        return correction[:, :2] @ point + correction[:, 2]
+
+    def _fit_correction(self):
+        predicted, targets = (np.array(column, dtype=float) for column in self.correction_samples)
+        # Until three calibration points were seen an affine map isn't determined, only the offset is
+        if len(np.unique(targets, axis=0)) < 3:
+            offset = (targets - predicted).mean(axis=0)
+            return np.array([[1.0, 0.0, offset[0]], [0.0, 1.0, offset[1]]])
+        inputs = np.column_stack((predicted, np.ones(len(predicted))))
+        solution, *_ = np.linalg.lstsq(inputs, targets, rcond=None)
+        return solution.T
+
+    # The samples of the current point are private to Calibrator_v2, which is where its fit reads them
+    def _point_samples(self):
+        return (self._Calibrator__tmp_X, self._Calibrator__tmp_Y_y, self._Calibrator__tmp_Y_x)
+
+    def add(self, x, y):
+        if self.correcting:
+            # The uncorrected prediction (predict() of Calibrator_v2 takes the lock itself)
+            predicted = super().predict(x)
+            with self.lock:
+                self.correction_samples_seen += 1
+                reservoir_put(self.correction_samples, (predicted, np.array((y[0], y[1]), dtype=float)),
+                              self.correction_samples_seen, self.max_samples, self.rng)
+                self.correction = self._fit_correction()
+            return
+        with self.lock:
+            self.point_samples_seen += 1
+            reservoir_put(self._point_samples(), (x.flatten(), y[1], y[0]), self.point_samples_seen,
+                          self.max_point_samples, self.rng)
+            self._Calibrator__launch_fit()
+            self.fit_coroutines = [coroutine for coroutine in self.fit_coroutines if coroutine.is_alive()]
+
+    def movePoint(self):
+        with self.lock:
+            if self.correcting:
+                self.matrix.movePoint()
+                return
+            for row in zip(*self._point_samples()):
+                self.samples_seen += 1
+                reservoir_put((self.X, self.Y_y, self.Y_x), row, self.samples_seen, self.max_samples, self.rng)
+            self.matrix.movePoint()
+            self._Calibrator__tmp_X = []
+            self._Calibrator__tmp_Y_y = []
+            self._Calibrator__tmp_Y_x = []
+            self.point_samples_seen = 0
+
+
+class TrackingContext:
+    """State of one EyeGestures_v2 context: its calibrator and gaze averaging"""
+
+    def __init__(self, calibrator):
+        self.clb = calibrator
+        self.iterator = 0
+        self.average_points = PointAverager(20)
+        self.filled_points = 0
+        self.calibration = False
+
+
+class ContextRegistry:
+    """The contexts of an EyeGestures_v2, at most 'capacity' of them in memory.
+
+    When a new context doesn't fit, the least recently used one is evicted. With 'spill_dir' its calibration is
+    pickled there first (in the saveModel format) and restored when the context is used again, otherwise it is
+    dropped. 'create' makes a new TrackingContext, 'save' / 'load' turn one into bytes and back
+    """
+
+    SUFFIX = ".context"
+
+    def __init__(self, create, save, load, capacity = 8, spill_dir = None):
+        if capacity < 1:
+            raise ValueError(f"capacity must be at least 1, got {capacity}")
+        self.create = create
+        self.save = save
+        self.load = load
+        self.capacity = capacity
+        self.spill_dir = spill_dir
+        self.contexts = OrderedDict()
+        self.stats = {"created": 0, "evicted": 0, "spilled": 0, "restored": 0}
+
+    def __contains__(self, name):
+        return name in self.contexts
+
+    def __len__(self):
+        return len(self.contexts)
+
+    def _spill_path(self, name):
+        digest = hashlib.sha1(str(name).encode("utf-8")).hexdigest()
+        return os.path.join(self.spill_dir, digest + self.SUFFIX)
+
+    def get(self, name):
+        """The context called 'name', restored from disk or created if it isn't in memory"""
+        context = self.contexts.get(name)
+        if context is not None:
+            self.contexts.move_to_end(name)
+            return context
+
+        context = None
+        if self.spill_dir is not None:
+            path = self._spill_path(name)
+            if os.path.exists(path):
+                try:
+                    with open(path, "rb") as f:
+                        context = self.load(f.read())
+                    self.stats["restored"] += 1
+                except Exception as e:
+                    print(f"Couldn't restore context {name!r} from {path}, starting it over: {e}")
+                os.remove(path)
+        if context is None:
+            context = self.create()
+            self.stats["created"] += 1
+        self.put(name, context)
+        return context
+
+    def put(self, name, context):
+        self.contexts[name] = context
+        self.contexts.move_to_end(name)
+        while len(self.contexts) > self.capacity:
+            self._evict(*self.contexts.popitem(last=False))
+
+    def _evict(self, name, context):
+        self.stats["evicted"] += 1
+        if self.spill_dir is None:
+            return
+        os.makedirs(self.spill_dir, exist_ok=True)
+        with open(self._spill_path(name), "wb") as f:
+            f.write(self.save(context))
+        self.stats["spilled"] += 1
+
+
 class EyeGestures_v2:
-    """Main class for EyeGesture tracker. It configures and manages entire algorithm"""
+    """Main class for EyeGesture tracker. It configures and manages entire algorithm
 
-    def __init__(self, calibration_radius = 1000):
+    Every context has its own calibration. At most max_contexts of them are kept in memory (least recently used
+    ones are evicted, to spill_dir if given, see ContextRegistry), and each calibrator keeps at most max_samples
+    samples (see BoundedCalibrator), so long sessions that switch contexts run in flat memory
+    """
+
+    def __init__(self, calibration_radius = 1000, max_contexts = 8, spill_dir = None, max_samples = 5000,
+                 max_point_samples = 300):
         self.monitor_width  = 1
         self.monitor_height = 1
         self.calibration_radius = calibration_radius 
+        self.max_samples = max_samples
+        self.max_point_samples = max_point_samples
 
-        self.clb = dict() # Calibrator_v2()
+        self.contexts = ContextRegistry(self._new_context, self._save_context, self._load_context,
+                                        capacity = max_contexts, spill_dir = spill_dir)
         self.cap = None
         self.gestures = EyeGestures_v1(285,115,200,100)
 
-        self.calibration = dict()
-
         self.CN = 5
 
-        self.average_points = dict()
-        self.iterator = dict()
-        self.filled_points= dict()
         self.enable_CN = False
         self.calibrate_gestures = False
 
         self.fix = 0.8
 
+        # Feature vector filled in place by getLandmarks (reallocated only if the number of landmarks changes)
+        self.key_points = None
+
+    # What saveModel keeps of a calibrator. The calibrator itself can't be pickled (it holds a lock and its
+    # fitting threads), so its samples and fitted regressors are saved and put into a new calibrator on load
+    CALIBRATOR_STATE = ("X", "Y_x", "Y_y", "reg_x", "reg_y", "fitted", "current_algorithm",
+                        "acceptance_radius", "calibration_radius", "matrix", "samples_seen", "correction")
+
+    def _new_calibrator(self):
+        return BoundedCalibrator(self.calibration_radius, self.max_samples, self.max_point_samples)
+
+    def _new_context(self):
+        return TrackingContext(self._new_calibrator())
+
+    def _save_context(self, context):
+        clb = context.clb
+        with clb.lock:
+            state = {name: getattr(clb, name) for name in self.CALIBRATOR_STATE if hasattr(clb, name)}
+            # Samples of the current calibration point, not merged into X yet
+            X, Y_y, Y_x = clb._point_samples()
+            state["X"] = state["X"] + X
+            state["Y_x"] = state["Y_x"] + Y_x
+            state["Y_y"] = state["Y_y"] + Y_y
+            return pickle.dumps(state)
+
+    def _load_context(self, model):
+        state = pickle.loads(model)
+        clb = self._new_calibrator()
+        for name, value in state.items():
+            setattr(clb, name, value)
+        # Calibrations saved before the sample count was kept
+        clb.samples_seen = max(clb.samples_seen, len(clb.X))
+        return TrackingContext(clb)
+
     def saveModel(self, context = "main"):
-        if context in self.clb:
-            return pickle.dumps(self.clb[context])
+        """Returns the calibration of 'context' as bytes (None if there is none), see loadModel"""
+        if context in self.contexts:
+            return self._save_context(self.contexts.get(context))
 
     def loadModel(self,model, context = "main"):
-        self.clb[context] = pickle.loads(model)
+        """Restores a calibration saved by saveModel. Tracking can start right away, and further calibration
+        adds to the restored samples (or corrects them for drift, see startDriftCorrection)"""
+        self.contexts.put(context, self._load_context(model))
 
     def uploadCalibrationMap(self,points,context = "main"):
-        self.addContext(context)
-        self.clb[context].updMatrix(np.array(points))
+        self.contexts.get(context).clb.updMatrix(np.array(points))
+
+    def startDriftCorrection(self, points, context = "main"):
+        """Calibrate on 'points' to correct a restored calibration (see loadModel) for the new head / camera
+        position: the samples fit a correction of its predictions instead of being added to its samples"""
+        clb = self.contexts.get(context).clb
+        clb.updMatrix(np.array(points))
+        clb.start_drift_correction()
 
     def getLandmarks(self, frame, calibrate = False, context="main"):
 
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-        frame = cv2.flip(frame,1)
+        # The tracker works on mirrored BGR frames (it converts to RGB / gray itself).
+        # A FrameDescriptor (pipeline/frame_descriptor.py) knows what its pixels are and hands out that version
+        # directly: one flip, shared through its ConversionCache, no color conversion.
+        # A plain array is taken to be RGB, as callers used to convert before step()
+        if hasattr(frame, "view"):
+            frame = frame.view("BGR", mirrored=True)
+        else:
+            frame = cv2.cvtColor(frame, cv2.COLOR_RGB2BGR)
+            frame = cv2.flip(frame,1)
         # frame = cv2.resize(frame, (360, 640))
 
         event, cevent = self.gestures.step(
@@ -67,9 +336,17 @@ class EyeGestures_v2:
             l_eye_landmarks = event.l_eye.getLandmarks()
             r_eye_landmarks = event.r_eye.getLandmarks()
 
-            cursors = np.array([cursor_x,cursor_y]).reshape(1, 2)
-            eye_events = np.array([event.blink,event.fixation]).reshape(1, 2)
-            key_points = np.concatenate((cursors,l_eye_landmarks,r_eye_landmarks,eye_events))
+            # Same layout as concatenating (cursor, left eye, right eye, (blink, fixation)), but written into
+            # the same buffer every frame. It is overwritten by the next call (the calibrator copies what it keeps)
+            n_left = len(l_eye_landmarks)
+            rows = n_left + len(r_eye_landmarks) + 2
+            if self.key_points is None or self.key_points.shape[0] != rows:
+                self.key_points = np.empty((rows, 2))
+            key_points = self.key_points
+            key_points[0] = cursor_x, cursor_y
+            key_points[1:n_left + 1] = l_eye_landmarks
+            key_points[n_left + 1:-1] = r_eye_landmarks
+            key_points[-1] = event.blink, event.fixation
             return np.array((cursor_x, cursor_y)), key_points, event.blink, event.fixation, cevent
         return np.array((0.0, 0.0)), np.array([]), 0, 0, None
 
@@ -77,9 +354,8 @@ class EyeGestures_v2:
         self.CN = impact
 
     def reset(self, context = "main"):
-        self.filled_points[context] = 0
-        if context in self.clb:
-           self.addContext(context)
+        if context in self.contexts:
+            self.contexts.get(context).filled_points = 0
 
     def setFixation(self,fix):
         self.fix = fix
@@ -94,19 +370,13 @@ class EyeGestures_v2:
         self.enable_CN = False
 
     def addContext(self, context):
-        if context not in self.clb:
-            self.clb[context] = Calibrator_v2(self.calibration_radius)
-            self.average_points[context] = Buffor(20)
-            self.iterator[context] = 0
-            self.average_points[context] = np.zeros((20,2))
-            self.filled_points[context] = 0
-            self.calibration[context] = False
+        return self.contexts.get(context)
 
 
     def step(self, frame, calibration, width, height, context="main"):
-        self.addContext(context)
+        ctx = self.addContext(context)
 
-        self.calibration[context] = calibration
+        ctx.calibration = calibration
         self.monitor_width = width
         self.monitor_height = height
 
@@ -118,39 +388,39 @@ class EyeGestures_v2:
             return (None, None)
 
         margin = 10
-        if (classic_point[0] <= margin) and self.calibration[context]:
+        if (classic_point[0] <= margin) and ctx.calibration:
             self.calibrate_gestures = cevent.calibration
-        elif (classic_point[0] >= width - margin) and self.calibration[context]:
+        elif (classic_point[0] >= width - margin) and ctx.calibration:
             self.calibrate_gestures = cevent.calibration
-        elif (cevent.point[1] <= margin) and self.calibration[context]:
+        elif (cevent.point[1] <= margin) and ctx.calibration:
             self.calibrate_gestures = cevent.calibration
-        elif (classic_point[1] >= height - margin) and self.calibration[context]:
+        elif (classic_point[1] >= height - margin) and ctx.calibration:
             self.calibrate_gestures = cevent.calibration
         else:
             self.calibrate_gestures = False
 
-        y_point = self.clb[context].predict(key_points)
-        self.average_points[context][1:,:] = self.average_points[context][:(self.average_points[context].shape[0] - 1),:]
-        if fixation <= self.fix:
-            self.average_points[context][0,:] = y_point
+        y_point = ctx.clb.predict(key_points)
+        # While fixating the new prediction goes in, otherwise the newest one counts again
+        average_points = ctx.average_points
+        average_points.push(y_point if fixation <= self.fix else None)
 
-        if self.filled_points[context] < self.average_points[context].shape[0] and (y_point != np.array([0.0,0.0])).any():
-            self.filled_points[context] += 1
+        if ctx.filled_points < average_points.size and (y_point[0] != 0.0 or y_point[1] != 0.0):
+            ctx.filled_points += 1
 
-        averaged_point = (np.sum(self.average_points[context][:,:],axis=0) + (classic_point * self.CN))/(self.filled_points[context] + self.CN)
+        averaged_point = (average_points.sum + (classic_point * self.CN))/(ctx.filled_points + self.CN)
 
-        if self.calibration[context] and (self.clb[context].insideClbRadius(averaged_point,width,height) or self.filled_points[context] < self.average_points[context].shape[0] * 10):
-            self.clb[context].add(key_points,self.clb[context].getCurrentPoint(width,height))
+        if ctx.calibration and (ctx.clb.insideClbRadius(averaged_point,width,height) or ctx.filled_points < average_points.size * 10):
+            ctx.clb.add(key_points,ctx.clb.getCurrentPoint(width,height))
 
-        if self.calibration[context] and self.clb[context].insideAcptcRadius(averaged_point,width,height):
-            self.iterator[context] += 1
-            if self.iterator[context] > 10:
-                self.iterator[context] = 0
-                self.clb[context].movePoint()
-                # self.clb[context].increase_precision()
+        if ctx.calibration and ctx.clb.insideAcptcRadius(averaged_point,width,height):
+            ctx.iterator += 1
+            if ctx.iterator > 10:
+                ctx.iterator = 0
+                ctx.clb.movePoint()
+                # ctx.clb.increase_precision()
 
         gevent = Gevent(averaged_point,blink,fixation)
-        cevent = Cevent(self.clb[context].getCurrentPoint(width,height),self.clb[context].acceptance_radius, self.clb[context].calibration_radius)
+        cevent = Cevent(ctx.clb.getCurrentPoint(width,height),ctx.clb.acceptance_radius, ctx.clb.calibration_radius)
         return (gevent, cevent)
 
 class EyeGestures_v1:
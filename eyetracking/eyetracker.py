@@ -1,12 +1,23 @@
+import os
+import sys
+import argparse
 import pygame
 import cv2
-from eyeGestures.eyegestures import EyeGestures_v2
-from eyeGestures.utils import VideoCapture
 import pyautogui
 import time
 
-def main():
-    cap = VideoCapture(0)  # Use the default webcam
+# Allow importing the shared 'pipeline' package when this script is run from inside eyetracking/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pipeline import LatestFrameCapture, FrameDescriptor, add_source_arguments, open_frame_source_from_args
+from eyetracking.eyegestures import EyeGestures_v2, VERSION as TRACKER_VERSION
+from eyetracking.cursor_driver import add_cursor_arguments, cursor_driver_from_args
+from eyetracking.calibration_store import (add_calibration_arguments, calibration_store_from_args, camera_key,
+                                           prepare_calibration, save_calibration)
+
+def main(args):
+    # Webcam by default, see --source for recorded clips / synthetic frames
+    # Only the newest frame is kept, like the bufferless eyeGestures VideoCapture used before
+    cap = LatestFrameCapture(open_frame_source_from_args(args)).start()
 
     framerate = 60
     radius = 400
@@ -52,10 +63,20 @@ def main():
     prev_x = 0
     prev_y = 0
 
+    # A calibration stored for this user and camera only needs a short drift correction
+    calibrations = calibration_store_from_args(args)
+    camera = camera_key(args)
+    total_iterations, profile = prepare_calibration(eye_gestures, calibrations, args.user, camera,
+                                                    (screen_width, screen_height), TRACKER_VERSION,
+                                                    recalibrate=args.recalibrate, full_points=total_iterations)
+
     # Pre-calibration message
-    pre_calibration_message_line1 = "Hello! Your eye-tracking calibration is about to begin."
+    if profile is None:
+        pre_calibration_message_line1 = "Hello! Your eye-tracking calibration is about to begin."
+    else:
+        pre_calibration_message_line1 = f"Welcome back! A short {total_iterations}-point calibration check is about to begin."
     pre_calibration_message_line2 = "Please try to keep your head as still as possible and focus on the number in the centers of the dots."
-    countdown = 6
+    countdown = 6 if profile is None else 2
 
     # Display pre-calibration message with countdown
     for i in range(countdown, -1, -1):
@@ -83,14 +104,13 @@ def main():
 
     # Calibration Loop
     while calibrating:
-        ret, frame = cap.read()
-        if not ret:
+        captured = cap.read()
+        if captured is None:
             print("Failed to grab frame")
             break
 
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
         gevent, cevent = eye_gestures.step(
-            frame,
+            FrameDescriptor.from_capture(captured),
             calibration=True,
             width=screen_width,
             height=screen_height,
@@ -139,17 +159,23 @@ def main():
 
     pygame.quit()
 
+    # Keep the (drift corrected) calibration for next time, unless it was cut short
+    if iterator > total_iterations:
+        save_calibration(eye_gestures, calibrations, args.user, camera, (screen_width, screen_height), TRACKER_VERSION)
+
+    # The cursor is smoothed and moved on its own thread, at most --cursor-rate times per second
+    cursor = cursor_driver_from_args(args, screen_width, screen_height).start()
+
     # Tracking Loop
     tracking = True
     while tracking:
-        ret, frame = cap.read()
-        if not ret:
+        captured = cap.read()
+        if captured is None:
             print("Failed to grab frame")
             break
 
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
         gevent, _ = eye_gestures.step(
-            frame,
+            FrameDescriptor.from_capture(captured),
             calibration=False,
             width=screen_width,
             height=screen_height,
@@ -158,13 +184,15 @@ def main():
 
         if gevent is not None:
             gaze_point = gevent.point  # (x, y) coordinates
-            # Ensure the gaze point is within screen bounds
-            x = min(max(int(gaze_point[0]), 0), screen_width - 1)
-            y = min(max(int(gaze_point[1]), 0), screen_height - 1)
-            pyautogui.moveTo(x, y)
+            cursor.update(gaze_point[0], gaze_point[1], captured.timestamp)
 
+    cursor.stop()
     cap.release()
     cv2.destroyAllWindows()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Standalone eye tracker")
+    add_source_arguments(parser)
+    add_cursor_arguments(parser)
+    add_calibration_arguments(parser)
+    main(parser.parse_args())
\ No newline at end of file
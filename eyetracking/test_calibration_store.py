@@ -0,0 +1,41 @@
+import pytest
+
+from eyetracking.calibration_store import CalibrationStore
+
+
+def test_round_trip_counts_revisions(tmp_path):
+    store = CalibrationStore(str(tmp_path))
+    store.save("ana", "camera:0", b"model", screen=(1920, 1080), tracker="2.0.0")
+    store.save("ana", "camera:0", b"model 2", screen=(1920, 1080), tracker="2.0.0")
+    profile = store.load("ana", "camera:0", screen=(1920, 1080), tracker="2.0.0")
+    assert profile.model == b"model 2"
+    assert profile.revision == 2
+    assert profile.screen == (1920, 1080)
+
+
+def test_other_screen_or_tracker_is_not_used(tmp_path):
+    store = CalibrationStore(str(tmp_path))
+    store.save("ana", "camera:0", b"model", screen=(1920, 1080), tracker="2.0.0")
+    assert store.load("ana", "camera:0", screen=(1280, 720)) is None
+    assert store.load("ana", "camera:0", tracker="3.0.0") is None
+
+
+def test_corrupt_model_is_not_used(tmp_path):
+    store = CalibrationStore(str(tmp_path))
+    store.save("ana", "camera:0", b"model")
+    path = store.path("ana", "camera:0")
+    with open(path, "ab") as f:
+        f.write(b"garbage")
+    assert store.load("ana", "camera:0") is None
+
+
+@pytest.mark.parametrize("header", [b"[]", b'"x"', b"3", b"null", b"not json"])
+def test_header_that_isnt_an_object_is_not_used(tmp_path, header):
+    store = CalibrationStore(str(tmp_path))
+    path = store.path("ana", "camera:0")
+    tmp_path.joinpath("ana").mkdir()
+    with open(path, "wb") as f:
+        f.write(header + b"\nmodel")
+    assert store.load("ana", "camera:0") is None
+    # And saving over it starts the revisions over
+    assert store.save("ana", "camera:0", b"model").revision == 1
@@ -0,0 +1,85 @@
+import threading
+
+import numpy as np
+import pytest
+
+from eyetracking.cursor_driver import CursorDriver, OneEuroFilter
+
+
+def test_filter_smooths_jitter_at_rest():
+    noise = np.random.default_rng(0).normal(0, 10, 300)
+    smooth = OneEuroFilter(min_cutoff=1.0, beta=0.0)
+    out = [smooth(500 + n, i / 30) for i, n in enumerate(noise)]
+    assert np.std(out[30:]) < np.std(noise) / 3
+
+
+def test_filter_follows_a_jump_faster_with_beta():
+    def settle_time(beta):
+        smooth = OneEuroFilter(min_cutoff=1.0, beta=beta)
+        smooth(0.0, 0.0)
+        for i in range(1, 300):
+            if smooth(1000.0, i / 30) > 900:
+                return i
+        return None
+
+    assert settle_time(0.05) < settle_time(0.0)
+
+
+def test_filter_ignores_repeated_timestamps():
+    smooth = OneEuroFilter()
+    smooth(10.0, 1.0)
+    value = smooth(20.0, 1.5)
+    assert smooth(500.0, 1.5) == value
+
+
+class _Recorder:
+    def __init__(self):
+        self.moves = []
+        self.moved = threading.Event()
+
+    def __call__(self, x, y):
+        self.moves.append((x, y))
+        self.moved.set()
+
+
+def test_driver_clamps_to_the_screen_and_moves():
+    recorder = _Recorder()
+    with CursorDriver(100, 50, move=recorder) as driver:
+        assert driver.update(-20, 80, timestamp=0.0) == (0, 49)
+        assert recorder.moved.wait(2)
+    assert recorder.moves == [(0, 49)]
+    assert driver.stats["moves"] == 1
+
+
+def test_driver_skips_targets_inside_the_dead_zone():
+    recorder = _Recorder()
+    with CursorDriver(1000, 1000, dead_zone=4, move=recorder) as driver:
+        driver.update(500, 500, timestamp=0.0)
+        assert recorder.moved.wait(2)
+        recorder.moved.clear()
+        driver.update(502, 501, timestamp=1.0)
+        # The target is taken (and skipped) by the driver thread
+        for _ in range(200):
+            if driver.stats["skipped"]:
+                break
+            recorder.moved.wait(0.01)
+    assert recorder.moves == [(500, 500)]
+    assert driver.stats == {"samples": 2, "moves": 1, "skipped": 1}
+
+
+def test_driver_rate_limits_moves():
+    recorder = _Recorder()
+    driver = CursorDriver(10000, 10000, max_rate=5, dead_zone=0, min_cutoff=1000, move=recorder).start()
+    for i in range(50):
+        driver.update(i * 100, 0, timestamp=i / 100)
+        threading.Event().wait(0.01)
+    driver.stop()
+    # At least 0.5 s at 5 moves / s; points arriving in between replace the target instead of queueing up
+    assert 2 <= len(recorder.moves) <= 4
+    xs = [x for x, _ in recorder.moves]
+    assert xs == sorted(xs) and xs[-1] - xs[0] >= 1000
+
+
+def test_max_rate_must_be_positive():
+    with pytest.raises(ValueError):
+        CursorDriver(100, 100, max_rate=0)
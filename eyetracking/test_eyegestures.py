@@ -0,0 +1,118 @@
+import random
+
+import numpy as np
+import pytest
+
+pytest.importorskip("sklearn")
+pytest.importorskip("eyeGestures")
+
+from eyetracking.eyegestures import BoundedCalibrator, ContextRegistry, reservoir_put
+
+
+def test_reservoir_keeps_a_uniform_sample():
+    counts = np.zeros(100)
+    for seed in range(2000):
+        columns = ([],)
+        rng = random.Random(seed)
+        for i in range(100):
+            reservoir_put(columns, (i,), i + 1, 10, rng)
+        assert len(columns[0]) == 10
+        for value in columns[0]:
+            counts[value] += 1
+    # Every row ends up in 10 of 100 samples on average, i.e. 200 times in 2000 runs
+    assert counts.min() > 140 and counts.max() < 260
+
+
+def test_reservoir_keeps_columns_aligned():
+    columns = ([], [])
+    rng = random.Random(0)
+    for i in range(1000):
+        reservoir_put(columns, (i, -i), i + 1, 20, rng)
+    assert [-x for x in columns[0]] == columns[1]
+
+
+class _Context:
+    def __init__(self, value=0):
+        self.value = value
+
+
+def _registry(capacity, spill_dir=None):
+    return ContextRegistry(_Context, lambda context: str(context.value).encode(),
+                           lambda data: _Context(int(data)), capacity=capacity, spill_dir=spill_dir)
+
+
+def test_registry_evicts_the_least_recently_used():
+    registry = _registry(2)
+    registry.get("a")
+    registry.get("b")
+    registry.get("a")
+    registry.get("c")
+    assert "a" in registry and "c" in registry and "b" not in registry
+    assert len(registry) == 2
+    assert registry.stats == {"created": 3, "evicted": 1, "spilled": 0, "restored": 0}
+
+
+def test_registry_spills_and_restores(tmp_path):
+    registry = _registry(1, spill_dir=str(tmp_path))
+    registry.get("a").value = 42
+    registry.get("b")
+    assert "a" not in registry
+    assert len(list(tmp_path.iterdir())) == 1
+
+    assert registry.get("a").value == 42
+    assert registry.stats["restored"] == 1
+    # "b" was spilled in turn, "a"'s file is gone
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+def test_registry_starts_over_from_an_unreadable_spill(tmp_path):
+    registry = _registry(1, spill_dir=str(tmp_path))
+    registry.get("a")
+    registry.get("b")
+    for path in tmp_path.iterdir():
+        path.write_bytes(b"not a number")
+    assert registry.get("a").value == 0
+    assert registry.stats["restored"] == 0
+
+
+def test_calibrator_samples_stay_bounded():
+    calibrator = BoundedCalibrator(100, max_samples=50, max_point_samples=20, seed=1)
+    for point in range(10):
+        for i in range(100):
+            calibrator.add(np.full((3, 2), float(i)), np.array([point, point]))
+        assert len(calibrator._point_samples()[0]) == 20
+        calibrator.movePoint()
+        assert calibrator._point_samples() == ([], [], [])
+    assert len(calibrator.X) == len(calibrator.Y_x) == len(calibrator.Y_y) == 50
+    assert calibrator.samples_seen == 200
+    for coroutine in calibrator.fit_coroutines:
+        coroutine.join()
+
+
+def _fitted_calibrator(weights, rng):
+    calibrator = BoundedCalibrator(100, seed=0)
+    for _ in range(200):
+        x = rng.normal(size=(4, 2))
+        calibrator.add(x, weights @ x.flatten())
+    calibrator.movePoint()
+    for coroutine in calibrator.fit_coroutines:
+        coroutine.join()
+    return calibrator
+
+
+def test_drift_correction_fits_an_offset_instead_of_adding_samples():
+    rng = np.random.default_rng(0)
+    weights = rng.normal(size=(2, 8)) * 100
+    calibrator = _fitted_calibrator(weights, rng)
+    samples = len(calibrator.X)
+
+    # The head moved: the same eye features now mean a point 50 px right and 30 px up
+    calibrator.start_drift_correction()
+    for _ in range(100):
+        x = rng.normal(size=(4, 2))
+        calibrator.add(x, weights @ x.flatten() + (50, -30))
+    calibrator.movePoint()
+
+    assert len(calibrator.X) == samples
+    x = rng.normal(size=(4, 2))
+    assert calibrator.predict(x) == pytest.approx(weights @ x.flatten() + (50, -30), abs=5)
@@ -1,5 +1,6 @@
 # main.py
-import cv2
+# Imported before anything else so that --profile-startup can time the imports below
+from pipeline.startup_profiler import startup_profiler, add_profiler_arguments, budgets_from_args, INTERACTIVE
 import sys
 import dlib
 import numpy as np
@@ -8,19 +9,28 @@ import os
 import sys
 import pygame
 import time
-import pyautogui
 import threading
 import facegestures.pose as service
 import warnings
+import argparse
+import functools
+import json
 from sklearn.exceptions import ConvergenceWarning
 from imutils import face_utils
 from imutils.video import VideoStream
 from PyQt5.QtWidgets import QApplication
 from PyQt5 import QtCore
-from collections import deque
 from facegestures.gestures import *
-from eyetracking.eyegestures import EyeGestures_v2
+from eyetracking.eyegestures import EyeGestures_v2, VERSION as TRACKER_VERSION
+from pipeline import (StageExecutor, LatestFrameCapture, ModelLoader, ActionDispatcher, add_source_arguments,
+                      open_frame_source_from_args, log_stage_error, FrameDescriptor, ConversionCache, GRAY)
+from pipeline.process_engine import (ProcessDetectionEngine, RemoteEyeGestures, StageError,
+                                     face_landmark_stage, pose_landmark_stage, unified_landmark_stage, gaze_stage)
+from eyetracking.cursor_driver import add_cursor_arguments, cursor_driver_from_args
+from eyetracking.calibration_store import (add_calibration_arguments, calibration_store_from_args, camera_key,
+                                           prepare_calibration, save_calibration)
 from ui.overlay import Overlay
+from ui.tts.tts_main import TTSEngine
 
 if not sys.warnoptions:
     warnings.simplefilter("ignore")
@@ -32,39 +42,73 @@ if not sys.warnoptions:
     I have tried to add as many comments as possible to explain how things are working here. 
 """
 
+PREDICTOR_PATH = "facegestures/models/shape_predictor_68_face_landmarks.dat"
+POSE_MODEL_PATH = "facegestures/models/sparse_face.tflite"
+
 # This class holds all the data that the different threads need to access, share, and modify
 class SharedState:
     def __init__(self):
+        # Every window, cooldown and calibration time below is in seconds of capture time (see frame_time), not
+        # in frames, so the gestures behave the same whatever rate the frames are processed at
+        # (the defaults are the old frame counts at 30 FPS)
+        # Capture time of the frame being processed
+        self.frame_time = None
+
         # Blink detection variables
         self.blink_counter = 0
-        self.BLINK_QUEUE_SIZE = 5
-        self.blink_history = deque([1] * self.BLINK_QUEUE_SIZE, maxlen=self.BLINK_QUEUE_SIZE)
-        self.BLINK_DISPLAY_DURATION = 30
-        self.blink_display_frames = 0
-        self.BLINK_BUFFER_DURATION = 20
-        self.blink_buffer_frames = 0
+        self.BLINK_WINDOW = 0.33   # seconds the EAR is averaged over
+        self.blink_history = RingBuffer.timed(self.BLINK_WINDOW)
+        self.BLINK_DISPLAY_DURATION = 1.0
+        self.blink_display_until = 0
         self.calibrated_ear = 0
         self.EAR_SCALAR = 0.70   # larger value == easier to detect blinks
         
         # Checking if centered variables
-        self.IS_CENTERED_QUEUE_SIZE = 15
-        self.is_centered_queue = deque([0] * self.IS_CENTERED_QUEUE_SIZE, maxlen=self.IS_CENTERED_QUEUE_SIZE)
+        self.IS_CENTERED_WINDOW = 0.5   # seconds
+        self.is_centered_queue = RingBuffer.timed(self.IS_CENTERED_WINDOW)
 
         # Total number of frames passed
         self.frame_counter = 0
 
         # Eyebrow raise detection variables
-        self.eyebrow_counter = 0
         self.EYEBROW_THRESHOLD = 0.475     # Deprecated / no longer in use
         self.calibrated_eyebrow_distance = 0
         self.EYEBROW_SCALAR = 1.35   # Larger val == eyebrows have to raised higher in order to detect
-        self.eyebrow_list = []
 
         # Calibration variables
         self.calibration_time = 3  # seconds
         self.calibrating = True
-        self.ear_list = []
-        self.start_time = time.time()
+        # Capture time of the first calibration sample
+        self.start_time = None
+        # Streaming 5th percentiles of the EAR / eyebrow distance (constant memory, no list of every sample)
+        self.CALIBRATION_QUANTILE = 0.05
+        self.ear_quantile = P2Quantile(self.CALIBRATION_QUANTILE)
+        self.eyebrow_quantile = P2Quantile(self.CALIBRATION_QUANTILE)
+        # Medians of the same samples, the resting EAR / eyebrow distance the thresholds were set at
+        self.ear_median = P2Quantile(0.5)
+        self.eyebrow_median = P2Quantile(0.5)
+        self.reference_ear = None
+        self.reference_eyebrow_distance = None
+
+        # Background calibration: after the initial calibration the medians keep being estimated over
+        # consecutive windows of resting faces, and each window scales the thresholds part of the way by how
+        # far its medians moved from the reference ones, so they follow slow changes (lighting, fatigue)
+        # without calibrating again. Adaptation skips blinks / raises, which would bias a 5th percentile
+        # against the one the thresholds were calibrated with; the medians hardly depend on them
+        self.ADAPTIVE_CALIBRATION = True
+        self.ADAPTATION_WINDOW = 20  # seconds
+        self.ADAPTATION_RATE = 0.2   # weight of the newest window (exponential moving average)
+        self.adaptation_start = None
+
+        # Warm start: with a baseline stored for this user / camera (see load_gesture_baseline) the stored
+        # thresholds are used right away, and the first VERIFICATION_TIME seconds of live samples check them.
+        # They are only replaced if the live estimate is more than BASELINE_TOLERANCE (relative) away
+        self.VERIFICATION_TIME = 3  # seconds
+        self.BASELINE_TOLERANCE = 0.15
+        self.verifying = False
+        self.verification_start = None
+        # Set when the thresholds / sensitivity changed and should be stored again (the main loop does it)
+        self.baseline_dirty = False
         
         # Dictionary of dictionaries used to change how easy / hard it is to trigger different gestures
         # Higher sensitivity == 'more sensitive', i.e., easier to trigger detection
@@ -72,18 +116,19 @@ class SharedState:
         self.current_sensitivity = 0
         self.sensitivities = {
             2: {"shake_threshold": 3, "nod_threshold": 2, "eyebrow_scalar": 1.2, "ear_scalar": 0.80,
-                     "gaze_time_window": 30},
+                     "gaze_time_window": 1.0},
             1: {"shake_threshold": 4, "nod_threshold": 3, "eyebrow_scalar": 1.35, "ear_scalar": 0.70,
-                       "gaze_time_window": 50},
+                       "gaze_time_window": 1.67},
             0: {"shake_threshold": 5, "nod_threshold": 4, "eyebrow_scalar": 1.45, "ear_scalar": 0.60,
-                    "gaze_time_window": 70}}
+                    "gaze_time_window": 2.33}}
 
         # Shake/Nod detection variables
         self.SHAKE_THRESHOLD = 4  # Number of changes from left->right to count as a shake
         self.NOD_THRESHOLD = 4   # Number of changes from up->down to count as a nod
-        self.GAZE_TIME_WINDOW = 50   # Number of frames to check for shake/nod. Also used to check for gaze left/right and gaze up/down
-        self.left_right_history = deque([0] * self.GAZE_TIME_WINDOW, maxlen=self.GAZE_TIME_WINDOW)   
-        self.up_down_history = deque([0] * self.GAZE_TIME_WINDOW, maxlen=self.GAZE_TIME_WINDOW)
+        self.GAZE_TIME_WINDOW = 1.67   # Seconds to check for shake/nod. Also used to check for gaze left/right and gaze up/down
+        # GestureWindows keep the shake / nod / look statistics up to date as directions are pushed
+        self.left_right_history = GestureWindow.timed(self.GAZE_TIME_WINDOW)
+        self.up_down_history = GestureWindow.timed(self.GAZE_TIME_WINDOW)
         
         # Keyboard variables
         self.last_change_time = 0
@@ -95,12 +140,26 @@ class SharedState:
         # Lock for thread synchronization
         self.lock = threading.Lock()
         
-        # Universal buffer duration and counter
-        self.UNIVERSAL_BUFFER_DURATION = 50
-        self.KEYBOARD_BUFFER_DURATION = 15
-        self.universal_buffer_frames = 0
+        # Every gesture is a small state machine with its own debounce (hold), hysteresis (release),
+        # refractory period and priority (see facegestures/gestures/gesture_engine.py). The stages only report
+        # whether each gesture's signal is on, and once per frame the arbiter picks at most one gesture to act on.
+        # One gesture's cooldown no longer blocks the others, only the short lockout after any gesture does
+        self.GESTURE_LOCKOUT = 0.25
+        self.KEYBOARD_BUFFER_DURATION = 0.25   # refractory period of a gesture that acted on the keyboard
+        self.gestures = GestureEngine(lockout=self.GESTURE_LOCKOUT)
+        self.gestures.add("eyebrow_raise", priority=7, hold=0.15, release=0.1, refractory=0.5)
+        self.gestures.add("blink", priority=6, release=0.1, refractory=0.5)
+        self.gestures.add("look_left", priority=5, refractory=0.83, repeat=0.83)
+        self.gestures.add("look_right", priority=4, refractory=0.83, repeat=0.83)
+        self.gestures.add("look_up", priority=3, refractory=0.83, repeat=0.83)
+        self.gestures.add("look_down", priority=2, refractory=0.83, repeat=0.83)
+        self.gestures.add("shake", priority=1, release=0.2, refractory=0.83)
+        self.gestures.add("nod", priority=0, release=0.2, refractory=0.83)
         
-        # self.is_eyetracking = True
+        # Eye tracking runs next to the gesture stages at its own pace (see eye_tracking)
+        self.is_eyetracking = True
+        # frames: gaze points computed, stale: dropped for being over the latency budget
+        self.gaze_stats = {"frames": 0, "stale": 0}
         # self.blink_timestamps = deque()
         # self.TRIPLE_BLINK_TIME_WINDOW = 2.0  # seconds
         
@@ -108,11 +167,7 @@ class SharedState:
     # Choose from some default sensitivity levels
     def setSensitivity(self, sensitivity):
         if sensitivity in self.sensitivities:
-            self.SHAKE_THRESHOLD = self.sensitivities[sensitivity]["shake_threshold"]
-            self.NOD_THRESHOLD = self.sensitivities[sensitivity]["nod_threshold"]
-            self.EYEBROW_SCALAR = self.sensitivities[sensitivity]["eyebrow_scalar"]
-            self.EAR_SCALAR = self.sensitivities[sensitivity]["ear_scalar"]
-            self.GAZE_TIME_WINDOW = self.sensitivities[sensitivity]["gaze_time_window"]
+            self.apply_sensitivity_settings(self.sensitivities[sensitivity])
             # print(f"Sensitivity changed to {sensitivity}!")
             # print(f"Shake Threshold: {self.SHAKE_THRESHOLD}")
             # print(f"Nod Threshold: {self.NOD_THRESHOLD}")
@@ -121,6 +176,124 @@ class SharedState:
             # print()
         else:
             print(f"Invalid sensitivity level: {sensitivity}")
+
+    # The values a sensitivity level sets (same keys as the levels in self.sensitivities)
+    def sensitivity_settings(self):
+        return {"shake_threshold": self.SHAKE_THRESHOLD, "nod_threshold": self.NOD_THRESHOLD,
+                "eyebrow_scalar": self.EYEBROW_SCALAR, "ear_scalar": self.EAR_SCALAR,
+                "gaze_time_window": self.GAZE_TIME_WINDOW}
+
+    def apply_sensitivity_settings(self, settings):
+        self.SHAKE_THRESHOLD = settings["shake_threshold"]
+        self.NOD_THRESHOLD = settings["nod_threshold"]
+        self.EYEBROW_SCALAR = settings["eyebrow_scalar"]
+        self.EAR_SCALAR = settings["ear_scalar"]
+        self.GAZE_TIME_WINDOW = settings["gaze_time_window"]
+        # The shake / nod / look windows follow the new length (keeping the newest directions)
+        self.left_right_history.set_duration(self.GAZE_TIME_WINDOW)
+        self.up_down_history.set_duration(self.GAZE_TIME_WINDOW)
+
+    # Capture time of the current frame, or the current time if the caller didn't set one
+    def now(self):
+        return self.frame_time if self.frame_time is not None else time.monotonic()
+
+    # End of the initial calibration: the thresholds come from the percentiles estimated so far
+    def finish_calibration(self):
+        self.calibrated_ear = self.EAR_SCALAR * self.ear_quantile.value()
+        self.calibrated_eyebrow_distance = self.eyebrow_quantile.value()
+        print(f"Calibrated EAR: {self.calibrated_ear}")
+        print(f"Calibrated Eyebrow Distance: {self.calibrated_eyebrow_distance}")
+        self.calibrating = False
+        self._start_adaptation()
+        self.baseline_dirty = True
+
+    # Calibration / verification done: their medians are the reference the adaptation windows compare to
+    def _start_adaptation(self):
+        self.reference_ear = self.ear_median.value()
+        self.reference_eyebrow_distance = self.eyebrow_median.value()
+        for quantile in (self.ear_quantile, self.eyebrow_quantile, self.ear_median, self.eyebrow_median):
+            quantile.reset()
+        self.adaptation_start = self.now()
+
+    # Calibration sample (every centered face, like verification)
+    def add_calibration_sample(self, ear, eyebrow_dist):
+        self.ear_quantile.add(ear)
+        self.eyebrow_quantile.add(eyebrow_dist)
+        self.ear_median.add(ear)
+        self.eyebrow_median.add(eyebrow_dist)
+
+    # What is stored per user / camera: the thresholds, and the sensitivity level with the values in effect
+    # (the thresholds were calibrated with that EAR_SCALAR)
+    def baseline(self):
+        return {"calibrated_ear": float(self.calibrated_ear),
+                "calibrated_eyebrow_distance": float(self.calibrated_eyebrow_distance),
+                "sensitivity": self.current_sensitivity,
+                "settings": self.sensitivity_settings()}
+
+    # Use a stored baseline instead of calibrating. Returns False (and changes nothing) if it isn't usable
+    def warm_start(self, baseline):
+        try:
+            ear = float(baseline["calibrated_ear"])
+            eyebrow_distance = float(baseline["calibrated_eyebrow_distance"])
+            sensitivity = baseline["sensitivity"]
+            settings = baseline["settings"]
+            usable = set(settings) == set(self.sensitivity_settings()) and \
+                all(isinstance(value, (int, float)) and value > 0 for value in settings.values())
+        except (KeyError, TypeError, ValueError, AttributeError):
+            return False
+        if not usable or ear <= 0 or eyebrow_distance <= 0 or sensitivity not in self.sensitivities:
+            return False
+
+        self.current_sensitivity = sensitivity
+        self.apply_sensitivity_settings(settings)
+        self.calibrated_ear = ear
+        self.calibrated_eyebrow_distance = eyebrow_distance
+        self.calibrating = False
+        self.verifying = True
+        self.verification_start = None
+        return True
+
+    # Check the stored baseline against live samples (while it is already in use)
+    def verify_calibration(self, ear, eyebrow_dist):
+        if self.verification_start is None:
+            self.verification_start = self.now()
+        self.add_calibration_sample(ear, eyebrow_dist)
+        if self.now() - self.verification_start < self.VERIFICATION_TIME:
+            return
+
+        live_ear = self.EAR_SCALAR * self.ear_quantile.value()
+        live_eyebrow_distance = self.eyebrow_quantile.value()
+        if relative_difference(live_ear, self.calibrated_ear) > self.BASELINE_TOLERANCE or \
+                relative_difference(live_eyebrow_distance, self.calibrated_eyebrow_distance) > self.BASELINE_TOLERANCE:
+            print(f"Stored gesture baseline drifted, recalibrated EAR: {self.calibrated_ear} -> {live_ear}, "
+                  f"eyebrow distance: {self.calibrated_eyebrow_distance} -> {live_eyebrow_distance}")
+            self.calibrated_ear = live_ear
+            self.calibrated_eyebrow_distance = live_eyebrow_distance
+            self.baseline_dirty = True
+        self.verifying = False
+        self._start_adaptation()
+
+    # Background calibration, fed with the resting faces (no blink / raise / gesture under way) after the
+    # initial calibration or verification
+    def adapt_calibration(self, ear, eyebrow_dist):
+        if not self.ADAPTIVE_CALIBRATION or not self.reference_ear or not self.reference_eyebrow_distance:
+            return
+        self.ear_median.add(ear)
+        self.eyebrow_median.add(eyebrow_dist)
+        if self.now() - self.adaptation_start < self.ADAPTATION_WINDOW:
+            return
+
+        # Thresholds and references move together, by the newest window's share of the relative change
+        rate = self.ADAPTATION_RATE
+        ear_scale = 1 + rate * (self.ear_median.value() / self.reference_ear - 1)
+        eyebrow_scale = 1 + rate * (self.eyebrow_median.value() / self.reference_eyebrow_distance - 1)
+        self.calibrated_ear *= ear_scale
+        self.reference_ear *= ear_scale
+        self.calibrated_eyebrow_distance *= eyebrow_scale
+        self.reference_eyebrow_distance *= eyebrow_scale
+        self.ear_median.reset()
+        self.eyebrow_median.reset()
+        self.adaptation_start = self.now()
             
     # Manually adjust a variable by a specified amount
     def tweakSensitivity(self, attribute, amount=0.001, decrease=False):
@@ -138,241 +311,390 @@ class SharedState:
             print(f"Error: {attribute} is not a number and cannot be incremented.")
            
 
+# |a - b| relative to b
+def relative_difference(a, b):
+    return abs(a - b) / abs(b) if b else float("inf")
+
+
+# The gesture baselines are stored next to the eye tracker calibration, as JSON
+GESTURE_BASELINE = "gestures"
+
+# Warm start the gesture detection from the baseline stored for this user / camera. Returns whether there was one
+def load_gesture_baseline(shared_state, store, user, camera):
+    profile = store.load(user, camera, kind=GESTURE_BASELINE)
+    if profile is None:
+        return False
+    try:
+        baseline = json.loads(profile.model.decode("utf-8"))
+    except ValueError:
+        baseline = None
+    if not shared_state.warm_start(baseline):
+        print(f"Ignoring unusable gesture baseline {store.path(user, camera, GESTURE_BASELINE)}")
+        return False
+    print(f"Using stored gesture baseline (revision {profile.revision}): {baseline}")
+    return True
+
+
+def save_gesture_baseline(store, user, camera, baseline):
+    store.save(user, camera, json.dumps(baseline).encode("utf-8"), kind=GESTURE_BASELINE)
+
+
 # Function for everything 'landmark related' (face detection, blink detection, eyebrow raise detection)
-def face_and_blink_detection(frame, gray, shared_state, detector, predictor, overlay):
+# 'detections' can hold (face rectangle, landmarks) pairs that were already computed elsewhere
+# (e.g. by a detection worker process). Otherwise the locator finds them in 'gray'
+def face_and_blink_detection(frame, gray, shared_state, locator, overlay, detections=None):
     
     # print("MADE IT TO FACE AND BLINK")
     # Necessary measurements to determine if face is centered
     frame_center_x, frame_center_y = frame.shape[1] // 2, frame.shape[0] // 2
     center_margin_x, center_margin_y = frame.shape[1] * 0.2, frame.shape[0] * 0.2
     shared_state.frame_counter += 1
+    now = shared_state.now()
     
-    # Detect faces using dlib
-    temp_faces = detector(gray, 0)
-    # If the detector finds a face THIS frame, update it. Otherwise, keep the face found in the previous frame
-    if len(temp_faces) != 0:
-        shared_state.dlib_faces = temp_faces
+    # Detect faces and their landmarks using dlib
+    # If the detector doesn't find a face THIS frame, the face found in the previous frame is kept
+    if detections is None:
+        detections = locator.locate(gray)
+    shared_state.dlib_faces = [face for face, _ in detections]
+
+    # Gesture signals of this frame, off unless a calibrated, centered face says otherwise
+    eyes_closed = False
+    eyebrows_raised = False
 
     # Loop through each face found
-    for face in shared_state.dlib_faces:
-        # Get facial landmarks
-        landmarks = predictor(gray, face)
-        landmarks = face_utils.shape_to_np(landmarks)
+    for face, landmarks in detections:
         (x, y, w, h) = face_utils.rect_to_bb(face)
 
         face_center_x, face_center_y = x + w // 2, y + h // 2
         is_centered = (abs(face_center_x - frame_center_x) < center_margin_x) and \
                       (abs(face_center_y - frame_center_y) < center_margin_y)
 
-        shared_state.is_centered_queue.append(is_centered)
+        shared_state.is_centered_queue.append(is_centered, now)
 
-        if np.mean(shared_state.is_centered_queue) < 0.90 or abs(np.mean(shared_state.up_down_history)) > 0.4 or abs(np.mean(shared_state.left_right_history)) > 0.4:
+        # The face has to have been (mostly) centered for the whole window
+        if not shared_state.is_centered_queue.covers(shared_state.IS_CENTERED_WINDOW) or \
+                shared_state.is_centered_queue.mean() < 0.90 or abs(shared_state.up_down_history.mean()) > 0.4 or abs(shared_state.left_right_history.mean()) > 0.4:
             # Skip gesture detection if face is not centered
             continue
 
+        # Eye Aspect Ratio (EAR) and eyebrow distance of this face, used by every step below
+        ear = calculate_ear(landmarks)
+        eyebrow_dist = calculate_eyebrow_distance(landmarks)
+
         # Check if in the calibration phase
         if shared_state.calibrating:
-            # Store Eye Aspect Ratio (EAR) values for calibration
-            ear = calculate_ear(landmarks)
-            shared_state.ear_list.append(ear)
-            
-            # Store eyebrow distances for calibration
-            eyebrow_dist = calculate_eyebrow_distance(landmarks)
-            shared_state.eyebrow_list.append(eyebrow_dist)
-
-            if (time.time() - shared_state.start_time) > shared_state.calibration_time:
-                shared_state.calibrated_ear = shared_state.EAR_SCALAR * np.percentile(shared_state.ear_list, 5)
-                shared_state.calibrated_eyebrow_distance = np.percentile(shared_state.eyebrow_list, 5)
-                print(f"Calibrated EAR: {shared_state.calibrated_ear}")
-                print(f"Calibrated Eyebrow Distance: {shared_state.calibrated_eyebrow_distance}")
-                shared_state.calibrating = False
-                shared_state.ear_list = []
-                shared_state.eyebrow_list = []
+            # Samples for calibration
+            if shared_state.start_time is None:
+                shared_state.start_time = now
+            shared_state.add_calibration_sample(ear, eyebrow_dist)
+
+            if now - shared_state.start_time > shared_state.calibration_time:
+                shared_state.finish_calibration()
         else:
-            # Blink detection
-            # Only perform on odd number frames
-            """
-            This is called 'frame-skipping'. This prevents us from having to do a bunch of sequential detections
-            Blink will be detected on odd frames, eyebrows on even, this doesn't have a noticeable impact on accuracy
-            but is a great performance optimization
-            """
-            if shared_state.frame_counter % 2:
-                blink_detected, shared_state.blink_buffer_frames, shared_state.blink_history = detect_blink(
-                    landmarks, shared_state.calibrated_ear, shared_state.blink_history,
-                    shared_state.blink_buffer_frames, shared_state.BLINK_BUFFER_DURATION
-                )
-                if blink_detected and shared_state.universal_buffer_frames == 0:
-                    shared_state.blink_counter += 1
-                    shared_state.blink_display_frames = shared_state.BLINK_DISPLAY_DURATION
-                    shared_state.universal_buffer_frames = shared_state.UNIVERSAL_BUFFER_DURATION
-                    overlay.notification_signal.emit("Blink")
-
-            # Eyebrow raise detection on even frames
-            else:
-                eyebrow_raised = detect_eyebrow_raise(landmarks, shared_state)
-                if eyebrow_raised and shared_state.universal_buffer_frames == 0:
-                    print("Eyebrow raised!")
-                    overlay.notification_signal.emit("Eyebrow raised")
-                    if overlay.keyboard_widget.is_keyboard_open:
-                        if overlay.keyboard_widget.virtual_keyboard.hovered_key =='Close':
-                            overlay.keyboard_widget.is_keyboard_open = False
-                        overlay.keyboard_widget.virtual_keyboard.simulate_key_press(overlay.keyboard_widget.virtual_keyboard.hovered_key)
-                        shared_state.universal_buffer_frames = shared_state.KEYBOARD_BUFFER_DURATION
-                    else:
-                        overlay.select_highlighted_signal.emit()  # Emit the signal to select the highlighted element
-                        shared_state.universal_buffer_frames = shared_state.UNIVERSAL_BUFFER_DURATION
-
-    # Decrease the blink display frame counter
-    if shared_state.blink_display_frames > 0:
-        shared_state.blink_display_frames -= 1
-
-    # Decrease the universal buffer frames
-    if shared_state.universal_buffer_frames > 0:
-        shared_state.universal_buffer_frames -= 1
+            # Blink: the EAR averaged over the blink window drops below the calibrated value
+            shared_state.blink_history.append(ear, now)
+            face_eyes_closed = np.mean(shared_state.blink_history) < shared_state.calibrated_ear
+            eyes_closed = eyes_closed or face_eyes_closed
+
+            # Eyebrow raise: the eyebrows are further from the eyes than calibrated (for long enough, see the gesture engine)
+            face_eyebrows_raised = eyebrow_dist > shared_state.calibrated_eyebrow_distance * shared_state.EYEBROW_SCALAR
+            eyebrows_raised = eyebrows_raised or face_eyebrows_raised
+
+            if shared_state.verifying:
+                shared_state.verify_calibration(ear, eyebrow_dist)
+            elif not (face_eyes_closed or face_eyebrows_raised or shared_state.gestures.busy(now)):
+                # Only a resting face adapts the baseline: frames of a blink / raise / head gesture would
+                # drag it towards the gesture and make the next one harder to detect
+                shared_state.adapt_calibration(ear, eyebrow_dist)
+
+    shared_state.gestures.update("blink", eyes_closed, now)
+    shared_state.gestures.update("eyebrow_raise", eyebrows_raised, now)
 
 
 # Function for everything 'pose related' (pose estimation, gaze direction, shake/nod detection)
-def pose_estimation_and_shake_nod_detection(frame, shared_state, fa, overlay, color=(224, 255, 255)):
-    # Convert dlib faces to the format required by the pose estimation model
+# 'pose_results' can hold (landmarks, camera matrix) pairs that were already computed elsewhere
+def pose_estimation_and_shake_nod_detection(frame, shared_state, fa, overlay, color=(224, 255, 255), pose_results=None):
     # print("MADE IT TO POSE")
-    dense_faces = dlib_to_dense(shared_state.dlib_faces)
-    for results in fa.get_landmarks(frame, dense_faces):
+    if pose_results is None:
+        # Convert dlib faces to the format required by the pose estimation model
+        dense_faces = dlib_to_dense(shared_state.dlib_faces)
+        pose_results = fa.get_landmarks(frame, dense_faces)
+    now = shared_state.now()
+    signals = dict.fromkeys(("look_left", "look_right", "look_up", "look_down", "shake", "nod"), False)
+    for results in pose_results:
         # Get gaze directions
         gaze_horiz, gaze_vert = service.get_gaze_direction(frame, results)
 
-        shared_state.left_right_history.append(gaze_horiz)
-        shared_state.up_down_history.append(gaze_vert)
+        shared_state.left_right_history.append(gaze_horiz, now)
+        shared_state.up_down_history.append(gaze_vert, now)
 
         # Detect shake and nod gestures
-        shake_detected = service.detect_shake_nod(shared_state.left_right_history, shared_state.SHAKE_THRESHOLD,
-                                                  shared_state.GAZE_TIME_WINDOW)
-        nod_detected = service.detect_shake_nod(shared_state.up_down_history, shared_state.NOD_THRESHOLD,
-                                                shared_state.GAZE_TIME_WINDOW)
+        signals["shake"] = signals["shake"] or service.detect_shake_nod(
+            shared_state.left_right_history, shared_state.SHAKE_THRESHOLD, shared_state.GAZE_TIME_WINDOW)
+        signals["nod"] = signals["nod"] or service.detect_shake_nod(
+            shared_state.up_down_history, shared_state.NOD_THRESHOLD, shared_state.GAZE_TIME_WINDOW)
 
         # Detect if holding left/right or up/down gaze
-        look_left_detected = service.detect_look_left_right(shared_state.left_right_history, 'left')
-        look_right_detected = service.detect_look_left_right(shared_state.left_right_history, 'right')
-        
-        look_up_detected = service.detect_look_up_down(shared_state.up_down_history, 'up')
-        look_down_detected = service.detect_look_up_down(shared_state.up_down_history, 'down')
-        
-        # Only act if universal buffer is zero
-        # .change_page_signal.emit('left')
-        # .change_page_signal.emit('right')
-        # .zoom_in_signal.emit()
-        # .zoom_out_signal.emit()
-        
-        
-        if shared_state.universal_buffer_frames == 0:
-            if look_left_detected:
-                print("LOOKING LEFT")
-                if overlay.keyboard_widget.is_keyboard_open:
-                    overlay.keyboard_widget.virtual_keyboard.move_hover_left()
-                    shared_state.universal_buffer_frames = shared_state.KEYBOARD_BUFFER_DURATION
-                else:
-                    overlay.change_page_signal.emit('left')
-                    overlay.notification_signal.emit("Change page left")
-                    shared_state.universal_buffer_frames = shared_state.UNIVERSAL_BUFFER_DURATION
-
-            elif look_right_detected:
-                print("LOOKING RIGHT")
-                if overlay.keyboard_widget.is_keyboard_open:
-                    overlay.keyboard_widget.virtual_keyboard.move_hover_right()
-                    shared_state.universal_buffer_frames = shared_state.KEYBOARD_BUFFER_DURATION
-                else:
-                    overlay.change_page_signal.emit('right')
-                    overlay.notification_signal.emit("Change page right")
-                    shared_state.universal_buffer_frames = shared_state.UNIVERSAL_BUFFER_DURATION
-
-            elif look_up_detected:
-                print("LOOKING UP")
-                if overlay.keyboard_widget.is_keyboard_open:
-                    overlay.keyboard_widget.virtual_keyboard.move_hover_up()
-                    shared_state.universal_buffer_frames = shared_state.KEYBOARD_BUFFER_DURATION
-                else:
-                    overlay.zoom_in_signal.emit()
-                    overlay.notification_signal.emit("Zoom in")
-                    shared_state.universal_buffer_frames = shared_state.UNIVERSAL_BUFFER_DURATION
-
-            elif look_down_detected:
-                print("LOOKING DOWN")
-                overlay.notification_signal.emit("Looking down")
-                if overlay.keyboard_widget.is_keyboard_open:
-                    overlay.keyboard_widget.virtual_keyboard.move_hover_down()
-                    shared_state.universal_buffer_frames = shared_state.KEYBOARD_BUFFER_DURATION
-                else:
-                    overlay.zoom_out_signal.emit()
-                    overlay.notification_signal.emit("Zoom out")
-                    shared_state.universal_buffer_frames = shared_state.UNIVERSAL_BUFFER_DURATION
-            
-            elif shake_detected:
-                print("SHAKE DETECTED")   
-                if overlay.keyboard_widget.is_keyboard_open:
-                    # overlay.keyboard_widget.acceptAutocompleteSuggestion()
-                    shared_state.universal_buffer_frames = shared_state.KEYBOARD_BUFFER_DURATION
-                else:
-                    shared_state.current_sensitivity = (shared_state.current_sensitivity + 1) % 3
-                    shared_state.setSensitivity(shared_state.current_sensitivity)
-                    message = f"Sensitivity: {['Low', 'Medium', 'High'][shared_state.current_sensitivity]}"
-                    overlay.notification_signal.emit(message)
-                    shared_state.universal_buffer_frames = shared_state.UNIVERSAL_BUFFER_DURATION
-            
-            elif nod_detected:
-                print("NOD DETECTED")
-                if overlay.keyboard_widget.is_keyboard_open:
-                    overlay.keyboard_widget.speak_text()
-                    shared_state.universal_buffer_frames = shared_state.KEYBOARD_BUFFER_DURATION
-                else:
-                    overlay.toggle_pin_signal.emit()
-                    overlay.notification_signal.emit("Toggled pin")
-                    shared_state.universal_buffer_frames = shared_state.UNIVERSAL_BUFFER_DURATION
+        signals["look_left"] = signals["look_left"] or service.detect_look_left_right(shared_state.left_right_history, 'left')
+        signals["look_right"] = signals["look_right"] or service.detect_look_left_right(shared_state.left_right_history, 'right')
+        signals["look_up"] = signals["look_up"] or service.detect_look_up_down(shared_state.up_down_history, 'up')
+        signals["look_down"] = signals["look_down"] or service.detect_look_up_down(shared_state.up_down_history, 'down')
+
+    for gesture, active in signals.items():
+        shared_state.gestures.update(gesture, active, now)
 
-    # Decrease the universal buffer frames
-    if shared_state.universal_buffer_frames > 0:
-        shared_state.universal_buffer_frames -= 1
+
+# Gesture actions only enqueue intents on the ActionDispatcher ('actions'), so neither Qt, key presses nor
+# text to speech can stall the detection loop. Intents with the same key that are still waiting are merged
+# Widgets may only be touched on the GUI thread, so widget calls go through overlay.invoke_signal
+# Notifications are keyed by their text: repeats of one message merge, but different messages (e.g. "Looking down"
+# followed by "Zoom out") are all shown
+def notify(actions, overlay, message):
+    actions.dispatch(("notification", message), overlay.notification_signal.emit, message)
+
+
+def ui_call(actions, overlay, key, fn, *args):
+    actions.dispatch(key, overlay.invoke_signal.emit, functools.partial(fn, *args))
+
+
+def press_hovered_key(keyboard_widget):
+    virtual_keyboard = keyboard_widget.virtual_keyboard
+    if virtual_keyboard.hovered_key == 'Close':
+        keyboard_widget.is_keyboard_open = False
+    virtual_keyboard.simulate_key_press(virtual_keyboard.hovered_key)
+
+
+# pyttsx3 engines belong to the thread that created them, so the action worker speaks with its own engine
+tts_engine = None
+
+
+def speak(text):
+    global tts_engine
+    if tts_engine is None:
+        tts_engine = TTSEngine()
+    tts_engine.speak(text)
+
+
+# What each gesture does. Returns the refractory period to use instead of the gesture's default, if any
+def on_blink(shared_state, overlay, actions):
+    shared_state.blink_counter += 1
+    shared_state.blink_display_until = shared_state.now() + shared_state.BLINK_DISPLAY_DURATION
+    notify(actions, overlay, "Blink")
+
+
+def on_eyebrow_raise(shared_state, overlay, actions):
+    print("Eyebrow raised!")
+    notify(actions, overlay, "Eyebrow raised")
+    if overlay.keyboard_widget.is_keyboard_open:
+        ui_call(actions, overlay, "key_press", press_hovered_key, overlay.keyboard_widget)
+        return shared_state.KEYBOARD_BUFFER_DURATION
+    # Select the highlighted element
+    actions.dispatch("select", overlay.select_highlighted_signal.emit)
+
+
+def on_look_left(shared_state, overlay, actions):
+    print("LOOKING LEFT")
+    if overlay.keyboard_widget.is_keyboard_open:
+        ui_call(actions, overlay, "hover_left", overlay.keyboard_widget.virtual_keyboard.move_hover_left)
+        return shared_state.KEYBOARD_BUFFER_DURATION
+    actions.dispatch("change_page_left", overlay.change_page_signal.emit, 'left')
+    notify(actions, overlay, "Change page left")
+
+
+def on_look_right(shared_state, overlay, actions):
+    print("LOOKING RIGHT")
+    if overlay.keyboard_widget.is_keyboard_open:
+        ui_call(actions, overlay, "hover_right", overlay.keyboard_widget.virtual_keyboard.move_hover_right)
+        return shared_state.KEYBOARD_BUFFER_DURATION
+    actions.dispatch("change_page_right", overlay.change_page_signal.emit, 'right')
+    notify(actions, overlay, "Change page right")
+
+
+def on_look_up(shared_state, overlay, actions):
+    print("LOOKING UP")
+    if overlay.keyboard_widget.is_keyboard_open:
+        ui_call(actions, overlay, "hover_up", overlay.keyboard_widget.virtual_keyboard.move_hover_up)
+        return shared_state.KEYBOARD_BUFFER_DURATION
+    actions.dispatch("zoom_in", overlay.zoom_in_signal.emit)
+    notify(actions, overlay, "Zoom in")
+
+
+def on_look_down(shared_state, overlay, actions):
+    print("LOOKING DOWN")
+    notify(actions, overlay, "Looking down")
+    if overlay.keyboard_widget.is_keyboard_open:
+        ui_call(actions, overlay, "hover_down", overlay.keyboard_widget.virtual_keyboard.move_hover_down)
+        return shared_state.KEYBOARD_BUFFER_DURATION
+    actions.dispatch("zoom_out", overlay.zoom_out_signal.emit)
+    notify(actions, overlay, "Zoom out")
+
+
+def on_shake(shared_state, overlay, actions):
+    print("SHAKE DETECTED")
+    if overlay.keyboard_widget.is_keyboard_open:
+        # overlay.keyboard_widget.acceptAutocompleteSuggestion()
+        return shared_state.KEYBOARD_BUFFER_DURATION
+    shared_state.current_sensitivity = (shared_state.current_sensitivity + 1) % 3
+    shared_state.setSensitivity(shared_state.current_sensitivity)
+    shared_state.baseline_dirty = True
+    message = f"Sensitivity: {['Low', 'Medium', 'High'][shared_state.current_sensitivity]}"
+    notify(actions, overlay, message)
+
+
+def on_nod(shared_state, overlay, actions):
+    print("NOD DETECTED")
+    if overlay.keyboard_widget.is_keyboard_open:
+        # This runs on the GUI thread (see act_on_gestures), so the text can be read here. Speaking it
+        # takes as long as the sentence and runs on the action worker
+        text = overlay.keyboard_widget.text_entry.text()
+        if text:
+            actions.dispatch("speak", speak, text)
+        else:
+            notify(actions, overlay, "Please enter text to speak")
+        return shared_state.KEYBOARD_BUFFER_DURATION
+    actions.dispatch("toggle_pin", overlay.toggle_pin_signal.emit)
+    notify(actions, overlay, "Toggled pin")
+
+
+GESTURE_ACTIONS = {
+    "blink": on_blink,
+    "eyebrow_raise": on_eyebrow_raise,
+    "look_left": on_look_left,
+    "look_right": on_look_right,
+    "look_up": on_look_up,
+    "look_down": on_look_down,
+    "shake": on_shake,
+    "nod": on_nod,
+}
+
+
+# Runs once per frame, after the detection stages reported their signals: the arbiter picks (at most) one gesture
+# and its action is handed to the ActionDispatcher
+def act_on_gestures(shared_state, overlay, actions):
+    now = shared_state.now()
+    gesture = shared_state.gestures.arbitrate(now)
+    if gesture is None:
+        return None
+    cooldown = GESTURE_ACTIONS[gesture](shared_state, overlay, actions)
+    if cooldown is not None:
+        shared_state.gestures.cooldown(gesture, cooldown, now)
+    return gesture
+
+
+# Function for the '--landmarks unified' mode: the TFLite pose model predicts the landmarks once per face,
+# and both the blink / eyebrow detections and the pose / shake / nod detections use them
+# (instead of the dlib shape predictor AND the pose model each running on the same face)
+def unified_detection(frame, gray, shared_state, locator, fa, overlay, color=(224, 255, 255)):
+    detections, pose_results = dfl_landmarks(frame, locator.detect(gray), fa)
+    locator.update_from_landmarks(detections)
+    face_and_blink_detection(frame, gray, shared_state, locator, overlay, detections=detections)
+    pose_estimation_and_shake_nod_detection(frame, shared_state, fa, overlay, color, pose_results=pose_results)
 
 
 
 # once calibrated, the eye_gestures object will take utilize the current frame to deduce where the eyes are looking
 # This will run in parallel with the gesture detections
-def eye_tracking(frame, eye_gestures, screen_width, screen_height, is_eyetracking):    
-    if not is_eyetracking:
+# Eye tracking stage. It runs on its own worker next to the gesture stages, on the same captured frames:
+# it is only handed a frame when it is idle (and at most --gaze-rate times per second), so a slow step()
+# never holds back blink / eyebrow detection, and the gesture stages never hold it back either
+# A gaze point that comes out more than 'max_latency' seconds after its frame was captured is dropped
+# The cursor isn't moved here: the CursorDriver smooths the gaze points and moves it on its own thread
+# 'view' is the FrameDescriptor of the captured frame, the tracker takes the version it needs from it
+def eye_tracking(view, eye_gestures, screen_width, screen_height, shared_state, cursor, timestamp, max_latency=None):
+    if not shared_state.is_eyetracking:
         return
-    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
     gevent, _ = eye_gestures.step(
-        frame,
+        view,
         calibration=False,
         width=screen_width,
         height=screen_height,
         context="main"
     )
 
+    shared_state.gaze_stats["frames"] += 1
+
     if gevent is not None:
+        if max_latency is not None and time.monotonic() - timestamp > max_latency:
+            shared_state.gaze_stats["stale"] += 1
+            return
         gaze_point = gevent.point  # (x, y) coordinates
-        # Ensure the gaze point is within screen bounds
-        x = min(max(int(gaze_point[0]), 0), screen_width - 1)
-        y = min(max(int(gaze_point[1]), 0), screen_height - 1)
-        pyautogui.moveTo(x, y)
+        cursor.update(gaze_point[0], gaze_point[1], timestamp)
 
 
 
 # def eyetracking() ..
 
-def main():
 
-    # Video capture
-    cap = cv2.VideoCapture(0)
+# Warm-up inferences for the background model loader: one run on a blank frame,
+# so the first real frame doesn't pay for the models' one-time setup
+WARMUP_FRAME_SIZE = (480, 640)
+WARMUP_FACE_BOX = (220, 140, 420, 340)
+
+def warm_up_detector(detector):
+    detector(np.zeros(WARMUP_FRAME_SIZE, dtype=np.uint8), 0)
+
+def warm_up_predictor(predictor):
+    predictor(np.zeros(WARMUP_FRAME_SIZE, dtype=np.uint8), dlib.rectangle(*WARMUP_FACE_BOX))
+
+def warm_up_pose_model(fa):
+    list(fa.get_landmarks(np.zeros(WARMUP_FRAME_SIZE + (3,), dtype=np.uint8), [np.array(WARMUP_FACE_BOX, dtype=float)]))
+
+
+# Start loading every detection model at the same time, in the background
+def start_model_loading(args):
+    loader = ModelLoader()
+    loader.load("detector", dlib.get_frontal_face_detector, warmup=warm_up_detector)
+    # The dlib shape predictor isn't needed when the pose model provides all landmarks
+    if args.landmarks != "unified":
+        loader.load("predictor", dlib.shape_predictor, PREDICTOR_PATH, warmup=warm_up_predictor)
+    loader.load("pose", service.DepthFacialLandmarks, POSE_MODEL_PATH, warmup=warm_up_pose_model)
+    return loader
+
+
+def main(args):
+
+    # The detection models load (and warm up) in the background while the user calibrates the eye tracker
+    # In process mode the worker processes load their own models
+    loader = start_model_loading(args) if args.engine != "processes" else None
+
+    # Video capture (webcam by default, see --source for recorded clips / synthetic frames)
+    # Frames are read continuously on their own thread and only the newest one is kept,
+    # so neither calibration nor detection works on frames that sat in the camera buffer
+    with startup_profiler.phase("capture", "open source"):
+        cap = open_frame_source_from_args(args)
+        capture = LatestFrameCapture(cap).start()
 
     framerate = 60
     radius = 45000
     total_iterations = 25  # Total number of calibration points
 
 
-    eye_gestures = EyeGestures_v2(radius)
-    eye_gestures.setClassicalImpact(2)
-    eye_gestures.setFixation(1.0)
+    # With '--engine processes' every heavy stage runs in its own process with its own models
+    # (see pipeline/process_engine.py). The workers start loading their models right away
+    # With '--landmarks unified' a single stage finds the faces and runs the pose model on them
+    unified = args.landmarks == "unified"
+    detection_args = (args.redetect_interval, args.face_tracker, args.detection_scale)
+    engine = None
+    if args.engine == "processes":
+        if unified:
+            stages = {"face": (unified_landmark_stage, (POSE_MODEL_PATH,) + detection_args)}
+        else:
+            stages = {"face": (face_landmark_stage, (PREDICTOR_PATH,) + detection_args),
+                      "pose": (pose_landmark_stage, (POSE_MODEL_PATH,))}
+        stages["gaze"] = (gaze_stage, (radius, 2, 1.0))
+        with startup_profiler.phase("model", "process engine"):
+            engine = ProcessDetectionEngine(stages).start()
+            engine.wait_ready()
+        # Same step() interface, but the tracker lives in the 'gaze' worker process
+        eye_gestures = RemoteEyeGestures(engine)
+    else:
+        with startup_profiler.phase("model", "eye tracker"):
+            eye_gestures = EyeGestures_v2(radius)
+            eye_gestures.setClassicalImpact(2)
+            eye_gestures.setFixation(1.0)
 
     # Initialize Pygame
+    ui_start = time.perf_counter()
     pygame.init()
     pygame.font.init()
 
@@ -400,8 +722,12 @@ def main():
     bold_font.set_bold(True)
 
     clock = pygame.time.Clock()
+    startup_profiler.record("ui", "pygame", time.perf_counter() - ui_start)
 
     # Optimize PyAutoGUI
+    # Imported here and not at the top: pyautogui needs a display as soon as it is imported, and benchmark.py
+    # imports the stages from this module on machines without one (like eyetracking/cursor_driver.py does)
+    import pyautogui
     pyautogui.FAILSAFE = False
     pyautogui.PAUSE = 0
 
@@ -409,12 +735,24 @@ def main():
     prev_x = 0
     prev_y = 0
 
+    # A calibration stored for this user and camera only needs a short drift correction
+    calibrations = calibration_store_from_args(args)
+    camera = camera_key(args)
+    with startup_profiler.phase("model", "stored calibration"):
+        total_iterations, profile = prepare_calibration(eye_gestures, calibrations, args.user, camera,
+                                                        (screen_width, screen_height), TRACKER_VERSION,
+                                                        recalibrate=args.recalibrate, full_points=total_iterations)
+
     # Pre-calibration message
-    pre_calibration_message_line1 = "Hello! Your eye-tracking calibration is about to begin."
+    if profile is None:
+        pre_calibration_message_line1 = "Hello! Your eye-tracking calibration is about to begin."
+    else:
+        pre_calibration_message_line1 = f"Welcome back! A short {total_iterations}-point calibration check is about to begin."
     pre_calibration_message_line2 = "Please try to keep your head as still as possible and focus on the number in the centers of the dots."
     countdown = 1
 
     # Display pre-calibration message with countdown
+    calibration_start = time.perf_counter()
     for i in range(countdown, -1, -1):
         screen.fill(BACKGROUND_COLOR)
         
@@ -441,14 +779,13 @@ def main():
     # Calibration Loop
     while calibrating:
         
-        ret, frame = cap.read()
-        if not ret:
+        captured = capture.read()
+        if captured is None:
             print("Failed to grab frame")
             break
 
-        frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
         gevent, cevent = eye_gestures.step(
-            frame,
+            FrameDescriptor.from_capture(captured),
             calibration=True,
             width=screen_width,
             height=screen_height,
@@ -490,60 +827,172 @@ def main():
         clock.tick(30)  # Reduce framerate to 30 FPS
 
     pygame.quit()
+    startup_profiler.record(INTERACTIVE, "calibration", time.perf_counter() - calibration_start)
+
+    # Keep the (drift corrected) calibration for next time, unless it was cut short
+    if iterator > total_iterations:
+        save_calibration(eye_gestures, calibrations, args.user, camera, (screen_width, screen_height), TRACKER_VERSION)
 
     
     
-    detector = dlib.get_frontal_face_detector()
-    predictor = dlib.shape_predictor("facegestures/models/shape_predictor_68_face_landmarks.dat")
-    fa = service.DepthFacialLandmarks("facegestures/models/sparse_face.tflite")
+    # In process mode the worker processes already hold these models
+    if engine is None:
+        # Usually loaded long before calibration ends, otherwise wait for the rest here
+        with startup_profiler.phase("wait", "models"):
+            models = loader.wait()
+        loader.shutdown()
+        startup_profiler.record_model_loader(loader)
+        # Full face detection only every few frames, the face is tracked in between
+        locator = FaceLocator(models["detector"], models.get("predictor"), redetect_interval=args.redetect_interval,
+                              tracker=args.face_tracker, detection_scale=args.detection_scale)
+        fa = models["pose"]
 
     # Create a shared state
     shared_state = SharedState()
+    # Skip the gesture calibration if this user's baseline is stored (it is checked in the background)
+    if not args.recalibrate:
+        load_gesture_baseline(shared_state, calibrations, args.user, camera)
 
     # Initialize the QApplication and Overlay
-    app = QApplication(sys.argv)
-    app.setStyle('QtCurve')
-    overlay = Overlay()
-    overlay.show()
+    with startup_profiler.phase("ui", "qt application"):
+        app = QApplication(sys.argv)
+        app.setStyle('QtCurve')
+    with startup_profiler.phase("ui", "overlay"):
+        overlay = Overlay()
+        overlay.show()
     overlay.destroyed.connect(app.quit)  # Ensures the program exits when the overlay is closed
 
 
 
 
-    # Function to process frames in a separate thread
+    # Long-lived worker threads for the detection stages. They are created once here and fed
+    # every frame through bounded queues, instead of creating two new threads per frame
+    # First stage controls operations relating to face detection, blink detection/calibration, and eyebrow raise detection
+    # Second stage controls pose estimation, gaze direction and shake/nod detection
+    # With '--landmarks unified' there is only one stage, both need the same landmarks
+    executor = StageExecutor()
+    # Side effects of the gestures (UI changes, key presses, text to speech) run on their own worker
+    actions = ActionDispatcher()
+    # Smoothed, rate limited cursor moves for the eye tracking
+    cursor = cursor_driver_from_args(args, screen_width, screen_height).start()
+    if unified:
+        executor.add_stage("landmarks", unified_detection)
+    else:
+        executor.add_stage("face", face_and_blink_detection)
+        executor.add_stage("pose", pose_estimation_and_shake_nod_detection)
+    # Third stage: eye tracking, with its own cadence (see eye_tracking)
+    executor.add_stage("eyes", eye_tracking, max_rate=args.gaze_rate)
+    # Color converted / mirrored versions of the current frames, shared by the stages
+    conversions = ConversionCache()
+
     # print("entering main loop")
     while True:
         # print("looping")
-        ret, frame = cap.read()
-        if not ret:
+        # Always the freshest frame. Anything captured while the previous frame was being processed is dropped
+        captured = capture.read()
+        if captured is None:
             break
+        frame = captured.frame
+        # Every stage takes the color order / mirroring it needs from here, each version is converted once
+        view = FrameDescriptor.from_capture(captured, conversions)
+        # The gesture windows and cooldowns run on capture time, whatever the processing rate is
+        shared_state.frame_time = captured.timestamp
+
+        # The eye tracking stage gets the same frame if it is ready for one. Nobody waits for it
+        gaze = executor.submit_if_ready("eyes", view, eye_gestures, screen_width, screen_height, shared_state, cursor,
+                                        captured.timestamp, args.gaze_budget)
+        if gaze is not None:
+            gaze.add_done_callback(log_stage_error)
+
+        if engine is not None:
+            # The frame goes to the worker processes through shared memory. Only landmarks and
+            # camera matrices come back, and the (cheap) gesture logic runs here
+            stages = ("face",) if unified else ("face", "pose")
+            frame_id = engine.submit(frame, {"pose": dlib_to_dense(shared_state.dlib_faces)}, stages=stages)
+            results = engine.collect(frame_id, stages=stages)
+            for result in results.values():
+                if isinstance(result, StageError):
+                    print(result)
+
+            if unified:
+                # The unified stage sends the pose model results along with the landmarks
+                if isinstance(results["face"], StageError):
+                    results["pose"] = results["face"]
+                else:
+                    results["face"], results["pose"] = results["face"]
 
-        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            if not isinstance(results["face"], StageError):
+                detections = [(dlib.rectangle(*rect), landmarks) for rect, landmarks in results["face"]]
+                face_and_blink_detection(frame, None, shared_state, None, overlay, detections=detections)
+            if not isinstance(results["pose"], StageError):
+                pose_estimation_and_shake_nod_detection(frame, shared_state, None, overlay, pose_results=results["pose"])
+        else:
+            gray = view.view(GRAY)
 
-        # h, w, _ = frame.shape
-        # Create threads
-        t1 = threading.Thread(target=face_and_blink_detection, args=(frame, gray, shared_state, detector, predictor, overlay))
-        t2 = threading.Thread(target=pose_estimation_and_shake_nod_detection, args=(frame, shared_state, fa, overlay))
-        # t3 = threading.Thread(target=eye_tracking, args=(frame, eye_gestures, screen_width, screen_height, shared_state.is_eyetracking))
+            # h, w, _ = frame.shape
+            if unified:
+                futures = [executor.submit("landmarks", frame, gray, shared_state, locator, fa, overlay)]
+            else:
+                futures = [
+                    executor.submit("face", frame, gray, shared_state, locator, overlay),
+                    executor.submit("pose", frame, shared_state, fa, overlay),
+                ]
 
-        # Start threads
-        t1.start()
-        t2.start()
-        # t3.start()
+            # Wait for both stages to finish this frame
+            executor.wait(futures)
 
-        # Wait for threads to finish
-        t1.join()
-        t2.join()
-        # t3.join()
+        # Both stages reported this frame's gesture signals, act on (at most) one gesture
+        act_on_gestures(shared_state, overlay, actions)
 
+        # New, corrected or changed gesture baseline. It is written on the action worker, the loop never waits for the disk
+        if shared_state.baseline_dirty:
+            shared_state.baseline_dirty = False
+            actions.dispatch("save gesture baseline", save_gesture_baseline, calibrations, args.user, camera,
+                             shared_state.baseline())
 
         # Process PyQt events
         app.processEvents()
 
+        # With --profile-startup, startup ends when the first frame went through the gesture detection
+        if args.profile_startup:
+            startup_profiler.finish()
+            break
+
         # cap.release()
 
+    gaze_stats = dict(shared_state.gaze_stats, **executor.stages["eyes"].stats)
+    executor.shutdown()
+    actions.shutdown(wait=False)
+    # The thresholds kept adapting while running, store where they ended up
+    if not shared_state.calibrating:
+        save_gesture_baseline(calibrations, args.user, camera, shared_state.baseline())
+    cursor.stop()
+    if engine is not None:
+        engine.shutdown()
+    capture.release()
+    print(f"Capture stats: {capture.stats()}")
+    print(f"Eye tracking stats: {gaze_stats}")
+    if args.profile_startup:
+        failures = startup_profiler.print_report(budgets_from_args(args))
+        sys.exit(1 if failures else 0)
     sys.exit(app.exec_())
     
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description="EyeCommunicate gesture + eye tracking overlay")
+    add_source_arguments(parser)
+    parser.add_argument("--engine", choices=("threads", "processes"), default="threads",
+                        help="Run the detection stages on threads in this process, or each in its own process "
+                             "with frames shared through shared memory (default: %(default)s)")
+    add_face_detection_arguments(parser)
+    parser.add_argument("--gaze-rate", type=float, default=30,
+                        help="Maximum eye tracking updates per second, frames in between only go to the gesture stages "
+                             "(default: %(default)s)")
+    parser.add_argument("--gaze-budget", type=float, default=0.15,
+                        help="Gaze points that come out more than this many seconds after their frame was captured "
+                             "don't move the cursor (default: %(default)s)")
+    add_cursor_arguments(parser)
+    add_calibration_arguments(parser)
+    add_profiler_arguments(parser)
+    args, _ = parser.parse_known_args()
+    main(args)
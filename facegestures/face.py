@@ -1,3 +1,6 @@
+import os
+import sys
+import argparse
 import cv2
 import dlib
 import face_recognition
@@ -11,6 +14,10 @@ from imutils.video import VideoStream
 from collections import deque
 from gestures import *
 
+# Allow importing the shared 'pipeline' package when this script is run from inside facegestures/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from pipeline import add_source_arguments, open_frame_source_from_args
+
 def change_pages():
     keyboard.press_and_release('ctrl+alt+right')
     time.sleep(3)
@@ -18,10 +25,10 @@ def change_pages():
 
 
    
-def main(color=(224, 255, 255)):
+def main(args, color=(224, 255, 255)):
 
-    # Video capture
-    cap = cv2.VideoCapture(0)
+    # Video capture (webcam by default, see --source for recorded clips / synthetic frames)
+    cap = open_frame_source_from_args(args)
     
     # dlib's face detector / landmark predictor
     detector = dlib.get_frontal_face_detector()
@@ -167,5 +174,7 @@ def main(color=(224, 255, 255)):
 
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description="Face gesture demo")
+    add_source_arguments(parser)
+    main(parser.parse_args())
     
\ No newline at end of file
@@ -1,3 +1,8 @@
 from .helpers import *
 from .blink import *
-from .eyebrow_raise import *
\ No newline at end of file
+from .eyebrow_raise import *
+from .face_locator import *
+from .ring_buffer import *
+from .gesture_window import *
+from .quantile import *
+from .gesture_engine import *
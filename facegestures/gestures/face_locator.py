@@ -0,0 +1,170 @@
+import cv2
+import dlib
+from imutils import face_utils
+from .helpers import dlib_to_dense, scale_dlib_rects
+
+
+# Finds faces with the dlib detector and their 68 landmarks with the dlib shape predictor
+# If the detector does not find a face THIS frame, the face found in the previous frame is kept
+#
+# Running the HOG detector is by far the most expensive part of a frame, so with redetect_interval > 1
+# the full detection only runs every N frames (or when tracking loses confidence). In between the face is followed:
+#   tracker="landmarks":   the box is re-fitted around the 68 landmarks predicted on the previous frame.
+#                          Confidence is the overlap (IoU) between the old and the re-fitted box
+#   tracker="correlation": a dlib.correlation_tracker per face. Confidence is the tracker's peak-to-sidelobe ratio
+#
+# With detection_scale < 1 the detector runs on a resized copy of the frame and its boxes are mapped back
+# to full resolution, so the landmarks are still predicted on the full resolution image.
+# The detector cost drops roughly with the square of the scale, but the smallest face it can find
+# grows by 1/scale (dlib's detector needs faces of about 80x80 pixels in the image it sees)
+#
+# The predictor can be None when the landmarks come from another model (see dfl_landmarks), in that case
+# call detect() and pass the landmarks to update_from_landmarks() instead of calling locate()
+class FaceLocator:
+    # Default minimum confidence for each tracker before falling back to a full detection
+    MIN_CONFIDENCE = {"landmarks": 0.5, "correlation": 7.0}
+
+    def __init__(self, detector, predictor, redetect_interval=1, tracker="landmarks", min_confidence=None,
+                 detection_scale=1.0):
+        if tracker not in self.MIN_CONFIDENCE:
+            raise ValueError(f"Unknown face tracker: {tracker}")
+        if not 0 < detection_scale <= 1:
+            raise ValueError(f"detection_scale must be in (0, 1], got {detection_scale}")
+        self.detector = detector
+        self.predictor = predictor
+        self.redetect_interval = redetect_interval
+        self.tracker = tracker
+        self.min_confidence = self.MIN_CONFIDENCE[tracker] if min_confidence is None else min_confidence
+        self.detection_scale = detection_scale
+        self.faces = []
+
+        # Tracking state
+        self.correlation_trackers = []
+        self.frames_since_detection = 0
+        self.tracking_ok = False
+
+        # Counters, handy for checking how often the detector actually runs
+        self.frame_count = 0
+        self.detection_count = 0
+
+    def _needs_detection(self):
+        return (self.redetect_interval <= 1 or not self.tracking_ok or len(self.faces) == 0
+                or self.frames_since_detection >= self.redetect_interval)
+
+    def _run_detector(self, gray):
+        self.detection_count += 1
+        temp_faces = self._detect_scaled(gray)
+        if len(temp_faces) == 0:
+            # Keep the old faces, but try a full detection again next frame
+            self.tracking_ok = False
+            return
+
+        self.faces = list(temp_faces)
+        self.frames_since_detection = 0
+        self.tracking_ok = True
+        if self.tracker == "correlation" and self.redetect_interval > 1:
+            self.correlation_trackers = []
+            for face in self.faces:
+                tracker = dlib.correlation_tracker()
+                tracker.start_track(gray, face)
+                self.correlation_trackers.append(tracker)
+
+    # Run the detector on a downscaled copy of the frame and return full resolution boxes
+    def _detect_scaled(self, gray):
+        if self.detection_scale == 1:
+            return self.detector(gray, 0)
+        small = cv2.resize(gray, None, fx=self.detection_scale, fy=self.detection_scale, interpolation=cv2.INTER_AREA)
+        return scale_dlib_rects(self.detector(small, 0), 1 / self.detection_scale)
+
+    def _run_correlation_trackers(self, gray):
+        faces = []
+        for tracker in self.correlation_trackers:
+            if tracker.update(gray) < self.min_confidence:
+                self.tracking_ok = False
+            position = tracker.get_position()
+            faces.append(dlib.rectangle(int(position.left()), int(position.top()),
+                                        int(position.right()), int(position.bottom())))
+        self.faces = faces
+
+    # Returns the face rectangles for this frame
+    def detect(self, gray):
+        self.frame_count += 1
+        if self._needs_detection():
+            self._run_detector(gray)
+        else:
+            self.frames_since_detection += 1
+            if self.tracker == "correlation":
+                self._run_correlation_trackers(gray)
+            # For the landmark tracker the boxes were already moved by the previous locate()
+        return self.faces
+
+    # Returns a list of (dlib rectangle, 68x2 landmark array) for every face
+    def locate(self, gray):
+        faces = self.detect(gray)
+        detections = [(face, face_utils.shape_to_np(self.predictor(gray, face))) for face in faces]
+        self.update_from_landmarks(detections)
+        return detections
+
+    # Move each box to where the face is now, for the next frame (landmark tracker only)
+    # 'detections' are (rect, 68x2 landmarks) pairs for the faces returned by detect()
+    def update_from_landmarks(self, detections):
+        if self.tracker != "landmarks" or self.redetect_interval <= 1:
+            return
+        if len(detections) != len(self.faces):
+            # Some face got no landmarks (e.g. too small for the model), look for it again next frame
+            self.tracking_ok = False
+
+        tracked_faces = []
+        for face, landmarks in detections:
+            tracked = landmarks_to_rect(landmarks)
+            if rect_iou(face, tracked) < self.min_confidence:
+                self.tracking_ok = False
+            tracked_faces.append(tracked)
+        if tracked_faces:
+            self.faces = tracked_faces
+
+
+# Landmarks from a DepthFacialLandmarks model ('fa') instead of the dlib shape predictor
+# Its sparse model predicts the same 68 points in the same order as dlib, so calculate_ear and
+# calculate_eyebrow_distance work on them unchanged, and the head pose comes out of the same inference
+# Returns ([(rect, 68x2 landmarks)], [(landmarks, camera matrix)]) for the faces the model accepted
+def dfl_landmarks(frame, faces, fa):
+    detections, pose_results = [], []
+    for face in faces:
+        for results in fa.get_landmarks(frame, dlib_to_dense([face])):
+            detections.append((face, results[0][:, :2]))
+            pose_results.append(results)
+    return detections, pose_results
+
+
+# Square box around the 68 landmarks, roughly matching the boxes returned by dlib's frontal face detector
+def landmarks_to_rect(landmarks):
+    (x_min, y_min), (x_max, y_max) = landmarks.min(axis=0), landmarks.max(axis=0)
+    half = max(x_max - x_min, y_max - y_min) / 2
+    cx, cy = (x_min + x_max) / 2, (y_min + y_max) / 2
+    return dlib.rectangle(int(cx - half), int(cy - half), int(cx + half), int(cy + half))
+
+
+# Intersection over union of two dlib rectangles
+def rect_iou(a, b):
+    # area() of an empty rectangle (no overlap) is 0
+    inter_area = a.intersect(b).area()
+    union = a.area() + b.area() - inter_area
+    return inter_area / union if union > 0 else 0.0
+
+
+# Adds the --redetect-interval / --face-tracker / --detection-scale / --landmarks flags used by the entry points
+def add_face_detection_arguments(parser, redetect_interval=1, detection_scale=1.0):
+    parser.add_argument("--redetect-interval", type=int, default=redetect_interval,
+                        help="Run the full face detector every N frames and track the face in between "
+                             "(1 = detect every frame, default: %(default)s)")
+    parser.add_argument("--face-tracker", choices=sorted(FaceLocator.MIN_CONFIDENCE), default="landmarks",
+                        help="How the face is followed between detections (default: %(default)s)")
+    parser.add_argument("--detection-scale", type=float, default=detection_scale,
+                        help="Run the face detector on a copy of the frame resized by this factor "
+                             "(1 = full resolution, default: %(default)s)")
+    parser.add_argument("--landmarks", choices=("dlib", "unified"), default="dlib",
+                        help="dlib: blink / eyebrow features use dlib's shape predictor and head pose the TFLite model, "
+                             "unified: everything uses the TFLite model, one landmark inference per face "
+                             "(default: %(default)s)")
+    return parser
@@ -0,0 +1,164 @@
+import threading
+
+
+# One gesture (blink, eyebrow raise, look left, shake, ...) as a small state machine fed with the
+# detector's on/off signal every frame. Times are in seconds (frame capture times)
+#   hold:       the signal has to stay on this long before the gesture fires (debounce)
+#   release:    once fired, the signal has to stay off this long before the gesture can fire again, and short
+#               drop-outs of the signal while it builds up are ignored (hysteresis)
+#   refractory: minimum time between two firings of this gesture (only this one, other gestures aren't blocked)
+#   repeat:     if set, the gesture fires again every 'repeat' seconds while the signal stays on
+#               (e.g. holding the gaze left keeps moving left)
+#   priority:   when several gestures want to fire on the same frame the highest priority wins (see GestureEngine)
+#
+#   idle --signal on--> pending --on for 'hold'--> fire --> latched --off for 'release'--> idle
+class GestureMachine:
+    IDLE = "idle"
+    PENDING = "pending"
+    LATCHED = "latched"
+
+    def __init__(self, name, priority=0, hold=0.0, release=0.0, refractory=0.0, repeat=None):
+        self.name = name
+        self.priority = priority
+        self.hold = hold
+        self.release = release
+        self.refractory = refractory
+        self.repeat = repeat
+
+        self.state = self.IDLE
+        # When the signal went on (pending) / off (None while it is on)
+        self.on_since = None
+        self.off_since = None
+        # No firing before ready_at (refractory period), next firing of a held gesture at next_repeat
+        self.ready_at = float("-inf")
+        self.next_repeat = None
+        # Whether the signal was updated since the last arbitration
+        self.fresh = False
+
+    def update(self, active, now):
+        self.fresh = True
+        if active:
+            self.off_since = None
+            if self.state == self.IDLE:
+                self.state = self.PENDING
+                self.on_since = now
+            return
+
+        if self.state == self.IDLE:
+            return
+        if self.off_since is None:
+            self.off_since = now
+        if now - self.off_since >= self.release:
+            self.state = self.IDLE
+            self.on_since = None
+
+    def wants_to_fire(self, now):
+        if self.off_since is not None or now < self.ready_at:
+            return False
+        if self.state == self.PENDING:
+            return now - self.on_since >= self.hold
+        if self.state == self.LATCHED and self.repeat is not None:
+            return now >= self.next_repeat
+        return False
+
+    def fire(self, now):
+        self.state = self.LATCHED
+        self.ready_at = now + self.refractory
+        if self.repeat is not None:
+            self.next_repeat = now + self.repeat
+
+    # Another gesture won this frame. The activation is used up, so this gesture has to be released
+    # (or repeat) before it fires
+    def suppress(self, now):
+        self.state = self.LATCHED
+        if self.repeat is not None:
+            self.next_repeat = now + self.repeat
+
+    # Override the refractory period of the firing that just happened (e.g. shorter while typing)
+    def cooldown(self, seconds, now):
+        self.ready_at = now + seconds
+        if self.repeat is not None:
+            self.next_repeat = now + seconds
+
+    # Whether the gesture is under way: its signal is on, it fired and wasn't released yet, or it is refractory
+    def busy(self, now):
+        return self.state != self.IDLE or now < self.ready_at
+
+    def reset(self):
+        self.state = self.IDLE
+        self.on_since = None
+        self.off_since = None
+        self.ready_at = float("-inf")
+        self.next_repeat = None
+        self.fresh = False
+
+    def __repr__(self):
+        return f"GestureMachine({self.name!r}, state={self.state!r}, priority={self.priority})"
+
+
+# Holds the gesture state machines and arbitrates between them
+# The detection stages only report signals with update(name, active, now) (from any thread), and once per frame
+# arbitrate(now) fires at most one gesture: the highest priority one of those that are ready.
+# The others that wanted to fire on that frame are suppressed, and after any gesture fires no other one can
+# fire for 'lockout' seconds, so one head movement doesn't trigger two gestures at once
+class GestureEngine:
+    def __init__(self, lockout=0.0):
+        self.lockout = lockout
+        self.lockout_until = float("-inf")
+        self.machines = {}
+        self.lock = threading.Lock()
+
+    def add(self, name, **kwargs):
+        if name in self.machines:
+            raise ValueError(f"Gesture '{name}' is already registered")
+        machine = GestureMachine(name, **kwargs)
+        self.machines[name] = machine
+        return machine
+
+    def __getitem__(self, name):
+        return self.machines[name]
+
+    def __contains__(self, name):
+        return name in self.machines
+
+    def update(self, name, active, now):
+        with self.lock:
+            self.machines[name].update(active, now)
+
+    # Name of the gesture that fires on this frame, or None. Only gestures whose signal was updated since
+    # the previous call take part, so a stale signal (e.g. the face was lost) never fires
+    def arbitrate(self, now):
+        with self.lock:
+            candidates = []
+            for machine in self.machines.values():
+                if machine.fresh and machine.wants_to_fire(now):
+                    candidates.append(machine)
+                machine.fresh = False
+
+            if not candidates or now < self.lockout_until:
+                return None
+
+            # Ties go to the gesture registered first
+            winner = max(candidates, key=lambda machine: machine.priority)
+            winner.fire(now)
+            for machine in candidates:
+                if machine is not winner:
+                    machine.suppress(now)
+            self.lockout_until = now + self.lockout
+            return winner.name
+
+    # Whether any of the gestures 'names' (all of them by default) is under way, see GestureMachine.busy
+    def busy(self, now, names=None):
+        with self.lock:
+            machines = self.machines.values() if names is None else (self.machines[name] for name in names)
+            return any(machine.busy(now) for machine in machines)
+
+    def cooldown(self, name, seconds, now):
+        with self.lock:
+            self.machines[name].cooldown(seconds, now)
+
+    def reset(self):
+        with self.lock:
+            self.lockout_until = float("-inf")
+            for machine in self.machines.values():
+                machine.reset()
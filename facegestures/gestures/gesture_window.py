@@ -0,0 +1,55 @@
+from collections import Counter
+
+import numpy as np
+
+from .ring_buffer import RingBuffer
+
+
+# Sliding window over the last 'size' head directions (-1 / 0 / 1) used by the shake / nod / look detections
+# Everything those detections need is updated when a value is pushed (and the oldest one evicted),
+# so every query is O(1) no matter how long the window is:
+#   direction_changes:        consecutive pairs (a, b) with b != a and b != 0 (what detect_shake_nod counts)
+#   count(v) / all_equal(v):  how many entries are v / whether all of them are (detect_look_*)
+#   mean():                   running mean of the window (from RingBuffer)
+#
+# Like a RingBuffer it can also be time based (GestureWindow.timed(seconds)), see ring_buffer.py
+class GestureWindow(RingBuffer):
+    def __init__(self, size, fill=None, duration=None):
+        super().__init__(size, fill=fill, dtype=np.int64, duration=duration)
+
+    def _allocate(self):
+        super()._allocate()
+        # changes[i] is 1 when the value in slot i counts as a direction change from the value
+        # before it (always 0 for the oldest value)
+        self.changes = np.zeros(self.capacity, dtype=np.int64)
+        self.counts = Counter()
+        self.direction_changes = 0
+
+    @property
+    def size(self):
+        return self.capacity
+
+    def append(self, value, timestamp=None):
+        if self.length == self.capacity:
+            self._evict()
+
+        change = int(self.length > 0 and value != self[-1] and value != 0)
+        self.changes[(self.start + self.length) % self.capacity] = change
+        self.direction_changes += change
+        self.counts[value] += 1
+        super().append(value, timestamp)
+
+    def _evict(self):
+        self.counts[self.data[self.start].item()] -= 1
+        super()._evict()
+        # The new oldest value has nothing left to change from
+        if self.length:
+            self.direction_changes -= self.changes[self.start].item()
+            self.changes[self.start] = 0
+
+    def count(self, value):
+        return self.counts[value]
+
+    # Like all(x == value for x in window), True for an empty window
+    def all_equal(self, value):
+        return self.counts[value] == self.length
@@ -23,6 +23,14 @@ def dlib_to_dense(rects):
         arr[i] = [rect.left(), rect.top(), rect.right(), rect.bottom()]
     return arr
 
+# Scale dlib rectangles by a factor, e.g. to map boxes found on a downscaled image back to full resolution
+def scale_dlib_rects(rects, factor):
+    scaled = dlib.rectangles()
+    for rect in rects:
+        scaled.append(dlib.rectangle(int(round(rect.left() * factor)), int(round(rect.top() * factor)),
+                                     int(round(rect.right() * factor)), int(round(rect.bottom() * factor))))
+    return scaled
+
 def clamp(n, min, max): 
     if n < min: 
         return min
@@ -0,0 +1,183 @@
+import numpy as np
+
+
+# Fixed capacity rolling window backed by a preallocated NumPy array
+# Once full, every append overwrites the oldest value. A running sum is kept up to date, so mean()
+# is O(1) instead of converting a deque to a new array every frame (np.mean(deque))
+# np.asarray(window) sees the values oldest first, and np.mean(window) uses the running sum
+#
+# With a duration (in seconds) the window is time based: every value is appended with its timestamp
+# (e.g. the capture time of its frame) and values older than 'duration' fall out of the window.
+# The capacity is then only the maximum number of values it can hold
+class RingBuffer:
+    # A float running sum slowly drifts from adding and subtracting; it is recomputed from scratch
+    # after this many evictions per slot, which keeps append O(1) amortized
+    RESUM_PERIOD = 64
+
+    # Frames per second a time based window is sized for (see capacity_for)
+    MAX_FPS = 120
+
+    def __init__(self, capacity, fill=None, dtype=np.float64, duration=None):
+        if capacity < 1:
+            raise ValueError(f"Capacity must be at least 1, got {capacity}")
+        self.dtype = np.dtype(dtype)
+        self.capacity = capacity
+        self.duration = duration
+        self._allocate()
+
+        if fill is not None and duration is not None:
+            raise ValueError("A time based window can't be pre-filled, its values need timestamps")
+        if fill is not None:
+            for _ in range(capacity):
+                self.append(fill)
+
+    def _allocate(self):
+        self.data = np.zeros(self.capacity, dtype=self.dtype)
+        # Index of the oldest value
+        self.start = 0
+        self.length = 0
+        self.total = 0
+        self._evictions = 0
+        if self.duration is not None:
+            self.timestamps = np.zeros(self.capacity, dtype=np.float64)
+            # When the window started filling, see covers()
+            self.first_timestamp = None
+
+    # Time based window of 'duration' seconds, with room for MAX_FPS values per second
+    @classmethod
+    def timed(cls, duration, **kwargs):
+        return cls(cls.capacity_for(duration), duration=duration, **kwargs)
+
+    @classmethod
+    def capacity_for(cls, duration):
+        return max(int(np.ceil(duration * cls.MAX_FPS)), 1)
+
+    # Same name as deque.maxlen, so the window can be used where a deque used to be
+    @property
+    def maxlen(self):
+        return self.capacity
+
+    def append(self, value, timestamp=None):
+        if self.duration is not None:
+            if timestamp is None:
+                raise ValueError("A time based window needs a timestamp for every value")
+            # The window starts filling again when it is empty, or when its newest value is already out of it
+            # (a stall, or the face was lost for longer than 'duration'), so covers() doesn't count the gap
+            if not self.length or self._newest_timestamp() <= timestamp - self.duration:
+                self.first_timestamp = timestamp
+
+        if self.length == self.capacity:
+            self._evict()
+        index = (self.start + self.length) % self.capacity
+        self.data[index] = value
+        self.length += 1
+        # What was stored, e.g. True becomes 1.0
+        self.total += self.data[index].item()
+
+        if self.duration is not None:
+            self.timestamps[index] = timestamp
+            self.expire(timestamp)
+
+    # Drop the values that are older than 'duration' at time 'now' (time based windows only)
+    def expire(self, now):
+        while self.length and self.timestamps[self.start] <= now - self.duration:
+            self._evict()
+        if not self.length:
+            self.first_timestamp = None
+
+    # Whether the window has been filling for at least 'window' (seconds for a time based window, values otherwise)
+    def covers(self, window):
+        if self.duration is None:
+            return self.length >= window
+        if not self.length:
+            return False
+        return self._newest_timestamp() - self.first_timestamp >= window
+
+    def _newest_timestamp(self):
+        return self.timestamps[(self.start + self.length - 1) % self.capacity]
+
+    # Drop the oldest value
+    def _evict(self):
+        self.total -= self.data[self.start].item()
+        self.start = (self.start + 1) % self.capacity
+        self.length -= 1
+
+        self._evictions += 1
+        if self.dtype.kind == "f" and self._evictions >= self.RESUM_PERIOD * self.capacity:
+            self._evictions = 0
+            self.total = float(self.to_array().sum())
+
+    # np.sum(window) / np.mean(window) call these too, so they are O(1) as well
+    # (anything other than a plain call goes through a real array)
+    def sum(self, axis=None, dtype=None, out=None, **kwargs):
+        if dtype is None and out is None and not kwargs:
+            return self.total
+        return np.sum(self.to_array(), axis=axis, dtype=dtype, out=out, **kwargs)
+
+    def mean(self, axis=None, dtype=None, out=None, **kwargs):
+        if dtype is None and out is None and not kwargs:
+            return self.total / self.length if self.length else 0.0
+        return np.mean(self.to_array(), axis=axis, dtype=dtype, out=out, **kwargs)
+
+    # Values oldest first (a copy)
+    def to_array(self):
+        return self._ordered(self.data)
+
+    def _ordered(self, array):
+        end = self.start + self.length
+        if end <= self.capacity:
+            return array[self.start:end].copy()
+        return np.concatenate((array[self.start:], array[:end - self.capacity]))
+
+    def __array__(self, dtype=None, copy=None):
+        values = self.to_array()
+        return values if dtype is None else values.astype(dtype)
+
+    # Change the capacity, keeping the newest values that still fit
+    def resize(self, capacity):
+        if capacity < 1:
+            raise ValueError(f"Capacity must be at least 1, got {capacity}")
+        if capacity == self.capacity:
+            return
+        values = self.to_array()[-capacity:].tolist()
+        if self.duration is None:
+            self.capacity = capacity
+            self._allocate()
+            for value in values:
+                self.append(value)
+            return
+
+        timestamps = self._ordered(self.timestamps)[-capacity:].tolist()
+        first_timestamp = self.first_timestamp
+        self.capacity = capacity
+        self._allocate()
+        for value, timestamp in zip(values, timestamps):
+            self.append(value, timestamp)
+        self.first_timestamp = first_timestamp
+
+    # Change the length of a time based window. Values already in it stay until they are older than the new duration
+    def set_duration(self, duration):
+        self.duration = duration
+        self.resize(self.capacity_for(duration))
+        if self.length:
+            self.expire(self._newest_timestamp())
+
+    def clear(self):
+        self._allocate()
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        return iter(self.to_array().tolist())
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            raise IndexError("RingBuffer index out of range")
+        return self.data[(self.start + index) % self.capacity].item()
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.to_array().tolist()}, capacity={self.capacity})"
+
@@ -0,0 +1,96 @@
+from facegestures.gestures.gesture_engine import GestureEngine, GestureMachine
+
+
+def _feed(engine, name, active, start, end, step=0.05):
+    fired = []
+    for i in range(round((end - start) / step)):
+        t = round(start + i * step, 2)
+        engine.update(name, active, t)
+        winner = engine.arbitrate(t)
+        if winner:
+            fired.append((winner, t))
+    return fired
+
+
+def test_fires_once_after_hold_and_again_only_after_release():
+    engine = GestureEngine()
+    engine.add("eyebrow_raise", hold=0.15, release=0.1)
+    fired = _feed(engine, "eyebrow_raise", True, 0.0, 1.0)
+    assert fired == [("eyebrow_raise", 0.15)]
+
+    # Still latched: a short drop-out doesn't re-arm it
+    assert _feed(engine, "eyebrow_raise", False, 1.0, 1.05) == []
+    assert _feed(engine, "eyebrow_raise", True, 1.05, 1.5) == []
+
+    assert _feed(engine, "eyebrow_raise", False, 1.5, 1.7) == []
+    assert _feed(engine, "eyebrow_raise", True, 1.7, 2.0) == [("eyebrow_raise", 1.85)]
+
+
+def test_refractory_and_cooldown():
+    machine = GestureMachine("blink", refractory=0.5)
+    machine.update(True, 0.0)
+    assert machine.wants_to_fire(0.0)
+    machine.fire(0.0)
+    machine.update(False, 0.1)
+    machine.update(True, 0.2)
+    assert not machine.wants_to_fire(0.2)
+    assert machine.busy(0.2)
+    assert machine.wants_to_fire(0.5)
+
+    machine.fire(0.5)
+    machine.cooldown(2.0, 0.5)
+    machine.update(False, 0.6)
+    machine.update(True, 1.0)
+    assert not machine.wants_to_fire(2.4)
+    assert machine.wants_to_fire(2.5)
+
+
+def test_held_gesture_repeats():
+    engine = GestureEngine()
+    engine.add("look_left", refractory=0.5, repeat=0.5)
+    fired = _feed(engine, "look_left", True, 0.0, 1.6, step=0.1)
+    assert [t for _, t in fired] == [0.0, 0.5, 1.0, 1.5]
+
+
+def test_highest_priority_wins_and_locks_out_the_others():
+    engine = GestureEngine(lockout=0.3)
+    engine.add("shake", priority=1)
+    engine.add("look_left", priority=5)
+    engine.update("shake", True, 0.0)
+    engine.update("look_left", True, 0.0)
+    assert engine.arbitrate(0.0) == "look_left"
+
+    # The suppressed gesture has used up its activation, and nothing fires during the lockout
+    engine.update("shake", True, 0.1)
+    assert engine.arbitrate(0.1) is None
+    assert engine["shake"].state == GestureMachine.LATCHED
+
+
+def test_stale_signal_never_fires():
+    engine = GestureEngine()
+    engine.add("eyebrow_raise", hold=0.2)
+    engine.update("eyebrow_raise", True, 0.0)
+    assert engine.arbitrate(0.1) is None
+
+    # The hold has passed, but nothing reported the signal since the last arbitration (e.g. the face was lost)
+    assert engine.arbitrate(0.3) is None
+    assert engine["eyebrow_raise"].state == GestureMachine.PENDING
+
+    engine.update("eyebrow_raise", True, 0.4)
+    assert engine.arbitrate(0.4) == "eyebrow_raise"
+
+
+def test_busy_until_released_and_ready():
+    engine = GestureEngine()
+    engine.add("nod", release=0.2, refractory=0.8)
+    engine.add("blink")
+    assert not engine.busy(0.0)
+    engine.update("nod", True, 0.0)
+    assert engine.busy(0.0)
+    assert not engine.busy(0.0, names=["blink"])
+    assert engine.arbitrate(0.0) == "nod"
+    engine.update("nod", False, 0.1)
+    engine.update("nod", False, 0.4)
+    assert engine["nod"].state == GestureMachine.IDLE
+    assert engine.busy(0.5)
+    assert not engine.busy(0.8)
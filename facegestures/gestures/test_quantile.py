@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+
+from facegestures.gestures.quantile import P2Quantile
+
+
+def test_exact_for_the_first_five_samples():
+    estimate = P2Quantile(0.5)
+    assert estimate.value() is None
+    for value in (5, 1, 4, 2, 3):
+        estimate.add(value)
+    assert estimate.value() == pytest.approx(3.0)
+
+
+@pytest.mark.parametrize("quantile", [0.05, 0.5, 0.95])
+def test_close_to_the_sample_percentile(quantile):
+    samples = np.random.default_rng(0).normal(0.3, 0.05, 5000)
+    estimate = P2Quantile(quantile)
+    for value in samples:
+        estimate.add(value)
+    assert estimate.value() == pytest.approx(np.percentile(samples, quantile * 100), abs=0.005)
+
+
+def test_reset_forgets_the_samples():
+    estimate = P2Quantile(0.5)
+    for value in range(100):
+        estimate.add(value)
+    estimate.reset()
+    assert estimate.count == 0
+    assert estimate.value() is None
+    estimate.add(7)
+    assert estimate.value() == 7
+
+
+def test_quantile_must_be_inside_0_1():
+    with pytest.raises(ValueError):
+        P2Quantile(1.0)
@@ -0,0 +1,108 @@
+import numpy as np
+import pytest
+
+from facegestures.gestures.ring_buffer import RingBuffer
+from facegestures.gestures.gesture_window import GestureWindow
+from facegestures.pose.pose_related_detections import detect_look_left_right
+
+
+def test_mean_and_order_once_full():
+    window = RingBuffer(3)
+    for value in (1, 2, 3, 4):
+        window.append(value)
+    assert list(window) == [2, 3, 4]
+    assert window.mean() == pytest.approx(3.0)
+    assert np.mean(window) == pytest.approx(3.0)
+
+
+def test_prefilled_window_covers_its_size():
+    window = RingBuffer(4, fill=0)
+    assert window.covers(4)
+
+
+def test_timed_window_expires_old_values():
+    window = RingBuffer.timed(1.0)
+    for i in range(20):
+        window.append(i, i * 0.1)
+    # Values newer than 1.9 - 1.0
+    assert list(window) == list(range(10, 20))
+    # It has been filling for 1.9 s without a gap
+    assert window.covers(1.9)
+    assert not window.covers(2.0)
+
+
+def test_timed_window_doesnt_cover_a_gap():
+    window = GestureWindow.timed(1.67)
+    t = 0.0
+    while t < 2.0:
+        window.append(0, t)
+        t += 1 / 30
+    assert window.covers(1.67)
+
+    # Nothing for 10 s (stall / face lost), then one sample
+    window.append(1, t + 10)
+    assert len(window) == 1
+    assert not window.covers(1.67)
+    assert not detect_look_left_right(window, "left")
+
+
+def test_expire_to_empty_resets_coverage():
+    window = RingBuffer.timed(0.5)
+    window.append(1, 0.0)
+    window.append(1, 0.4)
+    window.expire(5.0)
+    assert len(window) == 0
+    assert not window.covers(0.0)
+    window.append(1, 5.0)
+    assert not window.covers(0.1)
+
+
+def test_set_duration_keeps_newest_values():
+    window = RingBuffer.timed(2.0)
+    for i in range(20):
+        window.append(i, i * 0.1)
+    window.set_duration(0.5)
+    assert list(window) == list(range(15, 20))
+
+
+def test_gesture_window_counts():
+    window = GestureWindow(5)
+    for value in (1, -1, 1, 0, 1, 1):
+        window.append(value)
+    # Oldest 1 fell out: [-1, 1, 0, 1, 1]
+    assert window.direction_changes == 2
+    assert window.count(1) == 3
+    assert not window.all_equal(1)
+
+
+def test_gesture_window_matches_a_recount():
+    values = np.random.default_rng(1).integers(-1, 2, 500)
+    window = GestureWindow(7)
+    for i, value in enumerate(values):
+        window.append(int(value))
+        recent = [int(v) for v in values[max(0, i - 6):i + 1]]
+        changes = sum(1 for a, b in zip(recent, recent[1:]) if b != a and b != 0)
+        assert window.direction_changes == changes
+        assert window.count(-1) == recent.count(-1)
+        assert window.mean() == pytest.approx(np.mean(recent))
+
+
+def test_running_mean_stays_exact_over_many_appends():
+    values = np.random.default_rng(2).normal(0.3, 0.05, 20000)
+    window = RingBuffer(30)
+    for value in values:
+        window.append(value)
+    assert window.mean() == pytest.approx(values[-30:].mean(), abs=1e-12)
+    assert window[-1] == values[-1]
+
+
+def test_resize_keeps_the_newest_values():
+    window = RingBuffer(5)
+    for value in range(8):
+        window.append(value)
+    window.resize(3)
+    assert list(window) == [5, 6, 7]
+    window.resize(6)
+    window.append(8)
+    assert list(window) == [5, 6, 7, 8]
+    assert window.mean() == pytest.approx(6.5)
@@ -3,15 +3,16 @@
 
 import numpy as np
 import cv2
-import tensorflow as tf
+from .tflite_backend import load_interpreter_class
 from functools import partial
 
 
 class BaseTFLiteFaceAlignment():
-    def __init__(self, model_path, num_threads=1):
-        # tflite model init
-        self._interpreter = tf.lite.Interpreter(model_path=model_path,
-                                                num_threads=num_threads)
+    def __init__(self, model_path, num_threads=1, backend=None):
+        # tflite model init (tflite_runtime unless the tensorflow backend is asked for)
+        Interpreter = load_interpreter_class(backend)
+        self._interpreter = Interpreter(model_path=model_path,
+                                        num_threads=num_threads)
         self._interpreter.allocate_tensors()
 
         # model details
@@ -24,16 +25,24 @@ class BaseTFLiteFaceAlignment():
         self._trans_distance = self._edge_size / 2.0
 
         # inference helper
-        self._set_input_tensor = partial(self._interpreter.set_tensor,
-                                         input_details[0]["index"])
+        # tensor() returns a function giving a numpy view of the interpreter's own input buffer,
+        # the preprocessing writes into it directly instead of handing over a new array every call
+        self._input_tensor = self._interpreter.tensor(input_details[0]["index"])
         self._get_camera_matrix = partial(self._interpreter.get_tensor,
                                           output_details[0]["index"])
         self._get_landmarks = partial(self._interpreter.get_tensor,
                                       output_details[1]["index"])
 
+        # reusable warp target, allocated on the first call (its type follows the input image)
+        self._cropped = None
+
     def _preprocessing(self, img, bbox, factor=2.7):
         """Pre-processing of the BGR image. Adopting warp affine for face corp.
 
+        The crop is warped into a reusable buffer, then channel reversed (BGR -> RGB),
+        reordered to NCHW and min-max normalized to [-1, 1] straight into the
+        interpreter's input tensor. No new image sized array is allocated.
+
         Arguments
         ----------
         img {numpy.array} : the raw BGR image.
@@ -45,7 +54,6 @@ class BaseTFLiteFaceAlignment():
 
         Returns
         ----------
-        inp : input tensor with NHWC format.
         M : warp affine matrix.
         """
 
@@ -56,17 +64,28 @@ class BaseTFLiteFaceAlignment():
 
         M = np.array([[scale, 0, cx], [0, scale, cy]])
 
-        cropped = cv2.warpAffine(img, M, self._input_shape, borderValue=0.0)
-        rgb = cropped[:, :, ::-1].astype(np.float32)
+        shape = self._input_shape[::-1] + img.shape[2:]
+        if self._cropped is None or self._cropped.shape != shape or self._cropped.dtype != img.dtype:
+            self._cropped = np.empty(shape, dtype=img.dtype)
+        cv2.warpAffine(img, M, self._input_shape, dst=self._cropped, borderValue=0.0)
+
+        # HWC BGR -> NCHW RGB, converted to float32 while copying
+        inp = self._input_tensor()
+        np.copyto(inp[0], self._cropped.transpose(2, 0, 1)[::-1], casting="unsafe")
 
-        cv2.normalize(rgb, rgb, alpha=-1, beta=1, norm_type=cv2.NORM_MINMAX)
+        # same result as cv2.normalize(alpha=-1, beta=1, norm_type=cv2.NORM_MINMAX),
+        # including a constant image becoming all -1
+        low, high = float(self._cropped.min()), float(self._cropped.max())
+        norm = 2.0 / (high - low) if high > low else 0.0
+        inp *= norm
+        inp += -1.0 - low * norm
 
-        inp = rgb.transpose(2, 0, 1)[None]
+        # the interpreter refuses to run while a view of its buffers is alive
+        del inp
 
-        return inp, M
+        return M
 
-    def _inference(self, input_tensor):
-        self._set_input_tensor(input_tensor)
+    def _inference(self):
         self._interpreter.invoke()
 
     def _decode_landmarks(self, iM):
@@ -100,8 +119,8 @@ class BaseTFLiteFaceAlignment():
         for box in detected_faces:
             if box[2] - box[0] < 100:
                 continue
-            inp, M = self._preprocessing(image, box)
-            self._inference(inp)
+            M = self._preprocessing(image, box)
+            self._inference()
 
             yield self._postprocessing(M)
 
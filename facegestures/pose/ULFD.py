@@ -1,13 +1,52 @@
 from functools import partial
 import cv2
-import tensorflow as tf
 import numpy as np
+from .tflite_backend import load_interpreter_class
+
+
+def non_max_suppression(boxes, scores, max_output_size, iou_threshold=0.5):
+    """Greedy non-maximum suppression, selects the same boxes as tf.image.non_max_suppression.
+
+    Arguments
+    ----------
+    boxes {numpy.array} : (N, 4) boxes in corner format (either corner order).
+    scores {numpy.array} : (N,) score of each box.
+    max_output_size {int} : maximum number of boxes to keep.
+
+    Keyword Arguments
+    ----------
+    iou_threshold : boxes overlapping a kept box by more than this are dropped.
+
+    Returns
+    ----------
+    keep : indices of the kept boxes, highest score first.
+    """
+
+    lower = np.minimum(boxes[:, :2], boxes[:, 2:])
+    upper = np.maximum(boxes[:, :2], boxes[:, 2:])
+    areas = np.prod(upper - lower, axis=1)
+
+    # highest score first, lower index first on ties
+    order = np.argsort(-scores, kind="stable")
+    keep = []
+    while order.size and len(keep) < max_output_size:
+        best, rest = order[0], order[1:]
+        keep.append(best)
+
+        # IoU of the kept box with all remaining boxes at once
+        size = np.clip(np.minimum(upper[best], upper[rest]) - np.maximum(lower[best], lower[rest]), 0, None)
+        inter = size[:, 0] * size[:, 1]
+        union = areas[best] + areas[rest] - inter
+        iou = np.divide(inter, union, out=np.zeros_like(inter), where=union > 0)
+        order = rest[iou <= iou_threshold]
+
+    return np.array(keep, dtype=np.int32)
 
 
 class UltraLightFaceDetection():
     def __init__(self, filepath, input_size=(320, 240), conf_threshold=0.6,
                  center_variance=0.1, size_variance=0.2,
-                 nms_max_output_size=200, nms_iou_threshold=0.3) -> None:
+                 nms_max_output_size=200, nms_iou_threshold=0.3, backend=None) -> None:
 
         self._feature_maps = np.array([[40, 30], [20, 15], [10, 8], [5, 4]])
         self._min_boxes = [[10, 16, 24], [32, 48], [64, 96], [128, 192, 256]]
@@ -19,12 +58,13 @@ class UltraLightFaceDetection():
         self._conf_threshold = conf_threshold
         self._center_variance = center_variance
         self._size_variance = size_variance
-        self._nms = partial(tf.image.non_max_suppression,
+        self._nms = partial(non_max_suppression,
                             max_output_size=nms_max_output_size,
                             iou_threshold=nms_iou_threshold)
 
-        # tflite model init
-        self._interpreter = tf.lite.Interpreter(model_path=filepath)
+        # tflite model init (tflite_runtime unless the tensorflow backend is asked for)
+        Interpreter = load_interpreter_class(backend)
+        self._interpreter = Interpreter(model_path=filepath)
         self._interpreter.allocate_tensors()
 
         # model details
@@ -3,29 +3,52 @@ import cv2
 
 
 # For a given axis (horizontal or vertical), we can count the number of direction changes. If this exceeds some amount, we say a shake or nod has occurred
+# A GestureWindow (facegestures/gestures/gesture_window.py) keeps this count up to date as values are pushed,
+# so it is read in O(1). Any other sequence (e.g. a deque) is walked every call
+# For a time based GestureWindow, time_window is in seconds
 def detect_shake_nod(gaze_history, shake_nod_threshold, time_window):
-    if len(gaze_history) < time_window:
+    if not window_filled(gaze_history, time_window):
         return False
     
     # For a set number of stored frames, check the total times the head position changes from left<->right or up<->down
-    direction_changes = sum(1 for i in range(1, len(gaze_history)) if gaze_history[i] != gaze_history[i-1] and gaze_history[i] != 0)
+    if hasattr(gaze_history, "direction_changes"):
+        direction_changes = gaze_history.direction_changes
+    else:
+        direction_changes = sum(1 for i in range(1, len(gaze_history)) if gaze_history[i] != gaze_history[i-1] and gaze_history[i] != 0)
     
     return direction_changes >= shake_nod_threshold
 
 
+# Whether the history is long enough to look for a shake / nod
+def window_filled(history, time_window):
+    if hasattr(history, "covers"):
+        return history.covers(time_window)
+    return len(history) >= time_window
+
+
+# True if every entry of the history is 'value'. A GestureWindow answers from its per-value counts
+# A time based window has to span its whole duration first (a frame based one starts pre-filled)
+def all_equal(history, value):
+    if hasattr(history, "all_equal"):
+        if getattr(history, "duration", None) is not None and not history.covers(history.duration):
+            return False
+        return history.all_equal(value)
+    return all(x == value for x in history)
+
+
 def detect_look_left_right(left_right_history, direction):
     if direction == 'left':
-        return all(x == 1 for x in left_right_history)
+        return all_equal(left_right_history, 1)
     if direction == 'right':
-        return all(x == -1 for x in left_right_history)
+        return all_equal(left_right_history, -1)
     else:
         print("Invalid direction |  enter either  'left' or 'right'")
 
 def detect_look_up_down(up_down_history, direction):
     if direction == 'up':
-        return all(x == 1 for x in up_down_history)
+        return all_equal(up_down_history, 1)
     if direction == 'down':
-        return all(x == -1 for x in up_down_history)
+        return all_equal(up_down_history, -1)
     else:
         print("Invalid direction  |  enter either 'up' or 'down'")
 
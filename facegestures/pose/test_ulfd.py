@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("cv2")
+
+from facegestures.pose.ULFD import non_max_suppression
+
+
+def _reference(boxes, scores, max_output_size, iou_threshold):
+    # Plain loop over the boxes, one IoU at a time
+    def iou(a, b):
+        lo_a, hi_a = np.minimum(a[:2], a[2:]), np.maximum(a[:2], a[2:])
+        lo_b, hi_b = np.minimum(b[:2], b[2:]), np.maximum(b[:2], b[2:])
+        inter = np.prod(np.clip(np.minimum(hi_a, hi_b) - np.maximum(lo_a, lo_b), 0, None))
+        union = np.prod(hi_a - lo_a) + np.prod(hi_b - lo_b) - inter
+        return inter / union if union > 0 else 0.0
+
+    keep = []
+    for i in sorted(range(len(scores)), key=lambda i: (-scores[i], i)):
+        if len(keep) == max_output_size:
+            break
+        if all(iou(boxes[i], boxes[j]) <= iou_threshold for j in keep):
+            keep.append(i)
+    return keep
+
+
+def test_drops_overlapping_boxes():
+    boxes = np.array([[0, 0, 10, 10], [1, 1, 11, 11], [20, 20, 30, 30]], dtype=np.float32)
+    scores = np.array([0.9, 0.8, 0.7], dtype=np.float32)
+    assert non_max_suppression(boxes, scores, 10, 0.5).tolist() == [0, 2]
+    assert non_max_suppression(boxes, scores, 1, 0.5).tolist() == [0]
+
+
+def test_matches_the_reference_on_random_boxes():
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        boxes = rng.uniform(0, 1, (60, 4)).astype(np.float32)
+        # Ties and flipped corners included
+        scores = rng.choice(np.linspace(0.5, 1, 10), 60).astype(np.float32)
+        expected = _reference(boxes, scores, 20, 0.3)
+        assert non_max_suppression(boxes, scores, 20, 0.3).tolist() == expected
+
+
+def test_no_boxes():
+    keep = non_max_suppression(np.zeros((0, 4), np.float32), np.zeros(0, np.float32), 10)
+    assert keep.dtype == np.int32 and keep.size == 0
@@ -0,0 +1,36 @@
+import os
+
+
+# Name of the environment variable that picks the package providing the TFLite interpreter
+BACKEND_ENV = "FACEGESTURES_TFLITE_BACKEND"
+BACKENDS = ("tflite_runtime", "tensorflow")
+
+
+def load_interpreter_class(backend=None):
+    """Return the TFLite Interpreter class of the requested backend.
+
+    By default the small tflite_runtime package is used. The full tensorflow package
+    (seconds of import time and hundreds of MB of memory) is only imported when it is
+    asked for, either with backend="tensorflow" or FACEGESTURES_TFLITE_BACKEND=tensorflow.
+
+    Keyword Arguments
+    ----------
+    backend {str} : "tflite_runtime" or "tensorflow" (default: {None}, read from the environment).
+    """
+
+    backend = backend or os.environ.get(BACKEND_ENV) or "tflite_runtime"
+
+    if backend == "tflite_runtime":
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError as error:
+            raise ImportError("The tflite_runtime package is not installed. Install it with "
+                              "'pip install tflite-runtime', or set "
+                              f"{BACKEND_ENV}=tensorflow to use the full TensorFlow package") from error
+        return Interpreter
+
+    if backend == "tensorflow":
+        import tensorflow as tf
+        return tf.lite.Interpreter
+
+    raise ValueError(f"Unknown TFLite backend: {backend} (expected one of {', '.join(BACKENDS)})")
@@ -1,11 +1,15 @@
+# Imported before anything else so that --profile-startup can time the imports below
+from pipeline.startup_profiler import startup_profiler, add_profiler_arguments, budgets_from_args
 import cv2
 import dlib
 import numpy as np
 import imutils
+import sys
 import time
 import keyboard
 import pyautogui
 import threading
+import argparse
 import facegestures.pose as service
 from dataclasses import dataclass
 from imutils import face_utils
@@ -13,6 +17,7 @@ from imutils.video import VideoStream
 from collections import deque
 from facegestures.gestures import *
 from eyetracking.eyegestures import EyeGestures_v2 
+from pipeline import StageExecutor, ActionDispatcher, add_source_arguments, open_frame_source_from_args
 
 
 # This class holds all the data that the different processes need to access, share, and modify
@@ -70,6 +75,9 @@ class SharedState:
 
         # Lock for thread synchronization
         self.lock = threading.Lock()
+
+        # ActionDispatcher for the gesture side effects, set in main()
+        self.actions = None
         
         
     # Choose from some default sensitivity levels
@@ -106,6 +114,8 @@ class SharedState:
            
 
 
+# Takes over 3 seconds, so once enabled (see the shake handling below) it has to run on the ActionDispatcher
+# (shared_state.actions), never on a detection thread. It is disabled, like in facegestures/face.py
 def change_pages():
     keyboard.press_and_release('ctrl+alt+right')
     time.sleep(3)
@@ -244,37 +254,50 @@ def pose_estimation_and_shake_nod_detection(frame, shared_state, fa, color=(224,
         current_time = time.time()
         if shake_detected and not nod_detected:
             if current_time - shared_state.last_change_time > shared_state.CHANGE_COOLDOWN_PERIOD:
-                # Uncomment the following line to enable page change functionality
-                # change_pages()
+                # Uncomment the following line to enable page change functionality (it runs on the dispatcher)
+                # shared_state.actions.dispatch(change_pages)
                 shared_state.last_change_time = current_time
 
 
-def main():
+def main(args):
     
-    eye_gestures = EyeGestures_v2(calibration_radius=400)
+    with startup_profiler.phase("model", "eye tracker"):
+        eye_gestures = EyeGestures_v2(calibration_radius=400)
     
-    # Video capture
-    cap = cv2.VideoCapture(0)
+    # Video capture (webcam by default, see --source for recorded clips / synthetic frames)
+    with startup_profiler.phase("capture", "open source"):
+        cap = open_frame_source_from_args(args)
     
     
     screen_width, screen_height = pyautogui.size()
     
     window_name = "Main Test"
-    cv2.namedWindow(window_name, cv2.WND_PROP_FULLSCREEN)
-    cv2.setWindowProperty(window_name, cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
+    with startup_profiler.phase("ui", "window"):
+        cv2.namedWindow(window_name, cv2.WND_PROP_FULLSCREEN)
+        cv2.setWindowProperty(window_name, cv2.WND_PROP_FULLSCREEN, cv2.WINDOW_FULLSCREEN)
 
     
     # Initialize detectors and predictors
     # dlib detector / predictor
-    detector = dlib.get_frontal_face_detector()
-    predictor = dlib.shape_predictor("facegestures/models/shape_predictor_68_face_landmarks.dat")
+    with startup_profiler.phase("model", "detector"):
+        detector = dlib.get_frontal_face_detector()
+    with startup_profiler.phase("model", "predictor"):
+        predictor = dlib.shape_predictor("facegestures/models/shape_predictor_68_face_landmarks.dat")
     # Pose estimation predictor
     # Currently implemented to utilize the dlib detector (may not be needed now that we have multithreading working)
-    fa = service.DepthFacialLandmarks("facegestures/models/sparse_face.tflite")
+    with startup_profiler.phase("model", "pose"):
+        fa = service.DepthFacialLandmarks("facegestures/models/sparse_face.tflite")
 
     # Create a shared state. Consider changing to @dataclass object
     # Holds all the data that the different processes need to access, share, and modify
     shared_state = SharedState()
+    # Gesture side effects (key presses, ...) run on their own worker so they can't stall the detection stages
+    shared_state.actions = ActionDispatcher()
+
+    # Worker threads are created once and reused for every frame
+    executor = StageExecutor()
+    executor.add_stage("face", face_and_blink_detection)
+    executor.add_stage("pose", pose_estimation_and_shake_nod_detection)
 
     while True:
         ret, frame = cap.read()
@@ -304,22 +327,23 @@ def main():
                         (10, screen_height - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
             # pyautogui.moveTo(int(gaze_point[0]), int(gaze_point[1]))
             
-        # Create threads
-        # First thread controls operations relating to face detection, blink detection/calibration, and eyebrow raise detection
-        # Consider further separating these operation into their own threads
-        t1 = threading.Thread(target=face_and_blink_detection, args=(frame, gray, shared_state, detector, predictor))
-        t2 = threading.Thread(target=pose_estimation_and_shake_nod_detection, args=(frame, shared_state, fa))
-    
-
-        # Start threads
-        t1.start()
-        t2.start()
-
-        # Wait for threads to finish
-        t1.join()
-        t2.join()
+        # Hand the frame to the long-lived stage workers
+        # First stage controls operations relating to face detection, blink detection/calibration, and eyebrow raise detection
+        # Consider further separating these operation into their own stages
+        futures = [
+            executor.submit("face", frame, gray, shared_state, detector, predictor),
+            executor.submit("pose", frame, shared_state, fa),
+        ]
+
+        # Wait for both stages to finish this frame
+        executor.wait(futures)
         
         cv2.imshow(window_name, frame)
+
+        # With --profile-startup, startup ends when the first frame went through the gesture detection
+        if args.profile_startup:
+            startup_profiler.finish()
+            break
         
         key = cv2.waitKey(1)
         if key == ord('p'):  # 'p' key to increment EYEBROW_THRESHOLD
@@ -341,12 +365,21 @@ def main():
             break
         # Display the frame
 
+    executor.shutdown()
+    shared_state.actions.shutdown(wait=False)
     cap.release()
     cv2.destroyAllWindows()
 
+    if args.profile_startup:
+        failures = startup_profiler.print_report(budgets_from_args(args))
+        sys.exit(1 if failures else 0)
+
 
 if __name__ == '__main__':
-    main()
+    parser = argparse.ArgumentParser(description="EyeCommunicate gesture test with webcam display")
+    add_source_arguments(parser)
+    add_profiler_arguments(parser)
+    main(parser.parse_args())
 
 
 
@@ -0,0 +1,9 @@
+# Imported first so that --profile-startup also times the imports below
+from .startup_profiler import startup_profiler
+from .stage_executor import StageExecutor, StageWorker, log_stage_error
+from .capture import LatestFrameCapture, CapturedFrame
+from .frame_sources import (FrameSource, CameraSource, VideoFileSource, SyntheticSource,
+                            open_frame_source, add_source_arguments, open_frame_source_from_args)
+from .model_loader import ModelLoader
+from .action_dispatcher import ActionDispatcher
+from .frame_descriptor import FrameDescriptor, ConversionCache, BGR, RGB, GRAY
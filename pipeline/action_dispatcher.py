@@ -0,0 +1,93 @@
+import threading
+import traceback
+from collections import OrderedDict
+
+
+# Runs the side effects of gestures (key presses, page changes, text to speech, ...) on its own worker thread,
+# so a slow action never stalls the detection loop. The detection side only enqueues intents and never waits:
+#   - the queue is bounded, an intent that doesn't fit is dropped (and counted)
+#   - intents are keyed, and an intent whose key is already waiting replaces it instead of queueing twice
+#     (e.g. five "next page" intents while the previous page change is still running become one)
+#
+# Qt widgets may only be touched from the GUI thread. Actions on widgets go through a signal instead
+# (see Overlay.invoke_signal), so the worker only emits it
+class ActionDispatcher:
+    def __init__(self, max_pending=8, name="actions"):
+        if max_pending < 1:
+            raise ValueError(f"max_pending must be at least 1, got {max_pending}")
+        self.max_pending = max_pending
+        # key -> (fn, args, kwargs), oldest first
+        self.pending = OrderedDict()
+        self.condition = threading.Condition()
+        self.running = True
+        self.busy = False
+
+        # Counters, handy to see whether actions are piling up
+        self.stats = {"dispatched": 0, "coalesced": 0, "dropped": 0, "completed": 0, "failed": 0}
+
+        self.thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self.thread.start()
+
+    # Queue fn(*args, **kwargs) under 'key' (fn itself by default). Never blocks
+    # Returns False if the intent was dropped because the queue is full or the dispatcher is shut down
+    def dispatch(self, key, fn=None, *args, **kwargs):
+        if fn is None:
+            fn, key = key, key
+        with self.condition:
+            if not self.running:
+                return False
+            self.stats["dispatched"] += 1
+            if key in self.pending:
+                # Keep its place in the queue, but run it with the newest arguments
+                self.pending[key] = (fn, args, kwargs)
+                self.stats["coalesced"] += 1
+                return True
+            if len(self.pending) >= self.max_pending:
+                self.stats["dropped"] += 1
+                return False
+            self.pending[key] = (fn, args, kwargs)
+            self.condition.notify()
+            return True
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while self.running and not self.pending:
+                    self.condition.wait()
+                if not self.pending:
+                    break
+                _, (fn, args, kwargs) = self.pending.popitem(last=False)
+                self.busy = True
+
+            # Like a failing pipeline stage, a failing action prints its traceback but the worker keeps going
+            try:
+                fn(*args, **kwargs)
+                outcome = "completed"
+            except Exception as e:
+                traceback.print_exception(type(e), e, e.__traceback__)
+                outcome = "failed"
+
+            with self.condition:
+                self.stats[outcome] += 1
+                self.busy = False
+                self.condition.notify_all()
+
+    # Wait until every queued action has run. Returns False on timeout
+    def drain(self, timeout=None):
+        with self.condition:
+            return self.condition.wait_for(lambda: not self.pending and not self.busy, timeout)
+
+    # Stop the worker. With wait=True the actions already queued still run first, otherwise they are discarded
+    def shutdown(self, wait=True, timeout=None):
+        with self.condition:
+            self.running = False
+            if not wait:
+                self.pending.clear()
+            self.condition.notify_all()
+        self.thread.join(timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.shutdown()
@@ -0,0 +1,102 @@
+import threading
+import time
+import traceback
+from collections import namedtuple
+
+
+# A frame together with the time it was read from the source (time.monotonic()) and a
+# frame id that increases by one for every frame the source produced
+CapturedFrame = namedtuple("CapturedFrame", ["frame", "frame_id", "timestamp"])
+
+
+# Reads frames from the source on its own thread and only keeps the newest one.
+# Detection always gets the freshest image instead of whatever has been sitting in the camera
+# buffer, and frames that were replaced before anyone read them are counted as dropped
+# A source that isn't live (a recorded clip or synthetic frames not played back in real time, see
+# FrameSource.is_live) is only read once the previous frame was taken, so every frame is processed
+# and a replay gives the same results however fast the pipeline runs
+class LatestFrameCapture:
+    def __init__(self, source):
+        # Anything with cv2.VideoCapture-like read() / release() methods (a plain cv2.VideoCapture is a camera)
+        self.source = source
+        self.is_live = getattr(source, "is_live", True)
+        self.condition = threading.Condition()
+        self.latest = None
+        self.frame_id = 0
+        self.last_read_id = 0
+        self.captured_frames = 0
+        self.dropped_frames = 0
+        self.running = False
+        self.ended = False
+        self.thread = None
+
+    def start(self):
+        if self.thread is None:
+            self.running = True
+            self.thread = threading.Thread(target=self._run, name="capture", daemon=True)
+            self.thread.start()
+        return self
+
+    # However the thread ends (the source ran out of frames, stop(), or read() raised), the capture is marked
+    # as ended, so a consumer blocked in read() returns None instead of waiting forever
+    def _run(self):
+        try:
+            self._capture_frames()
+        except Exception:
+            print("Frame capture failed:")
+            traceback.print_exc()
+        finally:
+            with self.condition:
+                self.ended = True
+                self.condition.notify_all()
+
+    def _capture_frames(self):
+        while self.running:
+            if not self.is_live:
+                with self.condition:
+                    self.condition.wait_for(lambda: not self.running or self.frame_id <= self.last_read_id)
+                    if not self.running:
+                        break
+            ret, frame = self.source.read()
+            timestamp = time.monotonic()
+            if not ret:
+                break
+            with self.condition:
+                self.frame_id += 1
+                self.captured_frames += 1
+                # The previous frame was never read, so it gets replaced (dropped)
+                if self.latest is not None and self.latest.frame_id > self.last_read_id:
+                    self.dropped_frames += 1
+                self.latest = CapturedFrame(frame, self.frame_id, timestamp)
+                self.condition.notify_all()
+
+    # Block until a frame newer than the last one read is available and return it
+    # Returns None once the source has run out of frames (or on timeout)
+    def read(self, timeout=None):
+        with self.condition:
+            has_new_frame = lambda: self.ended or (self.latest is not None and self.latest.frame_id > self.last_read_id)
+            if not self.condition.wait_for(has_new_frame, timeout):
+                return None
+            if self.latest is None or self.latest.frame_id <= self.last_read_id:
+                return None
+            self.last_read_id = self.latest.frame_id
+            # A source that isn't live can go on with the next frame
+            self.condition.notify_all()
+            return self.latest
+
+    # Summary of how many frames were captured and how many were skipped
+    def stats(self):
+        with self.condition:
+            return {"captured": self.captured_frames, "dropped": self.dropped_frames}
+
+    def stop(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def release(self):
+        self.stop()
+        self.source.release()
@@ -0,0 +1,107 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import cv2
+
+
+# Color orders a FrameDescriptor can describe and convert between
+BGR = "BGR"
+RGB = "RGB"
+GRAY = "GRAY"
+
+CONVERSIONS = {
+    (BGR, RGB): cv2.COLOR_BGR2RGB,
+    (RGB, BGR): cv2.COLOR_RGB2BGR,
+    (BGR, GRAY): cv2.COLOR_BGR2GRAY,
+    (RGB, GRAY): cv2.COLOR_RGB2GRAY,
+}
+
+
+# A frame together with what its pixels are: the color order and whether it is mirrored (flipped left-right)
+# Consumers ask for the version they need with view(color, mirrored) instead of calling cv2.cvtColor / cv2.flip
+# themselves, so nobody converts a frame that is already in the right order (or converts it twice).
+# With a ConversionCache every version of a frame is computed at most once, however many stages ask for it
+# Views are shared between consumers and must not be written to
+class FrameDescriptor:
+    def __init__(self, frame, frame_id=None, color=BGR, mirrored=False, cache=None):
+        if color not in (BGR, RGB, GRAY):
+            raise ValueError(f"Unknown color order: {color}")
+        self.frame = frame
+        self.frame_id = frame_id
+        self.color = color
+        self.mirrored = mirrored
+        self.cache = cache
+
+    # Frame from a LatestFrameCapture (OpenCV sources give BGR, unmirrored frames)
+    @classmethod
+    def from_capture(cls, captured, cache=None, color=BGR, mirrored=False):
+        return cls(captured.frame, captured.frame_id, color, mirrored, cache)
+
+    @property
+    def shape(self):
+        return self.frame.shape
+
+    def view(self, color=BGR, mirrored=False):
+        if color == self.color and mirrored == self.mirrored:
+            return self.frame
+        if self.cache is None or self.frame_id is None:
+            return self.convert(color, mirrored)
+        return self.cache.get(self, color, mirrored)
+
+    # Compute a version of the frame. A mirrored version is flipped from the unflipped version in the
+    # same color order (which, with a cache, is then shared as well)
+    def convert(self, color, mirrored):
+        if mirrored != self.mirrored:
+            return cv2.flip(self.view(color, self.mirrored), 1)
+        if color == self.color:
+            return self.frame
+        if (self.color, color) not in CONVERSIONS:
+            raise ValueError(f"Can't convert a {self.color} frame to {color}")
+        return cv2.cvtColor(self.frame, CONVERSIONS[self.color, color])
+
+    def __repr__(self):
+        return (f"FrameDescriptor(frame_id={self.frame_id}, shape={self.frame.shape}, color={self.color}, "
+                f"mirrored={self.mirrored})")
+
+
+# Converted versions of the most recent frames, keyed by frame id, color order and mirroring
+# Shared by every stage that looks at the same frames (gesture stages, eye tracking, ...). If two threads ask
+# for the same version at the same time, one converts and the other waits for its result
+class ConversionCache:
+    def __init__(self, max_frames=2):
+        self.max_frames = max_frames
+        # frame id -> {(color, mirrored): Future}, oldest frame first
+        self.frames = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "conversions": 0}
+
+    def get(self, descriptor, color, mirrored):
+        key = (color, mirrored)
+        with self.lock:
+            versions = self.frames.get(descriptor.frame_id)
+            if versions is None:
+                versions = self.frames[descriptor.frame_id] = {}
+                while len(self.frames) > self.max_frames:
+                    self.frames.popitem(last=False)
+            future = versions.get(key)
+            if future is not None:
+                self.stats["hits"] += 1
+                owner = False
+            else:
+                future = versions[key] = Future()
+                self.stats["conversions"] += 1
+                owner = True
+
+        if owner:
+            try:
+                future.set_result(descriptor.convert(color, mirrored))
+            except BaseException as e:
+                future.set_exception(e)
+                with self.lock:
+                    self.frames.get(descriptor.frame_id, {}).pop(key, None)
+        return future.result()
+
+    def clear(self):
+        with self.lock:
+            self.frames.clear()
@@ -0,0 +1,227 @@
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".bmp")
+
+
+class FrameSource:
+    """Common interface for everything that produces frames.
+
+    Sources behave like cv2.VideoCapture: read() returns (ret, frame) with a BGR uint8 frame
+    and ret == False once the source has run out of frames. release() frees the source.
+    """
+
+    # Live sources (cameras) produce frames in real time whether we read them or not. LatestFrameCapture only
+    # keeps the newest frame of a live source, and hands out every frame of the others
+    is_live = False
+
+    def read(self):
+        raise NotImplementedError()
+
+    def release(self):
+        pass
+
+    def isOpened(self):
+        return True
+
+
+# Paces a source to a fixed frame rate. Used to replay recorded / synthetic frames 'as if live'
+class _Pacer:
+    def __init__(self, fps):
+        self.interval = 1.0 / fps if fps else 0
+        self.next_time = None
+
+    def wait(self):
+        if not self.interval:
+            return
+        now = time.monotonic()
+        if self.next_time is None:
+            self.next_time = now
+        elif self.next_time > now:
+            time.sleep(self.next_time - now)
+        self.next_time = max(self.next_time, now - self.interval) + self.interval
+
+
+# A live webcam
+class CameraSource(FrameSource):
+    is_live = True
+
+    def __init__(self, index=0, width=None, height=None):
+        self.cap = cv2.VideoCapture(index)
+        if width:
+            self.cap.set(cv2.CAP_PROP_FRAME_WIDTH, width)
+        if height:
+            self.cap.set(cv2.CAP_PROP_FRAME_HEIGHT, height)
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30
+
+    def read(self):
+        return self.cap.read()
+
+    def release(self):
+        self.cap.release()
+
+    def isOpened(self):
+        return self.cap.isOpened()
+
+
+# A recorded clip: either a video file or a sequence of images (a directory or a glob pattern)
+# By default frames are returned as fast as they can be decoded, realtime=True paces them to the clip's fps
+class VideoFileSource(FrameSource):
+    def __init__(self, path, loop=False, realtime=False, fps=None):
+        self.path = path
+        self.loop = loop
+        self.cap = None
+        self.images = None
+        self.index = 0
+
+        if os.path.isdir(path):
+            self.images = sorted(os.path.join(path, name) for name in os.listdir(path)
+                                 if name.lower().endswith(IMAGE_EXTENSIONS))
+        elif glob.has_magic(path):
+            self.images = sorted(glob.glob(path))
+        else:
+            if not os.path.isfile(path):
+                raise FileNotFoundError(f"Video file not found: {path}")
+            self.cap = cv2.VideoCapture(path)
+
+        if self.images is not None and len(self.images) == 0:
+            raise FileNotFoundError(f"No images found in: {path}")
+
+        if fps is None:
+            fps = self.cap.get(cv2.CAP_PROP_FPS) if self.cap is not None else 30
+        self.fps = fps or 30
+        self.pacer = _Pacer(self.fps if realtime else None)
+        # Played back at its frame rate it stands in for a camera, frames the pipeline is too slow for are dropped
+        self.is_live = realtime
+
+    def _read_next(self):
+        if self.cap is not None:
+            return self.cap.read()
+
+        if self.index >= len(self.images):
+            return False, None
+        frame = cv2.imread(self.images[self.index])
+        self.index += 1
+        return frame is not None, frame
+
+    def read(self):
+        self.pacer.wait()
+        ret, frame = self._read_next()
+        if not ret and self.loop:
+            self.rewind()
+            ret, frame = self._read_next()
+        return ret, frame
+
+    def rewind(self):
+        if self.cap is not None:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+        self.index = 0
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+
+    def isOpened(self):
+        return self.cap.isOpened() if self.cap is not None else True
+
+
+# Generates a simple moving 'face' (head, eyes, eyebrows) that periodically blinks
+# Meant for load testing the pipeline on machines without a webcam, not for testing detection accuracy
+class SyntheticSource(FrameSource):
+    def __init__(self, width=640, height=480, fps=30, num_frames=None, realtime=False, period=90):
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.num_frames = num_frames
+        self.period = period
+        self.frame_count = 0
+        self.pacer = _Pacer(fps if realtime else None)
+        self.is_live = realtime
+        # One cycle of frames is rendered lazily and then reused, so generating frames is cheap
+        self.cache = [None] * period
+
+    def _render(self, i):
+        frame = np.full((self.height, self.width, 3), 90, dtype=np.uint8)
+        phase = 2 * np.pi * i / self.period
+        cx = int(self.width / 2 + self.width * 0.08 * np.sin(phase))
+        cy = int(self.height / 2 + self.height * 0.05 * np.sin(2 * phase))
+        face_w, face_h = int(self.width * 0.17), int(self.height * 0.3)
+
+        cv2.ellipse(frame, (cx, cy), (face_w, face_h), 0, 0, 360, (150, 180, 220), -1)
+        eye_dx, eye_y = face_w // 2, cy - face_h // 5
+        # Eyes close for a few frames at the end of every cycle
+        eye_h = 2 if i > self.period - 5 else face_h // 12
+        for ex in (cx - eye_dx, cx + eye_dx):
+            cv2.ellipse(frame, (ex, eye_y), (face_w // 5, eye_h), 0, 0, 360, (40, 40, 40), -1)
+            cv2.line(frame, (ex - face_w // 4, eye_y - face_h // 6), (ex + face_w // 4, eye_y - face_h // 6), (50, 60, 80), 4)
+        cv2.line(frame, (cx, cy - face_h // 10), (cx, cy + face_h // 5), (120, 140, 180), 3)
+        cv2.ellipse(frame, (cx, cy + face_h // 2), (face_w // 3, face_h // 12), 0, 0, 180, (60, 60, 160), 3)
+        return frame
+
+    def read(self):
+        if self.num_frames is not None and self.frame_count >= self.num_frames:
+            return False, None
+        self.pacer.wait()
+
+        i = self.frame_count % self.period
+        if self.cache[i] is None:
+            self.cache[i] = self._render(i)
+        self.frame_count += 1
+        # Callers draw on the frames they get, so hand out a copy of the cached frame
+        return True, self.cache[i].copy()
+
+
+# Build a frame source from a command line spec:
+#   camera, camera:1            -> live webcam (default index 0)
+#   video:clip.mp4              -> recorded video
+#   images:dir or images:*.png  -> image sequence
+#   synthetic, synthetic:640x480@30, synthetic:640x480@30:300 -> generated frames (optionally limited to N frames)
+#   A bare path is treated as a video or an image sequence
+def open_frame_source(spec="camera", realtime=False, loop=False):
+    kind, _, arg = spec.partition(":")
+    kind = kind.lower()
+
+    if kind == "camera":
+        return CameraSource(int(arg) if arg else 0)
+
+    if kind in ("video", "images"):
+        return VideoFileSource(arg, loop=loop, realtime=realtime)
+
+    if kind == "synthetic":
+        width, height, fps, num_frames = 640, 480, 30, None
+        if arg:
+            size, _, num = arg.partition(":")
+            size, _, rate = size.partition("@")
+            if size:
+                width, height = (int(v) for v in size.lower().split("x"))
+            if rate:
+                fps = float(rate)
+            if num:
+                num_frames = int(num)
+        return SyntheticSource(width, height, fps, num_frames, realtime=realtime)
+
+    if os.path.exists(spec) or glob.has_magic(spec):
+        return VideoFileSource(spec, loop=loop, realtime=realtime)
+
+    raise ValueError(f"Unknown frame source: {spec}")
+
+
+# Adds the --source / --realtime / --loop flags shared by every entry point
+def add_source_arguments(parser, default="camera"):
+    parser.add_argument("--source", default=default,
+                        help="Frame source: camera[:index], video:<file>, images:<dir or glob>, "
+                             "synthetic[:WxH@fps[:frames]] (default: %(default)s)")
+    parser.add_argument("--realtime", action="store_true",
+                        help="Pace recorded / synthetic sources to their frame rate instead of running as fast as possible")
+    parser.add_argument("--loop", action="store_true",
+                        help="Restart recorded sources when they reach the end")
+    return parser
+
+
+def open_frame_source_from_args(args):
+    return open_frame_source(args.source, realtime=args.realtime, loop=args.loop)
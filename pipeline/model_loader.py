@@ -0,0 +1,60 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Loads models in the background, all at the same time, as soon as the process starts
+# Each model gets a future; whoever needs the model waits for it (usually it is long done by then)
+# An optional warm-up function runs one inference on the freshly loaded model, so the
+# one-time setup cost (memory allocation, interpreter preparation) isn't paid by the first real frame
+class ModelLoader:
+    def __init__(self, max_workers=None):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="model-loader")
+        self.futures = {}
+        # Seconds spent loading / warming up each model
+        self.load_times = {}
+        self.warmup_times = {}
+        self.lock = threading.Lock()
+
+    # Start loading a model: factory(*args, **kwargs) builds it, warmup(model) (optional) runs a first inference
+    def load(self, name, factory, *args, warmup=None, **kwargs):
+        if name in self.futures:
+            raise ValueError(f"Model '{name}' is already being loaded")
+
+        def run():
+            start = time.perf_counter()
+            model = factory(*args, **kwargs)
+            loaded = time.perf_counter()
+            if warmup is not None:
+                warmup(model)
+            with self.lock:
+                self.load_times[name] = loaded - start
+                if warmup is not None:
+                    self.warmup_times[name] = time.perf_counter() - loaded
+            return model
+
+        self.futures[name] = self.executor.submit(run)
+        return self.futures[name]
+
+    def future(self, name):
+        return self.futures[name]
+
+    # Wait for a model and return it. A failed load raises its exception here
+    def get(self, name, timeout=None):
+        return self.futures[name].result(timeout)
+
+    # Wait for several models (all of them by default). Returns {name: model}
+    def wait(self, names=None, timeout=None):
+        return {name: self.get(name, timeout) for name in (names or list(self.futures))}
+
+    def done(self, name):
+        return self.futures[name].done()
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.shutdown()
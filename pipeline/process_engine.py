@@ -0,0 +1,395 @@
+import multiprocessing as mp
+import queue
+import threading
+import time
+import traceback
+from collections import namedtuple
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .frame_descriptor import FrameDescriptor
+
+
+"""
+    Multi-process detection engine.
+
+    Every heavy stage (dlib face/landmark detection, the TFLite pose model, the eyeGestures tracker)
+    runs in its own process with its own models, so the stages no longer fight over one interpreter
+    lock. Frames are written once into shared memory ring slots and the workers read them in place.
+    Only small results (landmarks, camera matrices, gaze points) are sent back to the coordinator.
+"""
+
+
+# Everything a worker needs to attach to a ring (picklable)
+RingSpec = namedtuple("RingSpec", ["names", "shape", "dtype"])
+
+# Lightweight stand-ins for eyeGestures' Gevent / Cevent that can be sent between processes
+GazeEvent = namedtuple("GazeEvent", ["point", "blink", "fixation"])
+CalibrationEvent = namedtuple("CalibrationEvent", ["point", "acceptance_radius", "calibration_radius"])
+
+
+# Returned instead of a result when a stage raised an exception in its worker
+class StageError:
+    def __init__(self, stage, message):
+        self.stage = stage
+        self.message = message
+
+    def __repr__(self):
+        return f"StageError({self.stage!r})\n{self.message}"
+
+
+# Fixed number of frame-sized slots in shared memory, written round robin
+class SharedFrameRing:
+    def __init__(self, shape, dtype=np.uint8, slots=4, spec=None):
+        self.owner = spec is None
+        if self.owner:
+            nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+            self.blocks = [shared_memory.SharedMemory(create=True, size=nbytes) for _ in range(slots)]
+            self.spec = RingSpec(tuple(block.name for block in self.blocks), tuple(shape), np.dtype(dtype).str)
+        else:
+            # Workers share the coordinator's resource tracker, so attaching doesn't register the memory twice
+            self.blocks = [shared_memory.SharedMemory(name=name) for name in spec.names]
+            self.spec = spec
+
+        self.views = [np.ndarray(self.spec.shape, dtype=self.spec.dtype, buffer=block.buf) for block in self.blocks]
+        self.next_slot = 0
+
+    @classmethod
+    def attach(cls, spec):
+        return cls(spec.shape, spec.dtype, len(spec.names), spec=spec)
+
+    def __len__(self):
+        return len(self.blocks)
+
+    def matches(self, frame):
+        return frame.shape == self.spec.shape and frame.dtype == np.dtype(self.spec.dtype)
+
+    # Copy the frame into the given slot (the only copy a frame ever gets)
+    def write(self, slot, frame):
+        np.copyto(self.views[slot], frame)
+
+    def view(self, slot):
+        return self.views[slot]
+
+    def close(self):
+        # Views have to go before the memory they point into can be closed
+        self.views = []
+        for block in self.blocks:
+            block.close()
+            if self.owner:
+                block.unlink()
+        self.blocks = []
+
+
+"""
+    Stage factories. They run inside the worker process, load the models there and return a
+    function (frame, payload) -> small, picklable result.
+"""
+
+# dlib face detection + 68 point landmarks
+# Result: list of ((left, top, right, bottom), 68x2 landmark array)
+def face_landmark_stage(predictor_path, redetect_interval=1, tracker="landmarks", detection_scale=1.0):
+    import cv2
+    import dlib
+    from facegestures.gestures import FaceLocator
+
+    locator = FaceLocator(dlib.get_frontal_face_detector(), dlib.shape_predictor(predictor_path),
+                          redetect_interval=redetect_interval, tracker=tracker, detection_scale=detection_scale)
+
+    def process(frame, payload):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        return [((face.left(), face.top(), face.right(), face.bottom()), landmarks)
+                for face, landmarks in locator.locate(gray)]
+    return process
+
+
+# TFLite pose model. The payload holds the face boxes (x1, y1, x2, y2) to run it on
+# Result: list of (68x3 landmarks, camera matrix)
+def pose_landmark_stage(model_path):
+    from facegestures.pose import DepthFacialLandmarks
+
+    fa = DepthFacialLandmarks(model_path)
+
+    def process(frame, payload):
+        return list(fa.get_landmarks(frame, payload))
+    return process
+
+
+# dlib face detection + the TFLite pose model for all landmarks (--landmarks unified)
+# Result: (list of ((left, top, right, bottom), 68x2 landmark array), list of (landmarks, camera matrix))
+def unified_landmark_stage(model_path, redetect_interval=1, tracker="landmarks", detection_scale=1.0):
+    import cv2
+    import dlib
+    from facegestures.gestures import FaceLocator, dfl_landmarks
+    from facegestures.pose import DepthFacialLandmarks
+
+    locator = FaceLocator(dlib.get_frontal_face_detector(), None,
+                          redetect_interval=redetect_interval, tracker=tracker, detection_scale=detection_scale)
+    fa = DepthFacialLandmarks(model_path)
+
+    def process(frame, payload):
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        detections, pose_results = dfl_landmarks(frame, locator.detect(gray), fa)
+        locator.update_from_landmarks(detections)
+        return ([((face.left(), face.top(), face.right(), face.bottom()), landmarks) for face, landmarks in detections],
+                pose_results)
+    return process
+
+
+# EyeGestures_v2 methods RemoteEyeGestures can call in the 'gaze' worker
+GAZE_CALLS = ("saveModel", "loadModel", "uploadCalibrationMap", "startDriftCorrection")
+
+
+# eyeGestures tracker. The tracker (and its calibration) lives in the worker for the whole run,
+# the payload holds the remaining arguments of EyeGestures_v2.step
+# Result: (GazeEvent or None, CalibrationEvent or None)
+def gaze_stage(calibration_radius, classical_impact=2, fixation=1.0):
+    from eyetracking.eyegestures import EyeGestures_v2
+
+    eye_gestures = EyeGestures_v2(calibration_radius)
+    eye_gestures.setClassicalImpact(classical_impact)
+    eye_gestures.setFixation(fixation)
+
+    def process(frame, payload):
+        # No frame: a call of one of the tracker's calibration methods (see RemoteEyeGestures)
+        if frame is None:
+            method, args = payload
+            if method not in GAZE_CALLS:
+                raise ValueError(f"Not a calibration method: {method}")
+            return getattr(eye_gestures, method)(*args)
+
+        calibration, width, height, context, layout = payload
+        # Same color order / mirroring as the descriptor the frame came from (None: a plain array)
+        if layout is not None:
+            frame = FrameDescriptor(frame, None, *layout)
+        gevent, cevent = eye_gestures.step(frame, calibration=calibration, width=width, height=height, context=context)
+        if gevent is None:
+            return None, None
+        return (GazeEvent(np.asarray(gevent.point), gevent.blink, gevent.fixation),
+                CalibrationEvent(np.asarray(cevent.point), cevent.acceptance_radius, cevent.calibration_radius))
+    return process
+
+
+def _stage_worker(name, factory, factory_args, jobs, results):
+    try:
+        process = factory(*factory_args)
+    except Exception:
+        results.put((name, "ready", StageError(name, traceback.format_exc())))
+        return
+    results.put((name, "ready", None))
+
+    rings = {}
+    while True:
+        job = jobs.get()
+        # None is the shutdown sentinel
+        if job is None:
+            break
+
+        spec, slot, frame_id, payload = job
+        # A job without a frame (see ProcessDetectionEngine.call)
+        if spec is None:
+            try:
+                result = process(None, payload)
+            except Exception:
+                result = StageError(name, traceback.format_exc())
+            results.put((name, frame_id, result))
+            continue
+
+        # Attach to a ring the first time we see it (a new ring is created when the frame size changes)
+        ring = rings.get(spec.names)
+        if ring is None:
+            for old in rings.values():
+                old.close()
+            ring = SharedFrameRing.attach(spec)
+            rings = {spec.names: ring}
+
+        try:
+            result = process(ring.view(slot), payload)
+        except Exception:
+            result = StageError(name, traceback.format_exc())
+        results.put((name, frame_id, result))
+
+    for ring in rings.values():
+        ring.close()
+
+
+# Runs each stage in its own process and hands frames to them through a SharedFrameRing
+# submit() / collect() can be called from several threads (e.g. the main loop for the gesture stages and
+# the eye tracking stage thread through RemoteEyeGestures)
+class ProcessDetectionEngine:
+    # While waiting for results, the lock is only held for this long at a time so other threads can go on
+    POLL_INTERVAL = 0.005
+
+    def __init__(self, stages, slots=4):
+        # stages: {name: (factory, factory_args)}. Factories must be top level (picklable) functions
+        self.stages = stages
+        self.slots = slots
+        self.ring = None
+        self.context = mp.get_context("spawn")
+        self.results = self.context.Queue()
+        self.jobs = {}
+        self.workers = {}
+
+        self.frame_id = 0
+        # Stages that still have to finish with a slot before it can be overwritten
+        self.slot_pending = [set() for _ in range(slots)]
+        self.slot_frame = [None] * slots
+        self.finished = {}
+        self.lock = threading.RLock()
+
+    def start(self):
+        for name, (factory, factory_args) in self.stages.items():
+            self.jobs[name] = self.context.Queue()
+            worker = self.context.Process(target=_stage_worker, name=f"stage-{name}", daemon=True,
+                                          args=(name, factory, factory_args, self.jobs[name], self.results))
+            worker.start()
+            self.workers[name] = worker
+        return self
+
+    # Block until every worker has loaded its models
+    def wait_ready(self, timeout=None):
+        ready = set()
+        while len(ready) < len(self.workers):
+            name, frame_id, error = self.results.get(timeout=timeout)
+            if frame_id != "ready":
+                continue
+            if error is not None:
+                raise RuntimeError(f"Detection stage '{name}' failed to start:\n{error.message}")
+            ready.add(name)
+        return self
+
+    def _receive(self, timeout=None):
+        name, frame_id, result = self.results.get(timeout=timeout)
+        if frame_id == "ready":
+            if result is not None:
+                raise RuntimeError(f"Detection stage '{name}' failed to start:\n{result.message}")
+            return
+        self.finished.setdefault(frame_id, {})[name] = result
+        for slot, pending in enumerate(self.slot_pending):
+            if self.slot_frame[slot] == frame_id:
+                pending.discard(name)
+
+    # Send the frame to the given stages. payloads maps stage name -> extra (small) input
+    # Returns the frame id to pass to collect()
+    def submit(self, frame, payloads=None, stages=None):
+        with self.lock:
+            return self._submit(frame, payloads, stages)
+
+    def _submit(self, frame, payloads, stages):
+        payloads = payloads or {}
+        stages = tuple(stages or self.stages)
+
+        if self.ring is None or not self.ring.matches(frame):
+            # Never free a ring the workers may still be reading from
+            for slot in range(len(self.slot_pending)):
+                while self.slot_pending[slot]:
+                    self._receive()
+            if self.ring is not None:
+                self.ring.close()
+            self.ring = SharedFrameRing(frame.shape, frame.dtype, self.slots)
+            self.ring.next_slot = 0
+
+        slot = self._free_slot()
+
+        self.frame_id += 1
+        self.ring.write(slot, frame)
+        self.slot_frame[slot] = self.frame_id
+        self.slot_pending[slot] = set(stages)
+        for name in stages:
+            self.jobs[name].put((self.ring.spec, slot, self.frame_id, payloads.get(name)))
+        return self.frame_id
+
+    # Send a job without a frame to one stage (e.g. loading a calibration into the gaze worker) and wait for
+    # its result. The stage's process function is called with frame=None and the payload
+    def call(self, stage, payload, timeout=None):
+        with self.lock:
+            self.frame_id += 1
+            frame_id = self.frame_id
+            self.jobs[stage].put((None, None, frame_id, payload))
+        return self.collect(frame_id, stages=(stage,), timeout=timeout)[stage]
+
+    # Next slot (round robin) that no stage is reading from, so a slow stage holding one slot doesn't hold
+    # back the others. Waits for the workers if every slot is in use
+    def _free_slot(self):
+        while True:
+            for offset in range(len(self.ring)):
+                slot = (self.ring.next_slot + offset) % len(self.ring)
+                if not self.slot_pending[slot]:
+                    self.ring.next_slot = (slot + 1) % len(self.ring)
+                    return slot
+            self._receive()
+
+    # Wait for the results of a submitted frame. Returns {stage name: result}
+    # A stage that raised returns a StageError
+    # Raises queue.Empty on timeout
+    def collect(self, frame_id, stages=None, timeout=None):
+        stages = tuple(stages or self.stages)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self.lock:
+                if all(name in self.finished.get(frame_id, {}) for name in stages):
+                    results = self.finished[frame_id]
+                    collected = {name: results.pop(name) for name in stages}
+                    if not results:
+                        del self.finished[frame_id]
+                    return collected
+                try:
+                    # Whatever arrives is stored in self.finished, also results for another thread's frame
+                    self._receive(self.POLL_INTERVAL)
+                except queue.Empty:
+                    if deadline is not None and time.monotonic() > deadline:
+                        raise
+
+    def shutdown(self):
+        for name, jobs in self.jobs.items():
+            jobs.put(None)
+        for worker in self.workers.values():
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+        self.workers = {}
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+
+# Drop-in for EyeGestures_v2 when the tracker runs in the engine's 'gaze' process
+# step() has the same signature and returns objects with the same point / radius attributes
+class RemoteEyeGestures:
+    def __init__(self, engine, stage="gaze"):
+        self.engine = engine
+        self.stage = stage
+
+    # 'frame' is a FrameDescriptor or a plain array, like for EyeGestures_v2.step. A descriptor's frame is shared
+    # as is, the worker does the conversions the tracker needs
+    def step(self, frame, calibration, width, height, context="main"):
+        layout = None
+        if isinstance(frame, FrameDescriptor):
+            frame, layout = frame.frame, (frame.color, frame.mirrored)
+        frame_id = self.engine.submit(frame, {self.stage: (calibration, width, height, context, layout)},
+                                      stages=(self.stage,))
+        result = self.engine.collect(frame_id, stages=(self.stage,))[self.stage]
+        if isinstance(result, StageError):
+            print(result)
+            return None, None
+        return result
+
+    # The calibration methods run in the worker, on its tracker. Failures raise, like they would in process
+    def _call(self, method, *args):
+        result = self.engine.call(self.stage, (method, args))
+        if isinstance(result, StageError):
+            raise RuntimeError(f"{method} failed in the {self.stage} worker:\n{result.message}")
+        return result
+
+    def saveModel(self, context="main"):
+        return self._call("saveModel", context)
+
+    def loadModel(self, model, context="main"):
+        return self._call("loadModel", model, context)
+
+    def uploadCalibrationMap(self, points, context="main"):
+        return self._call("uploadCalibrationMap", points, context)
+
+    def startDriftCorrection(self, points, context="main"):
+        return self._call("startDriftCorrection", points, context)
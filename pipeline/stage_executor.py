@@ -0,0 +1,123 @@
+import queue
+import threading
+import time
+import traceback
+from concurrent.futures import Future
+
+
+# A long-lived worker thread that runs one pipeline stage (e.g. face/blink detection)
+# Work is handed to it through a bounded queue and results come back through futures,
+# so every frame costs a queue put/get instead of creating, starting and joining a new thread
+#
+# A stage with its own cadence (e.g. eye tracking) is fed with submit_if_ready() instead, which never blocks:
+# the frame is skipped while the stage is still busy, or if max_rate (frames per second) would be exceeded
+class StageWorker:
+    def __init__(self, name, target, queue_size=2, max_rate=None):
+        self.name = name
+        self.target = target
+        self.jobs = queue.Queue(maxsize=queue_size)
+        self.max_rate = max_rate
+        self.last_submit = float("-inf")
+        # Jobs queued or running
+        self.in_flight = 0
+        self.lock = threading.Lock()
+        self.stats = {"submitted": 0, "skipped_busy": 0, "skipped_rate": 0}
+        self.thread = threading.Thread(target=self._run, name=f"stage-{name}", daemon=True)
+        self.thread.start()
+
+    def submit(self, *args, **kwargs):
+        future = Future()
+        with self.lock:
+            self.in_flight += 1
+            self.stats["submitted"] += 1
+            self.last_submit = time.monotonic()
+        # Blocks while the queue is full, which stops the capture loop from running ahead of a slow stage
+        self.jobs.put((future, args, kwargs))
+        return future
+
+    # Returns None (and drops the frame) instead of waiting for the stage
+    def submit_if_ready(self, *args, **kwargs):
+        with self.lock:
+            if self.in_flight:
+                self.stats["skipped_busy"] += 1
+                return None
+            if self.max_rate and time.monotonic() - self.last_submit < 1.0 / self.max_rate:
+                self.stats["skipped_rate"] += 1
+                return None
+        return self.submit(*args, **kwargs)
+
+    def busy(self):
+        return self.in_flight > 0
+
+    def stop(self):
+        self.jobs.put(None)
+        self.thread.join()
+
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            # None is the shutdown sentinel
+            if job is None:
+                break
+
+            future, args, kwargs = job
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(self.target(*args, **kwargs))
+                    except BaseException as e:
+                        future.set_exception(e)
+            finally:
+                with self.lock:
+                    self.in_flight -= 1
+
+
+# Done callback for futures nobody waits on (e.g. from submit_if_ready): print the traceback if the stage failed
+def log_stage_error(future):
+    if future.cancelled():
+        return
+    e = future.exception()
+    if e is not None:
+        traceback.print_exception(type(e), e, e.__traceback__)
+
+
+# Holds one StageWorker per named stage. Workers are created once and reused for every frame
+class StageExecutor:
+    def __init__(self, queue_size=2):
+        self.queue_size = queue_size
+        self.stages = {}
+
+    def add_stage(self, name, target, queue_size=None, max_rate=None):
+        if name in self.stages:
+            raise ValueError(f"Stage '{name}' already exists")
+        self.stages[name] = StageWorker(name, target, queue_size or self.queue_size, max_rate)
+
+    def submit(self, name, *args, **kwargs):
+        return self.stages[name].submit(*args, **kwargs)
+
+    def submit_if_ready(self, name, *args, **kwargs):
+        return self.stages[name].submit_if_ready(*args, **kwargs)
+
+    # Wait for every future to finish. Like an exception inside a plain threading.Thread,
+    # a failing stage prints its traceback but does not stop the main loop
+    @staticmethod
+    def wait(futures):
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result())
+            except Exception as e:
+                traceback.print_exception(type(e), e, e.__traceback__)
+                results.append(None)
+        return results
+
+    def shutdown(self):
+        for worker in self.stages.values():
+            worker.stop()
+        self.stages.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.shutdown()
@@ -0,0 +1,179 @@
+import builtins
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+"""
+    Startup profiler (--profile-startup).
+
+    Times the heavy imports, every model load and every UI construction step between process start
+    and the first frame that went through the gesture detection, prints them sorted by cost and checks
+    them against configurable budgets.
+
+    The entry points import this module before anything else (see pipeline/__init__.py), and it starts
+    timing on import when --profile-startup is on the command line, so the imports that follow are measured.
+"""
+
+PROFILE_FLAG = "--profile-startup"
+
+# Packages whose import time is measured. Imports of other modules done while importing one of
+# these count towards it; a tracked package imported by another (e.g. mediapipe by eyeGestures)
+# is reported separately and subtracted from its parent's own time
+TRACKED_IMPORTS = ("tensorflow", "tflite_runtime", "dlib", "cv2", "mediapipe", "eyeGestures", "sklearn",
+                   "torch", "PyQt5", "pygame", "pyautogui", "nltk")
+
+# Steps that wait for the user (e.g. the eye tracker calibration) are reported but not part of the budget
+INTERACTIVE = "interactive"
+
+
+class StartupProfiler:
+    def __init__(self, tracked=TRACKED_IMPORTS):
+        self.tracked = set(tracked)
+        self.enabled = False
+        self.start_time = None
+        self.end_time = None
+        # (kind, name) -> seconds, in the order they were recorded
+        self.entries = {}
+        self.lock = threading.Lock()
+
+        self._original_import = None
+        # Per thread stack of the time spent in nested tracked imports
+        self._local = threading.local()
+
+    def start(self):
+        if self.enabled:
+            return self
+        self.enabled = True
+        self.start_time = time.perf_counter()
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._timed_import
+        return self
+
+    def stop_import_timing(self):
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        top = name.partition(".")[0]
+        if level != 0 or top not in self.tracked or top in sys.modules:
+            return self._original_import(name, globals, locals, fromlist, level)
+
+        stack = self._local.__dict__.setdefault("stack", [])
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            nested = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            # Failed (e.g. optional) imports aren't reported
+            if top in sys.modules:
+                self.record("import", top, elapsed - nested)
+
+    def record(self, kind, name, seconds):
+        if not self.enabled:
+            return
+        with self.lock:
+            key = (kind, name)
+            self.entries[key] = self.entries.get(key, 0.0) + seconds
+
+    # Time a block: with profiler.phase("ui", "overlay"): ...
+    @contextmanager
+    def phase(self, kind, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(kind, name, time.perf_counter() - start)
+
+    # Copy the load / warm-up times of a ModelLoader
+    def record_model_loader(self, loader):
+        for name, seconds in loader.load_times.items():
+            self.record("model", name, seconds)
+        for name, seconds in loader.warmup_times.items():
+            self.record("warmup", name, seconds)
+
+    # Startup is over (the first frame went through the detection stages)
+    def finish(self):
+        if self.end_time is None:
+            self.end_time = time.perf_counter()
+        self.stop_import_timing()
+
+    def report(self):
+        total = (self.end_time or time.perf_counter()) - self.start_time
+        interactive = sum(seconds for (kind, _), seconds in self.entries.items() if kind == INTERACTIVE)
+        entries = sorted(self.entries.items(), key=lambda item: item[1], reverse=True)
+        return {
+            "total_s": round(total, 3),
+            "startup_s": round(total - interactive, 3),
+            "entries": [{"kind": kind, "name": name, "seconds": round(seconds, 3)} for (kind, name), seconds in entries],
+        }
+
+    # budgets: {"startup": s, "<kind>": s (all entries of a kind), "<kind>:<name>": s}
+    # Returns the list of budgets that were exceeded
+    def check_budgets(self, budgets):
+        report = self.report()
+        spent = {"startup": report["startup_s"], "total": report["total_s"]}
+        for entry in report["entries"]:
+            spent[entry["kind"]] = spent.get(entry["kind"], 0.0) + entry["seconds"]
+            spent[f"{entry['kind']}:{entry['name']}"] = entry["seconds"]
+
+        failures = []
+        for key, budget in budgets.items():
+            if spent.get(key, 0.0) > budget:
+                failures.append(f"{key}: {spent[key]:.3f} s > {budget:.3f} s")
+        return failures
+
+    def print_report(self, budgets=None):
+        report = self.report()
+        print(f"Startup profile: {report['total_s']:.3f} s to the first frame, "
+              f"{report['startup_s']:.3f} s without waiting for the user")
+        for entry in report["entries"]:
+            label = f"{entry['kind']}:{entry['name']}"
+            print(f"  {label:<32} {entry['seconds']:8.3f} s")
+
+        failures = self.check_budgets(budgets or {})
+        if budgets:
+            print("Startup budget: " + ("FAILED" if failures else "OK"))
+            for failure in failures:
+                print(f"  {failure}")
+        return failures
+
+
+# "import:tensorflow=1.5" -> ("import:tensorflow", 1.5)
+def parse_budget(text):
+    key, _, seconds = text.rpartition("=")
+    if not key:
+        raise ValueError(f"Expected <name>=<seconds>, got '{text}'")
+    return key, float(seconds)
+
+
+# Adds --profile-startup / --startup-budget / --budget to an entry point's parser
+def add_profiler_arguments(parser):
+    parser.add_argument(PROFILE_FLAG, action="store_true",
+                        help="Time every import, model load and UI step until the first frame has been processed, "
+                             "print the report and exit (non-zero if a budget is exceeded)")
+    parser.add_argument("--startup-budget", type=float, default=None,
+                        help="With --profile-startup: seconds allowed until the first frame, not counting time waiting for the user")
+    parser.add_argument("--budget", action="append", default=[], type=parse_budget, metavar="NAME=SECONDS",
+                        help="Budget for one report entry (e.g. import:tensorflow=1.5) or a whole kind "
+                             "(e.g. model=4), can be repeated")
+    return parser
+
+
+def budgets_from_args(args):
+    budgets = dict(args.budget)
+    if args.startup_budget is not None:
+        budgets["startup"] = args.startup_budget
+    return budgets
+
+
+# Shared by the whole process. Starts timing right away when the flag was given
+startup_profiler = StartupProfiler()
+if PROFILE_FLAG in sys.argv:
+    startup_profiler.start()
@@ -0,0 +1,67 @@
+import threading
+import time
+
+import numpy as np
+
+from pipeline.capture import LatestFrameCapture
+from pipeline.frame_sources import FrameSource, SyntheticSource
+
+
+def test_every_frame_of_a_recorded_source_is_read():
+    capture = LatestFrameCapture(SyntheticSource(64, 48, num_frames=50)).start()
+    ids = []
+    while True:
+        captured = capture.read(timeout=5)
+        if captured is None:
+            break
+        ids.append(captured.frame_id)
+        # A consumer slower than the source
+        time.sleep(0.001)
+    capture.release()
+    assert ids == list(range(1, 51))
+    assert capture.stats() == {"captured": 50, "dropped": 0}
+
+
+class _FastLiveSource(FrameSource):
+    is_live = True
+
+    def __init__(self, frames):
+        self.frames = frames
+        self.count = 0
+
+    def read(self):
+        if self.count >= self.frames:
+            return False, None
+        self.count += 1
+        return True, np.zeros((2, 2, 3), np.uint8)
+
+
+def test_live_source_keeps_only_the_newest_frame():
+    capture = LatestFrameCapture(_FastLiveSource(200)).start()
+    capture.thread.join(5)
+    captured = capture.read(timeout=1)
+    assert captured.frame_id == 200
+    assert capture.stats()["dropped"] == 199
+    assert capture.read(timeout=1) is None
+    capture.release()
+
+
+def test_stop_wakes_a_capture_waiting_for_its_consumer():
+    capture = LatestFrameCapture(SyntheticSource(64, 48)).start()
+    assert capture.read(timeout=5) is not None
+    stopper = threading.Thread(target=capture.stop)
+    stopper.start()
+    stopper.join(5)
+    assert not stopper.is_alive()
+
+
+class _FailingSource(FrameSource):
+    def read(self):
+        raise OSError("camera unplugged")
+
+
+def test_failing_source_ends_the_capture():
+    capture = LatestFrameCapture(_FailingSource()).start()
+    assert capture.read(timeout=5) is None
+    assert capture.ended
+    capture.release()
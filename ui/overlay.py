@@ -21,6 +21,8 @@ class Overlay(QWidget):
     zoom_out_signal = pyqtSignal()
     toggle_pin_signal = pyqtSignal()
     select_highlighted_signal = pyqtSignal()
+    # Runs the callable it is emitted with on the GUI thread (for widget calls made from other threads)
+    invoke_signal = pyqtSignal(object)
 
     def __init__(self):
         super().__init__()
@@ -219,6 +221,7 @@ class Overlay(QWidget):
         self.zoom_out_signal.connect(self.zoom_out)
         self.toggle_pin_signal.connect(self.toggle_pin)
         self.select_highlighted_signal.connect(self.select_highlighted_element)
+        self.invoke_signal.connect(self.invoke)
 
 
         self.dragging_window = False
@@ -557,6 +560,9 @@ class Overlay(QWidget):
         else:
             print('No highlighted widget to select.')
 
+    def invoke(self, fn):
+        fn()
+
 class KeyboardWidget(QWidget):
     def __init__(self, parent=None):
         super().__init__(parent)